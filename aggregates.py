@@ -0,0 +1,412 @@
+# aggregates.py
+# Agregados de ventas y gastos en memoria para el Dashboard, los Reportes y la Gestión
+# Financiera, mantenidos por un hilo de fondo fuera de la ejecución de las páginas.
+#
+# El hilo sigue las ventas y los gastos nuevos por id (marca de agua: el último id_venta e
+# id_gasto ya sumados) y los agrega por día. Cada vez que hay algo nuevo publica una
+# Instantanea: un objeto inmutable que comparte con la anterior los días que no cambiaron.
+# Las páginas toman la última publicada sin esperar ni consultar la base.
+#
+# Los agregados se guardan en data/agregados.pkl cada cierto tiempo y al detener el hilo;
+# al reiniciar la app se cargan, se comprueba que las ventas y gastos hasta la marca de
+# agua sigan siendo los mismos (conteo y suma) y el hilo se pone al día desde ahí.
+import atexit
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from types import MappingProxyType
+
+import streamlit as st
+from sqlalchemy import text
+
+from db import engine, db_path, get_version_datos, get_limites_archivo, consultas_ventas, CATEGORIA_GASTO_OTRO
+from rollups import inicio_periodo, TIPO_INGRESO, TIPO_GASTO, CATEGORIA_VENTAS
+
+ARCHIVO_AGREGADOS = os.path.join(os.path.dirname(db_path), "agregados.pkl")
+# Cambia si cambia la forma de los agregados guardados; un archivo de otra versión se descarta
+VERSION_FORMATO = 1
+
+# Cada cuánto revisa el hilo si hay datos nuevos (solo consulta si cambió la versión de datos)
+INTERVALO_REVISION_SEGUNDOS = 1
+INTERVALO_GUARDADO_SEGUNDOS = 60
+# Sin revisar durante más de esto, el Dashboard avisa que los datos pueden estar atrasados
+MAX_RETRASO_SEGUNDOS = 10
+# Espera máxima por la primera instantánea; después se calcula en la misma ejecución
+ESPERA_PRIMERA_INSTANTANEA_SEGUNDOS = 5
+
+# La última venta nunca se archiva (archive.py): el máximo siempre está en la base
+_MARCAS = text("SELECT (SELECT MAX(id_venta) FROM ventas), (SELECT MAX(id_gasto) FROM gastos)")
+
+# Ventas y gastos ya sumados: si no coinciden, se borraron o reemplazaron filas
+_COMPROBAR_VENTAS, _COMPROBAR_VENTAS_CON_ARCHIVO = consultas_ventas("""
+    SELECT COUNT(*), COALESCE(SUM(total_venta), 0) FROM {ventas} WHERE id_venta <= :venta
+""")
+
+_COMPROBAR_GASTOS = text("""
+    SELECT COUNT(*), COALESCE(SUM(monto), 0) FROM gastos WHERE id_gasto <= :gasto
+""")
+
+_VENTAS_NUEVAS, _VENTAS_NUEVAS_CON_ARCHIVO = consultas_ventas("""
+    SELECT date(fecha_venta), COALESCE(SUM(total_venta), 0), COUNT(*)
+    FROM {ventas}
+    WHERE id_venta > :desde AND id_venta <= :hasta
+    GROUP BY 1
+""")
+
+# Por el índice cubriente de detalle_venta (id_venta primero)
+_LINEAS_NUEVAS, _LINEAS_NUEVAS_CON_ARCHIVO = consultas_ventas("""
+    SELECT date(v.fecha_venta), d.id_producto, SUM(d.cantidad), SUM(d.cantidad * d.precio_unitario),
+           SUM(d.cantidad * (d.precio_unitario - COALESCE(d.costo_unitario, 0)))
+    FROM {detalle_venta} AS d
+    JOIN {ventas} AS v ON v.id_venta = d.id_venta
+    WHERE d.id_venta > :desde AND d.id_venta <= :hasta
+    GROUP BY 1, 2
+""")
+
+_GASTOS_NUEVOS = text("""
+    SELECT date(g.fecha_gasto), COALESCE(c.nombre, :otro), COALESCE(SUM(g.monto), 0), COUNT(*)
+    FROM gastos AS g
+    LEFT JOIN categorias_gasto AS c ON c.id_categoria = g.id_categoria
+    WHERE g.id_gasto > :desde AND g.id_gasto <= :hasta
+    GROUP BY 1, 2
+""")
+
+_VACIO = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class Instantanea:
+    """Agregados publicados por el hilo; nunca se modifican, cada cambio publica otra."""
+    version: int = 0
+    generada: datetime = None
+    ultimo_id_venta: int = 0
+    ultimo_id_gasto: int = 0
+    # Ventas y gastos sumados hasta la marca de agua, para comprobarla al reiniciar
+    num_ventas: int = 0
+    suma_ventas: float = 0.0
+    num_gastos: int = 0
+    suma_gastos: float = 0.0
+    # fecha -> (total_ventas, num_transacciones)
+    ventas: MappingProxyType = field(default_factory=lambda: _VACIO)
+    # fecha -> {id_producto: (unidades, ingresos, ganancia)}
+    productos: MappingProxyType = field(default_factory=lambda: _VACIO)
+    # fecha -> {categoria: monto}
+    gastos: MappingProxyType = field(default_factory=lambda: _VACIO)
+
+    # --- Dashboard ---
+    def ventas_del_dia(self, dia):
+        """(total_ventas, num_transacciones) del día; (None, 0) sin ventas."""
+        return self.ventas.get(dia, (None, 0))
+
+    def mas_vendidos(self, dia, limite=5):
+        """[(id_producto, unidades)] de los productos más vendidos del día."""
+        vendidos = self.productos.get(dia, _VACIO)
+        return sorted(((i, v[0]) for i, v in vendidos.items()), key=lambda p: -p[1])[:limite]
+
+    # --- Reportes ---
+    def dias(self, inicio, fin):
+        """Días entre dos fechas (inclusive), en orden."""
+        return [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+
+    # --- Flujo de caja (misma forma que cash.get_flujo_caja y cash.get_totales_flujo) ---
+    def _flujo_del_dia(self, dia):
+        if dia in self.ventas:
+            yield TIPO_INGRESO, CATEGORIA_VENTAS, self.ventas[dia][0]
+        for categoria, monto in self.gastos.get(dia, _VACIO).items():
+            yield TIPO_GASTO, categoria, monto
+
+    def totales_flujo(self, desde, hasta):
+        """(ingresos, gastos) entre dos días, inclusive."""
+        totales = {TIPO_INGRESO: 0.0, TIPO_GASTO: 0.0}
+        for dia in self.dias(desde, hasta):
+            for tipo, _, monto in self._flujo_del_dia(dia):
+                totales[tipo] += monto
+        return totales[TIPO_INGRESO], totales[TIPO_GASTO]
+
+    def flujo_caja(self, desde, hasta, granularidad='dia', por_categoria=True):
+        """Filas (periodo, tipo, [categoria,] monto) de los periodos que tocan el rango de días.
+
+        Con granularidad 'semana' o 'mes' se incluyen completos el primer y el último periodo.
+        """
+        montos = {}
+        dia = inicio_periodo(desde, granularidad)
+        while inicio_periodo(dia, granularidad) <= hasta:
+            periodo = inicio_periodo(dia, granularidad)
+            for tipo, categoria, monto in self._flujo_del_dia(dia):
+                clave = (periodo, tipo, categoria) if por_categoria else (periodo, tipo)
+                montos[clave] = montos.get(clave, 0.0) + monto
+            dia += timedelta(days=1)
+        return [(*clave, monto) for clave, monto in sorted(montos.items(), key=lambda f: f[0][0])]
+
+
+# --- Plegado de las filas nuevas ---
+def _fecha(valor):
+    return date.fromisoformat(valor) if valor else None
+
+
+def _sumar_por_dia(anteriores, filas, sumar):
+    # Copia solo el diccionario exterior y los días que cambian; los demás se comparten
+    nuevos = dict(anteriores)
+    tocados = {}
+    for fecha, clave, valores in filas:
+        dia = tocados.get(fecha)
+        if dia is None:
+            dia = tocados[fecha] = dict(nuevos.get(fecha, _VACIO))
+        dia[clave] = sumar(dia.get(clave), valores)
+    for fecha, dia in tocados.items():
+        nuevos[fecha] = MappingProxyType(dia)
+    return MappingProxyType(nuevos)
+
+
+def _sumar_tuplas(anterior, valores):
+    return valores if anterior is None else tuple(a + b for a, b in zip(anterior, valores))
+
+
+def plegar(base, conn, hasta_venta, hasta_gasto):
+    """Instantánea nueva con las ventas y gastos de `base` más los que tienen id hasta
+    `hasta_venta` y `hasta_gasto`."""
+    ventas = dict(base.ventas)
+    num_ventas, suma_ventas = base.num_ventas, base.suma_ventas
+    # Solo al sumar desde antes del corte (al reconstruir) se lee también el archivo histórico
+    con_archivo = base.ultimo_id_venta < get_limites_archivo(conn).ultimo_id_venta
+    parametros = {'desde': base.ultimo_id_venta, 'hasta': hasta_venta}
+    consulta = _VENTAS_NUEVAS_CON_ARCHIVO if con_archivo else _VENTAS_NUEVAS
+    for fecha, total, transacciones in conn.execute(consulta, parametros):
+        total = float(total)
+        num_ventas += transacciones
+        suma_ventas += total
+        if (fecha := _fecha(fecha)) is not None:
+            ventas[fecha] = _sumar_tuplas(ventas.get(fecha), (total, transacciones))
+    productos = _sumar_por_dia(base.productos, (
+        (_fecha(fecha), id_producto, (int(unidades), float(ingresos), float(ganancia)))
+        for fecha, id_producto, unidades, ingresos, ganancia
+        in conn.execute(_LINEAS_NUEVAS_CON_ARCHIVO if con_archivo else _LINEAS_NUEVAS, parametros)
+        if fecha
+    ), _sumar_tuplas)
+
+    num_gastos, suma_gastos = base.num_gastos, base.suma_gastos
+    filas_gastos = []
+    parametros = {'desde': base.ultimo_id_gasto, 'hasta': hasta_gasto, 'otro': CATEGORIA_GASTO_OTRO}
+    for fecha, categoria, monto, cuantos in conn.execute(_GASTOS_NUEVOS, parametros):
+        num_gastos += cuantos
+        suma_gastos += float(monto)
+        if (fecha := _fecha(fecha)) is not None:
+            filas_gastos.append((fecha, categoria, float(monto)))
+    gastos = _sumar_por_dia(base.gastos, filas_gastos, lambda anterior, monto: (anterior or 0.0) + monto)
+
+    return Instantanea(
+        version=base.version + 1,
+        generada=datetime.now(),
+        ultimo_id_venta=hasta_venta,
+        ultimo_id_gasto=hasta_gasto,
+        num_ventas=num_ventas,
+        suma_ventas=suma_ventas,
+        num_gastos=num_gastos,
+        suma_gastos=suma_gastos,
+        ventas=MappingProxyType(ventas),
+        productos=productos,
+        gastos=gastos,
+    )
+
+
+def es_consistente(instantanea, conn):
+    """True si las ventas y gastos hasta la marca de agua son los que se sumaron."""
+    archivo = get_limites_archivo(conn)
+    parametros = {'venta': instantanea.ultimo_id_venta, 'gasto': instantanea.ultimo_id_gasto}
+    if instantanea.ultimo_id_venta >= archivo.ultimo_id_venta:
+        # Todo lo archivado queda bajo la marca de agua: cuenta con los totales de sus tandas
+        num_ventas, suma_ventas = conn.execute(_COMPROBAR_VENTAS, parametros).one()
+        num_ventas, suma_ventas = num_ventas + archivo.ventas, float(suma_ventas) + archivo.total_ventas
+    else:
+        num_ventas, suma_ventas = conn.execute(_COMPROBAR_VENTAS_CON_ARCHIVO, parametros).one()
+    num_gastos, suma_gastos = conn.execute(_COMPROBAR_GASTOS, parametros).one()
+    return (num_ventas == instantanea.num_ventas and num_gastos == instantanea.num_gastos
+            and abs(float(suma_ventas) - instantanea.suma_ventas) < 0.01
+            and abs(float(suma_gastos) - instantanea.suma_gastos) < 0.01)
+
+
+def actualizar(instantanea, conn):
+    """La instantánea al día con la base: la misma si no hay nada nuevo, la siguiente si hay
+    filas nuevas, o una reconstruida desde cero si se borraron o reemplazaron filas."""
+    hasta_venta, hasta_gasto = conn.execute(_MARCAS).one()
+    hasta_venta, hasta_gasto = hasta_venta or 0, hasta_gasto or 0
+    if hasta_venta < instantanea.ultimo_id_venta or hasta_gasto < instantanea.ultimo_id_gasto:
+        instantanea = Instantanea(version=instantanea.version + 1)
+    if hasta_venta == instantanea.ultimo_id_venta and hasta_gasto == instantanea.ultimo_id_gasto:
+        return instantanea
+    return plegar(instantanea, conn, hasta_venta, hasta_gasto)
+
+
+# --- Archivo ---
+def _guardar(instantanea, ruta):
+    datos = {campo: getattr(instantanea, campo) for campo in instantanea.__dataclass_fields__}
+    datos['ventas'] = dict(instantanea.ventas)
+    datos['productos'] = {fecha: dict(dia) for fecha, dia in instantanea.productos.items()}
+    datos['gastos'] = {fecha: dict(dia) for fecha, dia in instantanea.gastos.items()}
+    # Se reemplaza de forma atómica: un corte a mitad de la escritura deja el archivo anterior
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        pickle.dump((VERSION_FORMATO, datos), archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta)
+
+
+def _cargar(ruta):
+    # La instantánea guardada, o None si no hay archivo o es de otro formato
+    try:
+        with open(ruta, "rb") as archivo:
+            version_formato, datos = pickle.load(archivo)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return None
+    if version_formato != VERSION_FORMATO:
+        return None
+    datos['ventas'] = MappingProxyType(datos['ventas'])
+    for campo in ('productos', 'gastos'):
+        datos[campo] = MappingProxyType({fecha: MappingProxyType(dia) for fecha, dia in datos[campo].items()})
+    return Instantanea(**datos)
+
+
+# --- Hilo de fondo ---
+class AgregadorReportes(threading.Thread):
+    """Hilo que mantiene al día los agregados y publica cada Instantanea nueva en
+    `instantanea`, revisando cada `intervalo` segundos hasta detener()."""
+    def __init__(self, intervalo=INTERVALO_REVISION_SEGUNDOS, archivo=ARCHIVO_AGREGADOS):
+        super().__init__(name="agregados", daemon=True)
+        self.intervalo = intervalo
+        self.archivo = archivo
+        self.instantanea = None
+        self.ultima_revision = None  # time.monotonic() de la última revisión sin error
+        self.error = None
+        self._version_datos = None
+        self._guardada = None  # versión de la última instantánea guardada
+        self._guardado = time.monotonic()
+        self._reiniciar = False
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self._revisado = threading.Condition()
+        self._revisiones = 0
+
+    def run(self):
+        # Lo guardado se publica de inmediato y la primera revisión lo pone al día
+        instantanea = _cargar(self.archivo)
+        if instantanea is not None:
+            try:
+                with engine.connect() as conn:
+                    if es_consistente(instantanea, conn):
+                        self._guardada = instantanea.version
+                        self.instantanea = instantanea
+            except Exception as e:
+                self.error = e
+        while not self._detener.is_set():
+            self._revisar()
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+        self._guardar()
+
+    def _revisar(self):
+        try:
+            base = self.instantanea or Instantanea()
+            reiniciar = self._reiniciar
+            if reiniciar:
+                self._reiniciar = False
+                base = Instantanea(version=base.version + 1)
+            # PRAGMA data_version no consulta tablas: solo se agrega si alguien escribió
+            version_datos = get_version_datos()
+            if reiniciar or self.instantanea is None or version_datos != self._version_datos:
+                with engine.connect() as conn:
+                    # Ya publicada, la instantánea no se toca: se reemplaza la referencia
+                    self.instantanea = actualizar(base, conn)
+                self._version_datos = version_datos
+            if time.monotonic() - self._guardado > INTERVALO_GUARDADO_SEGUNDOS:
+                self._guardar()
+            self.ultima_revision = time.monotonic()
+            self.error = None
+        except Exception as e:
+            # Una base ocupada no debe terminar el hilo; se reintenta en la siguiente vuelta
+            self.error = e
+        with self._revisado:
+            self._revisiones += 1
+            self._revisado.notify_all()
+
+    def _guardar(self):
+        self._guardado = time.monotonic()
+        if self.instantanea is None or self.instantanea.version == self._guardada:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+            _guardar(self.instantanea, self.archivo)
+            self._guardada = self.instantanea.version
+        except OSError as e:
+            self.error = e
+
+    def esperar_revision(self, espera):
+        """Adelanta la siguiente revisión y espera hasta `espera` segundos a que termine;
+        devuelve True si terminó."""
+        with self._revisado:
+            revisiones = self._revisiones
+            self._despertar.set()
+            return self._revisado.wait_for(lambda: self._revisiones > revisiones, espera)
+
+    def reiniciar(self):
+        """Descarta los agregados; la siguiente revisión los reconstruye desde cero.
+
+        Usar después de reemplazar las ventas o los gastos (por ejemplo, al importar un ZIP).
+        """
+        self._reiniciar = True
+        self._despertar.set()
+
+    def detener(self, espera=5):
+        """Termina el hilo después de guardar los agregados."""
+        self._detener.set()
+        self._despertar.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(espera)
+
+
+@st.cache_resource(on_release=lambda hilo: hilo.detener())
+def iniciar_agregador():
+    """Arranca una sola vez por proceso el hilo de agregados; se detiene al salir."""
+    hilo = AgregadorReportes()
+    hilo.start()
+    atexit.register(hilo.detener)
+    return hilo
+
+
+def get_instantanea():
+    """La última Instantanea publicada. Solo la primera vez que arranca el hilo, y sin
+    agregados guardados, puede esperar a que termine de sumar el historial."""
+    hilo = iniciar_agregador()
+    if hilo.instantanea is None:
+        hilo.esperar_revision(ESPERA_PRIMERA_INSTANTANEA_SEGUNDOS)
+    if hilo.instantanea is not None:
+        return hilo.instantanea
+    # El hilo sigue ocupado (o falló): se suma en esta ejecución
+    with engine.connect() as conn:
+        return actualizar(Instantanea(), conn)
+
+
+def actualizar_agregados(espera=2):
+    """Después de registrar una venta o un gasto, espera a que el hilo los sume para que
+    la misma ejecución de la página ya los muestre."""
+    iniciar_agregador().esperar_revision(espera)
+
+
+def reiniciar_agregados():
+    iniciar_agregador().reiniciar()
+
+
+def get_estado_agregados():
+    """Estado del hilo para el indicador de datos atrasados."""
+    hilo = iniciar_agregador()
+    instantanea = hilo.instantanea
+    retraso = time.monotonic() - hilo.ultima_revision if hilo.ultima_revision is not None else None
+    return {
+        "activo": hilo.is_alive(),
+        "retraso_segundos": retraso,
+        "atrasado": not hilo.is_alive() or retraso is None or retraso > MAX_RETRASO_SEGUNDOS,
+        "generada": instantanea.generada if instantanea else None,
+        "ultimo_id_venta": instantanea.ultimo_id_venta if instantanea else 0,
+        "error": hilo.error,
+    }
@@ -0,0 +1,372 @@
+# api.py
+# Servicio HTTP/JSON local para cajas, lectores y tabletas: consulta del catálogo y del
+# stock y registro de ventas, sin pasar por una ejecución completa de una página.
+#
+#   $ python api.py --host 0.0.0.0 --puerto 8600 --hilos 8
+#
+# Usa los mismos modelos, el mismo pool de conexiones (db.py) y las mismas funciones que
+# la página de Ventas (sales.py), así una venta por la API es idéntica a una hecha desde la
+# página. Solo usa la biblioteca estándar y el archivo SQLite local: funciona sin red.
+#
+#   GET  /salud                                estado del servicio y del pool de conexiones
+#   GET  /productos?busqueda=&categoria=&orden=&cursor=&limite=&id_carrito=
+#                                              una página de productos con stock
+#   GET  /productos/<id>                       un producto, con su stock
+#   GET  /stock?ids=1,2,3&id_carrito=          stock en inventario y disponible (sin lo
+#                                              apartado por otros carritos) de varios productos
+#   POST /reservas  {"id_carrito": "...", "id_producto": 1, "cantidad": 2}
+#                                              aparta unidades para un carrito (ver
+#                                              reservations.py); sin id_carrito se crea uno
+#   DELETE /reservas/<id_carrito>              libera todos los apartados del carrito
+#   POST /ventas  {"lineas": [{"id_producto": 1, "cantidad": 2}, ...], "id_carrito": "..."}
+#                                              registra la venta; 201 con id_venta y total
+import argparse
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from db import get_db, get_estadisticas_pool, TAMANO_POOL
+from diagnostics import medir_ejecucion
+from catalog import get_catalogo
+from reservations import (nuevo_id_carrito, reservar, liberar, get_disponibles, iniciar_limpieza_reservas,
+                          DURACION_RESERVA)
+from inventory import iniciar_cortes_inventario
+from sales import (get_productos_disponibles, registrar_carrito, StockInsuficienteError,
+                   ORDEN_NOMBRE, ORDEN_POPULARIDAD, PRODUCTOS_POR_PAGINA)
+
+# Hilos que atienden solicitudes; no más que las conexiones fijas del pool
+HILOS = min(8, TAMANO_POOL)
+# Segundos que una conexión keep-alive inactiva retiene su hilo antes de cerrarse
+TIEMPO_INACTIVIDAD = 15
+MAX_CUERPO_BYTES = 64 * 1024
+MAX_LINEAS_POR_VENTA = 200
+MAX_PRODUCTOS_POR_PAGINA = 200
+
+_RUTA_PRODUCTO = re.compile(r"^/productos/(\d+)$")
+_RUTA_RESERVAS = re.compile(r"^/reservas/([0-9A-Za-z_-]{1,32})$")
+_ID_CARRITO = re.compile(r"^[0-9A-Za-z_-]{1,32}$")
+
+# SQLite admite un solo escritor a la vez. Las ventas y apartados de este proceso esperan su
+# turno aquí en lugar de chocar en la base, donde busy_timeout reintenta con pausas de hasta
+# 100 ms.
+_lock_escritura = threading.Lock()
+
+
+class ErrorAPI(Exception):
+    """Error que se responde al cliente con `estado` HTTP y un cuerpo JSON."""
+    def __init__(self, estado, mensaje, **detalle):
+        self.estado = estado
+        self.mensaje = mensaje
+        self.detalle = detalle
+        super().__init__(mensaje)
+
+
+def _a_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} no se puede convertir a JSON")
+
+
+def _entero(valor, nombre, minimo=None, maximo=None):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'{nombre}' debe ser un número entero")
+    if isinstance(valor, bool) or (isinstance(valor, float) and numero != valor):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'{nombre}' debe ser un número entero")
+    if (minimo is not None and numero < minimo) or (maximo is not None and numero > maximo):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'{nombre}' fuera de rango")
+    return numero
+
+
+def _id_carrito(valor):
+    if valor is None:
+        return None
+    if not isinstance(valor, str) or not _ID_CARRITO.match(valor):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, "'id_carrito' debe tener de 1 a 32 letras, números, '-' o '_'")
+    return valor
+
+
+# --- Endpoints ---
+def get_salud(parametros):
+    return {"estado": "ok", "pool": get_estadisticas_pool()}
+
+
+def get_productos(parametros):
+    orden = parametros.get("orden", ORDEN_NOMBRE)
+    if orden not in (ORDEN_NOMBRE, ORDEN_POPULARIDAD):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'orden' debe ser {ORDEN_NOMBRE} o {ORDEN_POPULARIDAD}")
+    limite = _entero(parametros.get("limite", PRODUCTOS_POR_PAGINA), "limite", 1, MAX_PRODUCTOS_POR_PAGINA)
+    cursor = None
+    if parametros.get("cursor"):
+        # El cursor es el campo `siguiente` de la página anterior, tal cual
+        try:
+            cursor = tuple(json.loads(parametros["cursor"]))
+        except (ValueError, TypeError):
+            cursor = ()
+        if len(cursor) != 2:
+            raise ErrorAPI(HTTPStatus.BAD_REQUEST, "'cursor' no es válido")
+
+    with get_db() as db:
+        productos, siguiente = get_productos_disponibles(
+            db, parametros.get("busqueda", ""), parametros.get("categoria") or None, orden, cursor, limite,
+            _id_carrito(parametros.get("id_carrito"))
+        )
+    return {
+        "productos": [{
+            "id_producto": p.id_producto,
+            "nombre": p.nombre,
+            "precio_venta": p.precio_venta,
+            "stock": p.stock,
+            "disponible": p.disponible,
+        } for p in productos],
+        "siguiente": json.dumps(siguiente, default=_a_json) if siguiente else None,
+    }
+
+
+def get_producto(id_producto):
+    producto = get_catalogo().obtener(id_producto)
+    if producto is None:
+        raise ErrorAPI(HTTPStatus.NOT_FOUND, f"No existe el producto {id_producto}")
+    return {
+        "id_producto": producto.id_producto,
+        "nombre": producto.nombre,
+        "descripcion": producto.descripcion,
+        "categoria": producto.categoria,
+        "precio_venta": producto.precio_venta,
+        "stock": producto.stock,
+    }
+
+
+def get_stock(parametros):
+    ids = [_entero(i, "ids", 1) for i in parametros.get("ids", "").split(",") if i.strip()]
+    if not ids or len(ids) > MAX_PRODUCTOS_POR_PAGINA:
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'ids' debe tener entre 1 y {MAX_PRODUCTOS_POR_PAGINA} ids separados por coma")
+    id_carrito = _id_carrito(parametros.get("id_carrito"))
+    productos = get_catalogo().obtener_varios(ids)
+    with get_db() as db:
+        disponibles = get_disponibles(db, ids, id_carrito)
+    return {"stock": {
+        str(i): {"stock": productos[i].stock, "disponible": disponibles.get(i, 0)} if i in productos else None
+        for i in ids
+    }}
+
+
+def post_reserva(cuerpo):
+    if not isinstance(cuerpo, dict):
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, "Se esperaba un objeto JSON")
+    id_carrito = _id_carrito(cuerpo.get("id_carrito")) or nuevo_id_carrito()
+    id_producto = _entero(cuerpo.get("id_producto"), "id_producto", 1)
+    cantidad = _entero(cuerpo.get("cantidad"), "cantidad", 0, 10000)
+    with _lock_escritura, get_db() as db:
+        if not reservar(db, id_carrito, id_producto, cantidad):
+            disponible = get_disponibles(db, [id_producto], id_carrito).get(id_producto)
+            if disponible is None:
+                raise ErrorAPI(HTTPStatus.NOT_FOUND, f"No existe el producto {id_producto}")
+            raise ErrorAPI(HTTPStatus.CONFLICT, "Stock insuficiente", id_carrito=id_carrito, disponible=disponible)
+    return {
+        "id_carrito": id_carrito,
+        "id_producto": id_producto,
+        "cantidad": cantidad,
+        "vigencia_segundos": int(DURACION_RESERVA.total_seconds()),
+    }
+
+
+def delete_reservas(id_carrito):
+    with _lock_escritura, get_db() as db:
+        liberar(db, id_carrito)
+    return {"id_carrito": id_carrito}
+
+
+def post_venta(cuerpo):
+    lineas = cuerpo.get("lineas") if isinstance(cuerpo, dict) else None
+    id_carrito = _id_carrito(cuerpo.get("id_carrito")) if isinstance(cuerpo, dict) else None
+    if not isinstance(lineas, list) or not 0 < len(lineas) <= MAX_LINEAS_POR_VENTA:
+        raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"'lineas' debe ser una lista de 1 a {MAX_LINEAS_POR_VENTA} líneas")
+
+    # Las líneas repetidas de un mismo producto se suman
+    cantidades = {}
+    for linea in lineas:
+        if not isinstance(linea, dict):
+            raise ErrorAPI(HTTPStatus.BAD_REQUEST, "Cada línea debe tener 'id_producto' y 'cantidad'")
+        id_producto = _entero(linea.get("id_producto"), "id_producto", 1)
+        cantidades[id_producto] = cantidades.get(id_producto, 0) + _entero(linea.get("cantidad"), "cantidad", 1, 10000)
+
+    # Los precios salen del catálogo, nunca del cliente
+    productos = get_catalogo().obtener_varios(list(cantidades))
+    no_encontrados = [i for i in cantidades if i not in productos]
+    if no_encontrados:
+        raise ErrorAPI(HTTPStatus.NOT_FOUND, "Productos inexistentes", no_encontrados=no_encontrados)
+    carrito = {
+        id_producto: {
+            'nombre': productos[id_producto].nombre,
+            'precio_venta': float(productos[id_producto].precio_venta),
+            'cantidad': cantidad,
+        } for id_producto, cantidad in cantidades.items()
+    }
+
+    with _lock_escritura, get_db() as db:
+        try:
+            id_venta, total_venta = registrar_carrito(db, carrito, id_carrito)
+        except StockInsuficienteError as e:
+            raise ErrorAPI(HTTPStatus.CONFLICT, str(e), faltantes=e.faltantes)
+    return {"id_venta": id_venta, "total_venta": round(total_venta, 2)}
+
+
+# --- Servidor ---
+class ManejadorAPI(BaseHTTPRequestHandler):
+    # HTTP/1.1 mantiene la conexión abierta entre solicitudes de una misma caja
+    protocol_version = "HTTP/1.1"
+    # Encabezados y cuerpo van en escrituras separadas: sin TCP_NODELAY, Nagle y el ACK
+    # retardado del cliente suman ~40 ms a cada respuesta
+    disable_nagle_algorithm = True
+    timeout = TIEMPO_INACTIVIDAD
+    server_version = "TiendaAPI/1.0"
+    registrar_solicitudes = False
+
+    def _responder(self, estado, contenido):
+        cuerpo = json.dumps(contenido, default=_a_json, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _atender(self, funcion, *argumentos, estado=HTTPStatus.OK):
+        try:
+            # Las consultas de la solicitud se registran como una ejecución de la ruta
+            with medir_ejecucion(f"api {funcion.__name__}"):
+                resultado = funcion(*argumentos)
+            self._responder(estado, resultado)
+        except ErrorAPI as e:
+            self._responder(e.estado, {"error": e.mensaje, **e.detalle})
+        except Exception as e:
+            self.log_error("Error en %s: %r", self.path, e)
+            self._responder(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error interno del servidor"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+        coincidencia = _RUTA_PRODUCTO.match(url.path)
+        if coincidencia:
+            self._atender(get_producto, int(coincidencia.group(1)))
+        elif url.path == "/productos":
+            self._atender(get_productos, parametros)
+        elif url.path == "/stock":
+            self._atender(get_stock, parametros)
+        elif url.path == "/salud":
+            self._atender(get_salud, parametros)
+        else:
+            self._responder(HTTPStatus.NOT_FOUND, {"error": f"Ruta desconocida: {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        funciones = {"/ventas": (post_venta, HTTPStatus.CREATED), "/reservas": (post_reserva, HTTPStatus.OK)}
+        if url.path not in funciones:
+            self._descartar_cuerpo()
+            self._responder(HTTPStatus.NOT_FOUND, {"error": f"Ruta desconocida: {url.path}"})
+            return
+        try:
+            cuerpo = self._leer_json()
+        except ErrorAPI as e:
+            self._responder(e.estado, {"error": e.mensaje})
+            return
+        funcion, estado = funciones[url.path]
+        self._atender(funcion, cuerpo, estado=estado)
+
+    def do_DELETE(self):
+        url = urlsplit(self.path)
+        self._descartar_cuerpo()
+        coincidencia = _RUTA_RESERVAS.match(url.path)
+        if coincidencia:
+            self._atender(delete_reservas, coincidencia.group(1))
+        else:
+            self._responder(HTTPStatus.NOT_FOUND, {"error": f"Ruta desconocida: {url.path}"})
+
+    def _descartar_cuerpo(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if 0 < longitud <= MAX_CUERPO_BYTES:
+            self.rfile.read(longitud)
+        elif longitud:
+            self.close_connection = True
+
+    def _leer_json(self):
+        try:
+            longitud = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            longitud = -1
+        if not 0 < longitud <= MAX_CUERPO_BYTES:
+            # Sin un cuerpo de tamaño conocido no se puede seguir leyendo la conexión
+            self.close_connection = True
+            raise ErrorAPI(HTTPStatus.BAD_REQUEST, f"Se requiere un cuerpo JSON de hasta {MAX_CUERPO_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(longitud))
+        except ValueError:
+            raise ErrorAPI(HTTPStatus.BAD_REQUEST, "El cuerpo no es JSON válido")
+
+    def log_message(self, formato, *argumentos):
+        # Escribir una línea por solicitud cuesta más que la propia consulta
+        if self.registrar_solicitudes:
+            super().log_message(formato, *argumentos)
+
+    def log_error(self, formato, *argumentos):
+        # Los errores se escriben siempre, salvo el cierre de una conexión keep-alive inactiva
+        if not formato.startswith("Request timed out"):
+            super().log_message(formato, *argumentos)
+
+
+class ServidorAPI(HTTPServer):
+    """HTTPServer que atiende cada conexión en un pool fijo de hilos.
+
+    A diferencia de ThreadingHTTPServer, el número de hilos (y por tanto de conexiones a la
+    base abiertas a la vez) está acotado; las conexiones de más esperan en la cola.
+    """
+    request_queue_size = 64
+
+    def __init__(self, direccion, hilos=HILOS, manejador=ManejadorAPI):
+        super().__init__(direccion, manejador)
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._atender_conexion, request, client_address)
+
+    def _atender_conexion(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON local de la tienda.")
+    parser.add_argument("--host", default="127.0.0.1", help="Usa 0.0.0.0 para aceptar otras cajas de la red local.")
+    parser.add_argument("--puerto", type=int, default=8600)
+    parser.add_argument("--hilos", type=int, default=HILOS)
+    parser.add_argument("--registro", action="store_true", help="Escribe una línea por solicitud.")
+    args = parser.parse_args()
+
+    ManejadorAPI.registrar_solicitudes = args.registro
+    servidor = ServidorAPI((args.host, args.puerto), args.hilos)
+    iniciar_limpieza_reservas()
+    iniciar_cortes_inventario()
+    print(f"API de la tienda en http://{args.host}:{args.puerto} ({args.hilos} hilos)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
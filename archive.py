@@ -0,0 +1,174 @@
+# archive.py
+# Archivo histórico: mueve las ventas de periodos cerrados (por ejemplo, ciclos escolares
+# anteriores) y sus líneas a una base SQLite aparte (db.archivo_path), para que la base
+# principal siga chica y rápida de respaldar y de compactar.
+#
+# Las tablas de resumen (rollups.py) se quedan completas en la base principal: los
+# reportes siguen saliendo de ellas y de los agregados (aggregates.py). Las lecturas del
+# detalle de ventas pasan por el archivo (ATTACH y vistas UNION ALL, ver db.tablas_ventas)
+# solo cuando su rango empieza antes del corte.
+#
+# Se archiva siempre un prefijo de id_venta: las ventas anteriores a la primera del día de
+# corte en adelante. La última venta nunca se archiva, así SQLite no reutiliza sus ids.
+#
+# Uso desde la línea de comandos:
+#   $ python archive.py --hasta 2025-08-01
+#   $ python archive.py --hasta 2025-08-01 --vacuum
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, func, select, text
+
+from db import (engine, db_path, archivo_path, rango_dias, get_limites_archivo, ESQUEMA_ARCHIVO,
+                Ventas, DetalleVenta, CortesArchivo)
+
+# Los últimos 366 días nunca se archivan: la reposición, los cierres de caja pendientes y
+# las demás consultas de ventas recientes leen solo la base principal.
+MIN_DIAS_EN_BASE = 366
+# Ventas movidas por transacción: cada tanda bloquea la escritura solo un momento
+TAMANO_LOTE = 5000
+
+
+def _columnas(tabla):
+    return ", ".join(c.name for c in tabla.columns)
+
+
+def _copiar(tabla):
+    # INSERT OR IGNORE: una tanda copiada y no borrada (corte a mitad) se vuelve a copiar
+    return text(
+        f"INSERT OR IGNORE INTO {ESQUEMA_ARCHIVO}.{tabla.name} ({_columnas(tabla)}) "
+        f"SELECT {_columnas(tabla)} FROM main.{tabla.name} WHERE id_venta > :desde AND id_venta <= :hasta"
+    )
+
+
+def _borrar(tabla):
+    return text(f"DELETE FROM main.{tabla.name} WHERE id_venta > :desde AND id_venta <= :hasta")
+
+
+_COPIAR_VENTAS = _copiar(Ventas.__table__)
+_COPIAR_LINEAS = _copiar(DetalleVenta.__table__)
+_BORRAR_VENTAS = _borrar(Ventas.__table__)
+_BORRAR_LINEAS = _borrar(DetalleVenta.__table__)
+
+_TOTALES_TANDA = text("""
+    SELECT (SELECT COUNT(*) FROM main.ventas WHERE id_venta > :desde AND id_venta <= :hasta),
+           (SELECT COALESCE(SUM(total_venta), 0) FROM main.ventas WHERE id_venta > :desde AND id_venta <= :hasta),
+           (SELECT COUNT(*) FROM main.detalle_venta WHERE id_venta > :desde AND id_venta <= :hasta),
+           (SELECT COALESCE(MAX(id_detalle), 0) FROM main.detalle_venta WHERE id_venta > :desde AND id_venta <= :hasta)
+""")
+
+
+def fecha_maxima_archivable(hoy=None):
+    """Último día de corte permitido: las ventas anteriores a él pueden archivarse."""
+    return (hoy or date.today()) - timedelta(days=MIN_DIAS_EN_BASE)
+
+
+def preparar_archivo(ruta=archivo_path):
+    """Crea el archivo con las tablas de ventas si no existe; devuelve True si lo creó."""
+    if os.path.exists(ruta):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    motor = create_engine(f"sqlite:///{ruta}")
+    try:
+        with motor.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode = WAL")
+            for tabla in (Ventas.__table__, DetalleVenta.__table__):
+                tabla.create(conn, checkfirst=True)
+            conn.commit()
+    finally:
+        motor.dispose()
+    return True
+
+
+def _mover_tanda(conn, hasta, desde_id, hasta_id):
+    rango = {"desde": desde_id, "hasta": hasta_id}
+    # Primero se copia y se confirma en el archivo. Si el proceso se corta antes de borrar,
+    # las vistas no ven las filas dos veces (descartan las archivadas con ids de la base).
+    with conn.begin():
+        conn.execute(_COPIAR_VENTAS, rango)
+        conn.execute(_COPIAR_LINEAS, rango)
+    # Después se borra de la base y se registra la tanda, en una sola transacción
+    with conn.begin():
+        ventas, total, lineas, ultimo_detalle = conn.execute(_TOTALES_TANDA, rango).one()
+        conn.execute(_BORRAR_LINEAS, rango)
+        conn.execute(_BORRAR_VENTAS, rango)
+        conn.execute(CortesArchivo.__table__.insert().values(
+            fecha=datetime.utcnow(), hasta=hasta, ultimo_id_venta=hasta_id, ultimo_id_detalle=ultimo_detalle,
+            ventas=ventas, lineas=lineas, total_ventas=total,
+        ))
+    return ventas, lineas
+
+
+def archivar(hasta, tamano_lote=TAMANO_LOTE, progreso=None):
+    """Mueve al archivo histórico las ventas anteriores al día `hasta`, con sus líneas, en
+    tandas de `tamano_lote` ventas. Devuelve (ventas, lineas) movidas.
+
+    `progreso(hechas, total)` se llama después de cada tanda, en ids de venta.
+    """
+    if hasta > fecha_maxima_archivable():
+        raise ValueError(f"Solo se pueden archivar ventas anteriores al {fecha_maxima_archivable():%d/%m/%Y}")
+    if preparar_archivo():
+        # Las conexiones abiertas antes de crear el archivo no lo tienen adjunto
+        engine.dispose()
+
+    with engine.connect() as conn:
+        inicio = get_limites_archivo(conn).ultimo_id_venta
+        primera_posterior, ultima = conn.execute(select(
+            select(func.min(Ventas.id_venta)).where(Ventas.fecha_venta >= rango_dias(hasta)[0]).scalar_subquery(),
+            select(func.max(Ventas.id_venta)).scalar_subquery(),
+        )).one()
+        conn.rollback()
+        if ultima is None:
+            return 0, 0
+        tope = ultima - 1 if primera_posterior is None else min(primera_posterior, ultima) - 1
+
+        movidas_ventas = movidas_lineas = 0
+        desde_id = inicio
+        while desde_id < tope:
+            hasta_id = min(desde_id + tamano_lote, tope)
+            ventas, lineas = _mover_tanda(conn, hasta, desde_id, hasta_id)
+            movidas_ventas += ventas
+            movidas_lineas += lineas
+            desde_id = hasta_id
+            if progreso:
+                progreso(desde_id - inicio, tope - inicio)
+    return movidas_ventas, movidas_lineas
+
+
+def compactar():
+    """VACUUM de la base principal, para devolver al disco el espacio de lo archivado."""
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("VACUUM main")
+
+
+def _tamano_mb(ruta):
+    return round(sum(os.path.getsize(r) for r in (ruta, ruta + "-wal") if os.path.exists(r)) / 1024 / 1024, 2)
+
+
+def get_estado_archivo():
+    """Corte, ventas y líneas archivadas y tamaño en MB de la base y del archivo."""
+    with engine.connect() as conn:
+        limites = get_limites_archivo(conn)
+    return {
+        "hasta": limites.hasta,
+        "ventas": limites.ventas,
+        "lineas": limites.lineas,
+        "total_ventas": limites.total_ventas,
+        "tamano_base_mb": _tamano_mb(db_path),
+        "tamano_archivo_mb": _tamano_mb(archivo_path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mueve las ventas de periodos cerrados al archivo histórico.")
+    parser.add_argument("--hasta", type=date.fromisoformat, required=True,
+                        help="Fecha (AAAA-MM-DD): se archivan las ventas anteriores a ella.")
+    parser.add_argument("--vacuum", action="store_true", help="Compacta la base principal al terminar.")
+    args = parser.parse_args()
+
+    ventas, lineas = archivar(args.hasta)
+    if args.vacuum:
+        compactar()
+    print(f"{ventas} ventas y {lineas} líneas archivadas en {archivo_path}.")
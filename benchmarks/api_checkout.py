@@ -0,0 +1,84 @@
+# benchmarks/api_checkout.py
+# Carga sobre la API local (api.py): varias cajas concurrentes, cada una con su conexión
+# keep-alive, registran ventas y consultan stock. Informa tickets por segundo y latencias.
+#
+#   $ python benchmarks/api_checkout.py --cajas 4 --ventas-por-caja 500
+#
+# Levanta el servidor en un puerto libre sobre una base sintética temporal; no toca
+# data/tienda_escolar.db ni usa la red.
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark de ventas por la API local.")
+parser.add_argument("--cajas", type=int, default=4, help="Clientes concurrentes.")
+parser.add_argument("--ventas-por-caja", type=int, default=500)
+parser.add_argument("--hilos", type=int, default=8, help="Hilos del servidor.")
+parser.add_argument("--productos", type=int, default=500)
+parser.add_argument("--ventas", type=int, default=20000, help="Ventas previas en la base sintética.")
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+# La base debe elegirse antes de importar db
+directorio = tempfile.mkdtemp(prefix="bench_api_")
+os.environ["TIENDA_DB_PATH"] = os.path.join(directorio, "tienda_escolar.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import ServidorAPI  # noqa: E402
+from diagnostics import percentil  # noqa: E402
+from synthetic import generar_filas, llenar_base  # noqa: E402
+
+
+def caja(puerto, semilla, ids, resultados):
+    rng = random.Random(semilla)
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    latencias, estados = [], {}
+    for _ in range(args.ventas_por_caja):
+        lineas = [{"id_producto": i, "cantidad": rng.randint(1, 2)} for i in rng.sample(ids, rng.randint(1, 4))]
+        inicio = time.perf_counter()
+        conexion.request("POST", "/ventas", json.dumps({"lineas": lineas}), {"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        estados[respuesta.status] = estados.get(respuesta.status, 0) + 1
+    conexion.close()
+    resultados.append((latencias, estados))
+
+
+if __name__ == "__main__":
+    llenar_base(generar_filas(random.Random(args.seed), args.productos, args.ventas, 3, args.ventas // 10))
+
+    servidor = ServidorAPI(("127.0.0.1", 0), args.hilos)
+    puerto = servidor.server_address[1]
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    ids = list(range(1, args.productos + 1))
+    resultados = []
+    cajas = [threading.Thread(target=caja, args=(puerto, args.seed + n, ids, resultados)) for n in range(args.cajas)]
+    inicio = time.perf_counter()
+    for hilo in cajas:
+        hilo.start()
+    for hilo in cajas:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    conexion.request("GET", "/salud")
+    pool = json.loads(conexion.getresponse().read())["pool"]
+    servidor.shutdown()
+    servidor.server_close()
+
+    latencias = [l for lista, _ in resultados for l in lista]
+    estados = {}
+    for _, por_estado in resultados:
+        for estado, n in por_estado.items():
+            estados[estado] = estados.get(estado, 0) + n
+    print(f"{args.cajas} cajas, {len(latencias):,} solicitudes en {segundos:.2f} s: {len(latencias) / segundos:,.0f} tickets/s")
+    print(f"POST /ventas  p50 {percentil(latencias, 50):.2f} ms  p95 {percentil(latencias, 95):.2f} ms  p99 {percentil(latencias, 99):.2f} ms")
+    print(f"Respuestas por estado: {dict(sorted(estados.items()))}; errores por bloqueo: {pool['errores_por_bloqueo']}")
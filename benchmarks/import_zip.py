@@ -0,0 +1,97 @@
+# benchmarks/import_zip.py
+# Compara la importación por lotes (data_io.importar_zip) con el ciclo fila por fila
+# que usaba la página de Datos, sobre un ZIP sintético grande.
+#
+#   $ python benchmarks/import_zip.py --ventas 20000 --lineas 3
+#
+# Trabaja sobre una base temporal; no toca data/tienda_escolar.db.
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+parser = argparse.ArgumentParser(description="Benchmark de importación de CSV/ZIP.")
+parser.add_argument("--productos", type=int, default=500)
+parser.add_argument("--ventas", type=int, default=20000)
+parser.add_argument("--lineas", type=int, default=3, help="Líneas de detalle promedio por venta.")
+parser.add_argument("--gastos", type=int, default=2000)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+# La base debe elegirse antes de importar db
+directorio = tempfile.mkdtemp(prefix="bench_import_")
+os.environ["TIENDA_DB_PATH"] = os.path.join(directorio, "tienda_escolar.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+from sqlalchemy import DateTime  # noqa: E402
+
+from db import SessionLocal  # noqa: E402
+from data_io import TABLAS, ORDEN_IMPORTACION, importar_zip  # noqa: E402
+from synthetic import generar_filas  # noqa: E402
+
+
+def _csv(encabezado, filas):
+    texto = io.StringIO()
+    writer = csv.writer(texto)
+    writer.writerow(encabezado)
+    writer.writerows(filas)
+    return texto.getvalue()
+
+
+def generar_zip(rng):
+    tablas = generar_filas(rng, args.productos, args.ventas, args.lineas, args.gastos)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for nombre, (encabezado, filas) in tablas.items():
+            zip_file.writestr(f"{nombre}.csv", _csv(encabezado, filas))
+    buffer.seek(0)
+    return buffer, sum(len(filas) for _, filas in tablas.values())
+
+
+def importar_por_filas(archivo_zip):
+    # El ciclo anterior de la página: DataFrame completo, iterrows, setattr y db.add por fila.
+    # Única diferencia: las columnas DateTime se convierten a datetime, sin lo cual SQLite
+    # rechaza las fechas leídas del CSV y el ciclo original no puede terminar.
+    zip_file = zipfile.ZipFile(archivo_zip)
+    db = SessionLocal()
+    try:
+        for table_name in ORDEN_IMPORTACION:
+            if f"{table_name}.csv" not in zip_file.namelist():
+                continue
+            df = pd.read_csv(zip_file.open(f"{table_name}.csv"))
+            tabla = TABLAS[table_name].__table__
+            for columna in df.columns:
+                if isinstance(tabla.c[columna].type, DateTime):
+                    df[columna] = pd.to_datetime(df[columna]).dt.to_pydatetime()
+            db.query(TABLAS[table_name]).delete()
+            for index, row in df.iterrows():
+                instance = TABLAS[table_name]()
+                for col, value in row.items():
+                    setattr(instance, col, value.item() if hasattr(value, "item") else value)
+                db.add(instance)
+        db.commit()
+    finally:
+        db.close()
+
+
+def medir(nombre, funcion, archivo_zip, filas):
+    archivo_zip.seek(0)
+    inicio = time.perf_counter()
+    funcion(archivo_zip)
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<14} {segundos:8.2f} s  {filas / segundos:12,.0f} filas/s")
+    return segundos
+
+
+if __name__ == "__main__":
+    archivo_zip, filas = generar_zip(random.Random(args.seed))
+    print(f"ZIP sintético: {filas:,} filas, {len(archivo_zip.getvalue()) / 1e6:.1f} MB comprimido")
+    t_filas = medir("fila por fila", importar_por_filas, archivo_zip, filas)
+    t_lotes = medir("por lotes", importar_zip, archivo_zip, filas)
+    print(f"Aceleración: {t_filas / t_lotes:.1f}x")
@@ -0,0 +1,175 @@
+# benchmarks/run.py
+# Mide la latencia (p50/p95/p99) y el número de consultas SQL por llamada de las funciones
+# de consulta de cada página, sobre bases sintéticas de varios tamaños.
+#
+#   $ python benchmarks/run.py --ventas 1000,10000,100000 --repeticiones 50
+#   $ python benchmarks/run.py --json antes.json
+#   $ python benchmarks/run.py --comparar antes.json
+#
+# Cada tamaño se mide en un proceso aparte con su propia base temporal, porque db.py fija
+# la ruta de la base al importarse. Nunca toca data/tienda_escolar.db.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Funciones que escriben o recorren todas las tablas: se repiten menos veces
+REPETICIONES_PESADAS = 3
+
+
+def _tamano(ventas):
+    # Productos y gastos crecen con el número de ventas
+    return {"ventas": ventas, "productos": min(5000, max(100, ventas // 20)), "gastos": max(100, ventas // 10)}
+
+
+def _casos(db, rng):
+    # (nombre, función, pesada) en orden de ejecución: primero las lecturas, luego las
+    # funciones que escriben
+    from datetime import date, datetime, timedelta
+
+    import aggregates
+    import data_io
+    import inventory
+    import purchasing
+    import reports
+    import sales
+    import search
+    from catalog import get_catalogo
+
+    hoy = date.today()
+    con_stock = [p for p in get_catalogo().listar() if p.stock > 0]
+
+    def carrito():
+        return {
+            p.id_producto: {'nombre': p.nombre, 'precio_venta': float(p.precio_venta), 'cantidad': 1}
+            for p in rng.sample(con_stock, 3)
+        }
+
+    # Agregados en memoria como los publica el hilo de aggregates.py
+    instantanea = aggregates.actualizar(aggregates.Instantanea(), db.connection())
+
+    zip_exportado = {}
+
+    def exportar():
+        # El archivo de exportar_tablas_zip se reutiliza mientras no cambien los datos;
+        # aquí se mide su construcción
+        data_io._borrar(zip_exportado.get("ruta"))
+        zip_exportado["ruta"] = data_io._nuevo_zip()
+
+    return [
+        ("agregados: resumen del día", lambda: reports.get_resumen_del_dia(instantanea, hoy), False),
+        ("get_reporte_historial (365 días)", lambda: reports.get_reporte_historial(db, hoy - timedelta(days=365), hoy), False),
+        ("agregados: reporte (30 días)", lambda: reports.get_vendidos_agregados(instantanea, hoy - timedelta(days=30), hoy), False),
+        ("agregados: sumar todo el historial", lambda: aggregates.actualizar(aggregates.Instantanea(), db.connection()), True),
+        ("get_productos_disponibles (nombre)", lambda: sales.get_productos_disponibles(db), False),
+        ("get_productos_disponibles (popularidad)", lambda: sales.get_productos_disponibles(db, orden=sales.ORDEN_POPULARIDAD), False),
+        ("get_productos_disponibles (búsqueda)", lambda: sales.get_productos_disponibles(db, busqueda="cuaderno az"), False),
+        ("lista de compras (28 días)", lambda: purchasing.calcular_reorden(
+            purchasing.get_demanda(db, hoy - timedelta(days=27), hoy), purchasing.ParametrosReorden()), False),
+        ("stock en fecha (hace 30 días)", lambda: inventory.get_stock_en(db, datetime.utcnow() - timedelta(days=30)), False),
+        ("rotación y merma (30 días)", lambda: inventory.get_reporte_inventario(db, hoy - timedelta(days=30), hoy), False),
+        ("buscar_productos", lambda: search.buscar_productos(db, "choco"), False),
+        ("registrar_carrito", lambda: sales.registrar_carrito(db, carrito()), False),
+        ("exportar zip", exportar, True),
+        ("importar_zip", lambda: data_io.importar_zip(zip_exportado["ruta"]), True),
+    ]
+
+
+def medir(ventas, repeticiones, seed):
+    """Genera la base de un tamaño y mide cada caso; devuelve nombre -> métricas."""
+    directorio = tempfile.mkdtemp(prefix="bench_run_")
+    os.environ["TIENDA_DB_PATH"] = os.path.join(directorio, "tienda_escolar.db")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from sqlalchemy import event
+
+    from db import engine, SessionLocal
+    from diagnostics import percentil
+    from synthetic import generar_filas, llenar_base
+
+    tamano = _tamano(ventas)
+    rng = random.Random(seed)
+    llenar_base(generar_filas(rng, tamano["productos"], tamano["ventas"], 3, tamano["gastos"]))
+
+    consultas = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(*_):
+        consultas[0] += 1
+
+    resultados = {}
+    with SessionLocal() as db:
+        for nombre, funcion, pesada in _casos(db, rng):
+            veces = REPETICIONES_PESADAS if pesada else repeticiones
+            funcion()  # calentamiento: cachés de SQLite, del catálogo y del historial
+            db.rollback()
+            latencias, por_llamada = [], []
+            for _ in range(veces):
+                antes = consultas[0]
+                inicio = time.perf_counter()
+                funcion()
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                por_llamada.append(consultas[0] - antes)
+                db.rollback()  # cada llamada empieza sin transacción abierta, como en la página
+            resultados[nombre] = {
+                "llamadas": veces,
+                "p50_ms": percentil(latencias, 50),
+                "p95_ms": percentil(latencias, 95),
+                "p99_ms": percentil(latencias, 99),
+                "consultas": max(por_llamada),
+            }
+    return {"tamano": tamano, "resultados": resultados}
+
+
+def imprimir(ventas, medicion, base=None):
+    tamano = medicion["tamano"]
+    print(f"\n== {tamano['ventas']:,} ventas, {tamano['productos']:,} productos, {tamano['gastos']:,} gastos ==")
+    print(f"{'función':<42} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'consultas':>10}" + ("  p50 vs. base" if base else ""))
+    for nombre, r in medicion["resultados"].items():
+        linea = f"{nombre:<42} {r['llamadas']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['consultas']:>10}"
+        anterior = (base or {}).get(str(ventas), {}).get("resultados", {}).get(nombre)
+        if anterior:
+            linea += f"  {r['p50_ms'] / anterior['p50_ms']:>6.2f}x" if anterior["p50_ms"] else ""
+            if r["consultas"] != anterior["consultas"]:
+                linea += f"  consultas {anterior['consultas']} -> {r['consultas']}"
+        print(linea)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de las funciones de consulta de las páginas.")
+    parser.add_argument("--ventas", default="1000,10000,50000", help="Tamaños a medir (número de ventas), separados por coma.")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo.")
+    parser.add_argument("--comparar", help="Resultados anteriores (--json) contra los que comparar.")
+    parser.add_argument("--medir", type=int, help=argparse.SUPPRESS)  # proceso hijo: un solo tamaño
+    args = parser.parse_args()
+
+    if args.medir is not None:
+        print(json.dumps(medir(args.medir, args.repeticiones, args.seed)))
+        sys.exit()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+
+    todos = {}
+    for ventas in [int(v) for v in args.ventas.split(",")]:
+        proceso = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--medir", str(ventas),
+             "--repeticiones", str(args.repeticiones), "--seed", str(args.seed)],
+            capture_output=True, text=True
+        )
+        if proceso.returncode != 0:
+            sys.exit(f"Falló la medición con {ventas:,} ventas:\n{proceso.stderr}")
+        todos[str(ventas)] = json.loads(proceso.stdout.strip().splitlines()[-1])
+        imprimir(ventas, todos[str(ventas)], base)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(todos, f, indent=2, ensure_ascii=False)
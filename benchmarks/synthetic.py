@@ -0,0 +1,140 @@
+# benchmarks/synthetic.py
+# Generador de datos sintéticos reproducibles (misma semilla, mismos datos respecto de la
+# fecha final) para medir el rendimiento con bases de distintos tamaños.
+#
+#   $ python benchmarks/synthetic.py --db data/tienda_sintetica.db --productos 500 --ventas 20000 --gastos 2000
+#
+# Llena una base nueva y reconstruye sus resúmenes y cortes de inventario; no escribe sobre
+# una base existente salvo que se indique --reemplazar.
+import argparse
+import itertools
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S.%f"
+
+# Categoría -> nombres base; cada producto combina un nombre, una variante y un número
+NOMBRES_POR_CATEGORIA = {
+    "Papelería": ["Lápiz", "Cuaderno", "Borrador", "Sacapuntas", "Pluma", "Regla", "Tijeras", "Pegamento", "Colores", "Marcador"],
+    "Bebidas": ["Agua", "Jugo", "Refresco", "Leche", "Yogur bebible", "Té helado"],
+    "Botanas": ["Papas", "Galletas", "Cacahuates", "Palomitas", "Chicharrones", "Barra de granola"],
+    "Dulces": ["Chocolate", "Paleta", "Chicle", "Gomitas", "Caramelo", "Mazapán"],
+    "Comida": ["Sándwich", "Torta", "Burrito", "Fruta picada", "Ensalada", "Quesadilla"],
+}
+VARIANTES = ["chico", "mediano", "grande", "azul", "rojo", "natural", "de fresa", "de chocolate", "integral", "clásico"]
+DESCRIPCIONES_GASTO = ["Renta Diaria", "Salario", "Inventario", "Gasolina", "Limpieza", "Reparación"]
+
+
+def _fecha(valor):
+    return valor.strftime(FORMATO_FECHA)
+
+
+def generar_filas(rng, productos=500, ventas=20000, lineas=3, gastos=2000, dias=365, fin=None):
+    """Diccionario tabla -> (columnas, filas) con datos sintéticos.
+
+    Las ventas se reparten en los `dias` anteriores a `fin` (por defecto, ahora) con ids
+    en orden cronológico, y la popularidad de los productos sigue una ley de potencias.
+    """
+    fin = fin or datetime.utcnow()
+    inicio = fin - timedelta(days=dias)
+    segundos = int((fin - inicio).total_seconds())
+    momento = lambda: inicio + timedelta(seconds=rng.randrange(segundos))
+
+    filas_productos, filas_inventario = [], []
+    for id_producto in range(1, productos + 1):
+        categoria = rng.choice(list(NOMBRES_POR_CATEGORIA))
+        nombre = f"{rng.choice(NOMBRES_POR_CATEGORIA[categoria])} {rng.choice(VARIANTES)} {id_producto}"
+        precio_compra = round(rng.uniform(3, 40), 2)
+        precio_venta = round(precio_compra * rng.uniform(1.2, 1.8), 2)
+        filas_productos.append((id_producto, nombre, f"{nombre} ({categoria.lower()})", categoria,
+                                precio_compra, precio_venta, _fecha(inicio)))
+        filas_inventario.append((id_producto, id_producto, rng.randrange(50, 500), _fecha(fin)))
+
+    pesos_acumulados = list(itertools.accumulate(1 / (posicion ** 0.8) for posicion in range(1, productos + 1)))
+    filas_ventas, filas_detalle = [], []
+    for id_venta, fecha in enumerate(sorted(momento() for _ in range(ventas)), start=1):
+        total = 0
+        for producto in rng.choices(filas_productos, cum_weights=pesos_acumulados, k=rng.randint(1, 2 * lineas - 1)):
+            cantidad = rng.randint(1, 3)
+            total += cantidad * producto[5]
+            filas_detalle.append((len(filas_detalle) + 1, id_venta, producto[0], cantidad, producto[5], producto[4]))
+        filas_ventas.append((id_venta, _fecha(fecha), round(total, 2)))
+
+    filas_gastos = [
+        (id_gasto, rng.choice(DESCRIPCIONES_GASTO), round(rng.uniform(20, 500), 2), _fecha(fecha))
+        for id_gasto, fecha in enumerate(sorted(momento() for _ in range(gastos)), start=1)
+    ]
+
+    # Diario de inventario en orden cronológico: el stock inicial de cada producto (el final
+    # más lo vendido y lo perdido) entra como importación al inicio, luego una salida por
+    # línea de venta y algunos ajustes negativos de merma
+    fechas_venta = {id_venta: fecha for id_venta, fecha, _ in filas_ventas}
+    movimientos = [(fechas_venta[id_venta], id_producto, "venta", -cantidad, id_venta)
+                   for _, id_venta, id_producto, cantidad, _, _ in filas_detalle]
+    movimientos += [(_fecha(momento()), rng.randrange(1, productos + 1), "ajuste", -rng.randint(1, 3), None)
+                    for _ in range(ventas // 200)]
+    salidas = dict.fromkeys(range(1, productos + 1), 0)
+    for _, id_producto, _, cantidad, _ in movimientos:
+        salidas[id_producto] -= cantidad
+    iniciales = [(_fecha(inicio), id_producto, "importacion", cantidad + salidas[id_producto], None)
+                 for _, id_producto, cantidad, _ in filas_inventario]
+    filas_movimientos = [(id_movimiento, *movimiento) for id_movimiento, movimiento in
+                         enumerate(sorted(iniciales + movimientos, key=lambda m: m[0]), start=1)]
+
+    return {
+        "productos": (["id_producto", "nombre", "descripcion", "categoria", "precio_compra", "precio_venta", "fecha_creacion"], filas_productos),
+        "inventario": (["id_inventario", "id_producto", "cantidad", "ultima_actualizacion"], filas_inventario),
+        "ventas": (["id_venta", "fecha_venta", "total_venta"], filas_ventas),
+        "detalle_venta": (["id_detalle", "id_venta", "id_producto", "cantidad", "precio_unitario", "costo_unitario"], filas_detalle),
+        "gastos": (["id_gasto", "descripcion", "monto", "fecha_gasto"], filas_gastos),
+        "movimientos_inventario": (["id_movimiento", "fecha", "id_producto", "tipo", "cantidad", "id_referencia"], filas_movimientos),
+    }
+
+
+def llenar_base(tablas):
+    """Inserta las filas en la base de TIENDA_DB_PATH y reconstruye los resúmenes y los
+    cortes de inventario."""
+    from db import engine, SessionLocal, completar_categorias_gasto
+    from inventory import reconstruir_cortes
+    from rollups import reconstruir_resumenes, reconstruir_flujo_caja
+
+    with engine.begin() as conn:
+        for tabla, (columnas, filas) in tablas.items():
+            conn.exec_driver_sql(
+                f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})", filas
+            )
+        completar_categorias_gasto(conn)
+    with SessionLocal() as db:
+        reconstruir_resumenes(db)
+        reconstruir_flujo_caja(db)
+        reconstruir_cortes(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Llena una base nueva con datos sintéticos.")
+    parser.add_argument("--db", default=os.path.join("data", "tienda_sintetica.db"), help="Ruta de la base a crear.")
+    parser.add_argument("--productos", type=int, default=500)
+    parser.add_argument("--ventas", type=int, default=20000)
+    parser.add_argument("--lineas", type=int, default=3, help="Líneas de detalle promedio por venta.")
+    parser.add_argument("--gastos", type=int, default=2000)
+    parser.add_argument("--dias", type=int, default=365, help="Días de historial hasta hoy.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reemplazar", action="store_true", help="Borra la base si ya existe.")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.reemplazar:
+            sys.exit(f"{args.db} ya existe; usa --reemplazar para sobrescribirla.")
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + sufijo):
+                os.remove(args.db + sufijo)
+
+    # La base debe elegirse antes de importar db
+    os.environ["TIENDA_DB_PATH"] = os.path.abspath(args.db)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    tablas = generar_filas(random.Random(args.seed), args.productos, args.ventas, args.lineas, args.gastos, args.dias)
+    llenar_base(tablas)
+    print(", ".join(f"{tabla}: {len(filas):,}" for tabla, (_, filas) in tablas.items()))
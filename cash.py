@@ -0,0 +1,186 @@
+# cash.py
+# Libro de efectivo: cierres diarios, retiros y ajustes en `movimientos_efectivo`; registro
+# de gastos y lectura del resumen de flujo de caja (ver rollups.py).
+#
+# Cada movimiento se inserta con un solo INSERT ... SELECT que calcula su saldo a partir
+# del último, así dos sesiones no pueden pisarse el saldo y leerlo es una consulta por
+# clave primaria. El cierre de un día suma sus ventas menos sus gastos y es idempotente.
+#
+# Los días del libro son días UTC, como los de fecha_venta, fecha_gasto y los resúmenes.
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, text
+
+from db import Gastos, CategoriasGasto, MovimientosEfectivo, ResumenFlujoCaja, DESCRIPCION_SALDO_INICIAL
+from rollups import registrar_flujo, inicio_periodo, TIPO_INGRESO, TIPO_GASTO
+
+TIPO_CIERRE_DIARIO = 'cierre_diario'
+TIPO_RETIRO = 'retiro'
+TIPO_AJUSTE = 'ajuste'
+
+# Cierres que se ponen al día como máximo en una sola llamada
+MAX_DIAS_POR_CERRAR = 366
+
+# {conflicto}: "OR IGNORE" para los cierres; {condicion}: saldo mínimo para los retiros
+# (sin WITH al inicio: sqlite3 no informa rowcount de esas sentencias)
+_INSERTAR_MOVIMIENTO = """
+    INSERT {conflicto} INTO movimientos_efectivo (tipo, fecha, monto, saldo, descripcion, fecha_registro)
+    SELECT :tipo, :fecha, :monto, ROUND(anterior.saldo + :monto, 2), :descripcion, CURRENT_TIMESTAMP
+    FROM (
+        SELECT COALESCE((SELECT saldo FROM movimientos_efectivo ORDER BY id_movimiento DESC LIMIT 1), 0) AS saldo
+    ) AS anterior {condicion}
+"""
+
+
+def _hoy():
+    # En el mismo reloj que las ventas y los gastos guardados
+    return datetime.utcnow().date()
+
+
+def _insertar(db, tipo, fecha, monto, descripcion=None, saldo_minimo=None, ignorar_repetido=False):
+    # Devuelve True si se insertó el movimiento
+    stmt = text(_INSERTAR_MOVIMIENTO.format(
+        conflicto="OR IGNORE" if ignorar_repetido else "",
+        condicion="WHERE anterior.saldo + :monto >= :saldo_minimo" if saldo_minimo is not None else "",
+    ))
+    parametros = {
+        'tipo': tipo,
+        'fecha': fecha.isoformat(),
+        'monto': round(float(monto), 2),
+        'descripcion': descripcion,
+    }
+    if saldo_minimo is not None:
+        parametros['saldo_minimo'] = saldo_minimo
+    return db.execute(stmt, parametros).rowcount == 1
+
+
+def get_saldo(db):
+    """Saldo actual de la caja: el de la última fila del libro."""
+    saldo = db.execute(
+        select(MovimientosEfectivo.saldo).order_by(MovimientosEfectivo.id_movimiento.desc()).limit(1)
+    ).scalar()
+    return float(saldo or 0)
+
+
+def get_ultimo_cierre(db):
+    return db.execute(
+        select(func.max(MovimientosEfectivo.fecha)).where(MovimientosEfectivo.tipo == TIPO_CIERRE_DIARIO)
+    ).scalar()
+
+
+def get_fecha_saldo_inicial(db):
+    """Día del saldo inicial migrado desde el archivo anterior, o None si no lo hay."""
+    return db.execute(
+        select(func.max(MovimientosEfectivo.fecha)).where(
+            MovimientosEfectivo.tipo == TIPO_AJUSTE, MovimientosEfectivo.descripcion == DESCRIPCION_SALDO_INICIAL)
+    ).scalar()
+
+
+def cerrar_dias_pendientes(db, hasta=None):
+    """Registra el cierre (ventas - gastos) de cada día sin cerrar hasta `hasta` y hace commit.
+
+    Por defecto cierra hasta ayer (UTC). Si nunca se ha cerrado un día, empieza por el del
+    saldo inicial migrado, que ya incluye los anteriores, o solo cierra `hasta` si no lo
+    hay. Los días ya cerrados se ignoran, así que llamarla en cada ejecución de la página
+    es seguro. Devuelve la lista de fechas cerradas.
+    """
+    hasta = hasta or _hoy() - timedelta(days=1)
+    ultimo = get_ultimo_cierre(db)
+    if ultimo:
+        desde = ultimo + timedelta(days=1)
+    else:
+        desde = get_fecha_saldo_inicial(db) or hasta
+    desde = max(desde, hasta - timedelta(days=MAX_DIAS_POR_CERRAR - 1))
+    if desde > hasta:
+        return []
+
+    netos = {}
+    for dia, tipo, monto in get_flujo_caja(db, desde, hasta, 'dia', por_categoria=False):
+        netos[dia] = netos.get(dia, 0) + (monto if tipo == TIPO_INGRESO else -monto)
+
+    cerrados = []
+    dia = desde
+    while dia <= hasta:
+        neto = netos.get(dia, 0)
+        if _insertar(db, TIPO_CIERRE_DIARIO, dia, neto, f"Cierre del {dia:%d/%m/%Y}", ignorar_repetido=True):
+            cerrados.append(dia)
+        dia += timedelta(days=1)
+    db.commit()
+    return cerrados
+
+
+def retirar(db, monto, descripcion=None):
+    """Registra un retiro si el saldo alcanza y hace commit. Devuelve True si se registró."""
+    registrado = _insertar(db, TIPO_RETIRO, _hoy(), -abs(monto), descripcion, saldo_minimo=0)
+    db.commit()
+    return registrado
+
+
+def ajustar(db, monto, descripcion):
+    """Registra un ajuste (positivo o negativo) del saldo y hace commit."""
+    _insertar(db, TIPO_AJUSTE, _hoy(), monto, descripcion)
+    db.commit()
+
+
+def get_movimientos(db, desde, hasta):
+    """Movimientos con fecha entre dos días (inclusive), del más reciente al más antiguo."""
+    return db.execute(select(
+        MovimientosEfectivo.fecha,
+        MovimientosEfectivo.tipo,
+        MovimientosEfectivo.descripcion,
+        MovimientosEfectivo.monto,
+        MovimientosEfectivo.saldo
+    ).where(MovimientosEfectivo.fecha >= desde, MovimientosEfectivo.fecha <= hasta
+    ).order_by(MovimientosEfectivo.id_movimiento.desc())).all()
+
+
+# --- Gastos y flujo de caja ---
+def get_categorias_gasto(db):
+    """Lista de (id_categoria, nombre) ordenada por id."""
+    return db.execute(select(CategoriasGasto.id_categoria, CategoriasGasto.nombre).order_by(CategoriasGasto.id_categoria)).all()
+
+
+def agregar_gasto(db, id_categoria, descripcion, monto):
+    """Agrega un gasto y lo suma al resumen de flujo de caja sin hacer commit; devuelve su id."""
+    fecha_gasto = datetime.utcnow()
+    categoria = db.get(CategoriasGasto, id_categoria)
+    gasto = Gastos(descripcion=descripcion, monto=monto, fecha_gasto=fecha_gasto, id_categoria=id_categoria)
+    db.add(gasto)
+    registrar_flujo(db, fecha_gasto.date(), TIPO_GASTO, categoria.nombre, monto)
+    db.flush()
+    return gasto.id_gasto
+
+
+def registrar_gasto(db, id_categoria, descripcion, monto):
+    """Guarda un gasto, lo suma al resumen de flujo de caja y hace commit."""
+    agregar_gasto(db, id_categoria, descripcion, monto)
+    db.commit()
+
+
+def get_flujo_caja(db, desde, hasta, granularidad='dia', por_categoria=True):
+    """Filas (periodo, tipo, [categoria,] monto) de los periodos que tocan el rango de días.
+
+    Con granularidad 'semana' o 'mes' se incluyen completos el primer y el último periodo.
+    """
+    columnas = [ResumenFlujoCaja.periodo, ResumenFlujoCaja.tipo]
+    if por_categoria:
+        columnas.append(ResumenFlujoCaja.categoria)
+    return [(*fila[:-1], float(fila[-1])) for fila in db.execute(
+        select(*columnas, func.sum(ResumenFlujoCaja.monto)).where(
+            ResumenFlujoCaja.granularidad == granularidad,
+            ResumenFlujoCaja.periodo >= inicio_periodo(desde, granularidad),
+            ResumenFlujoCaja.periodo <= hasta
+        ).group_by(*columnas).order_by(ResumenFlujoCaja.periodo)
+    )]
+
+
+def get_totales_flujo(db, desde, hasta):
+    """(ingresos, gastos) exactos entre dos días, inclusive."""
+    totales = dict(db.execute(
+        select(ResumenFlujoCaja.tipo, func.sum(ResumenFlujoCaja.monto)).where(
+            ResumenFlujoCaja.granularidad == 'dia',
+            ResumenFlujoCaja.periodo >= desde,
+            ResumenFlujoCaja.periodo <= hasta
+        ).group_by(ResumenFlujoCaja.tipo)
+    ).all())
+    return float(totales.get(TIPO_INGRESO, 0)), float(totales.get(TIPO_GASTO, 0))
@@ -0,0 +1,131 @@
+# catalog.py
+# Caché en memoria del catálogo de productos (id -> nombre, precios, stock), compartida
+# por todas las páginas y sesiones del proceso.
+#
+# La caché se vacía sola cuando cambia la versión de datos de la base (cualquier commit,
+# ver db.get_version_datos) y las páginas la invalidan explícitamente tras sus CRUD.
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+
+import streamlit as st
+from sqlalchemy import select, func
+
+from db import engine, get_version_datos, Productos, Inventario
+
+# Número máximo de productos guardados; con catálogos más grandes el listado completo
+# se consulta cada vez y solo se guardan los productos consultados más recientemente.
+MAX_PRODUCTOS = 5000
+
+
+@dataclass(frozen=True)
+class ProductoCatalogo:
+    id_producto: int
+    nombre: str
+    descripcion: str
+    categoria: str
+    precio_compra: Decimal
+    precio_venta: Decimal
+    stock: int
+
+
+def _consulta_catalogo():
+    return select(
+        Productos.id_producto,
+        Productos.nombre,
+        Productos.descripcion,
+        Productos.categoria,
+        Productos.precio_compra,
+        Productos.precio_venta,
+        func.coalesce(Inventario.cantidad, 0),
+    ).outerjoin(Inventario, Productos.id_producto == Inventario.id_producto)
+
+
+def _cargar(ids=None):
+    stmt = _consulta_catalogo()
+    if ids is not None:
+        stmt = stmt.where(Productos.id_producto.in_(ids))
+    with engine.connect() as conn:
+        return [ProductoCatalogo(*fila) for fila in conn.execute(stmt.order_by(Productos.id_producto))]
+
+
+class CatalogoProductos:
+    def __init__(self, max_productos=MAX_PRODUCTOS):
+        self.max_productos = max_productos
+        self._lock = threading.Lock()
+        self._version = None
+        self._lista = None  # catálogo completo, si cabe en la caché
+        self._por_id = OrderedDict()  # id -> ProductoCatalogo, en orden de uso (LRU)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _limpiar(self):
+        self._lista = None
+        self._por_id.clear()
+
+    def _comprobar_version(self):
+        # La versión se lee antes de consultar: si otra conexión escribe mientras se carga,
+        # la siguiente llamada verá una versión distinta y volverá a cargar.
+        version = get_version_datos()
+        if version != self._version:
+            self._limpiar()
+            self._version = version
+
+    def _guardar(self, producto):
+        self._por_id[producto.id_producto] = producto
+        self._por_id.move_to_end(producto.id_producto)
+        while len(self._por_id) > self.max_productos:
+            self._por_id.popitem(last=False)
+            self._lista = None
+
+    def listar(self):
+        """Todos los productos con su stock, ordenados por id."""
+        with self._lock:
+            self._comprobar_version()
+            if self._lista is not None:
+                self.aciertos += 1
+                return self._lista
+            self.fallos += 1
+            productos = _cargar()
+            if len(productos) <= self.max_productos:
+                self._por_id = OrderedDict((p.id_producto, p) for p in productos)
+                self._lista = tuple(productos)
+            return productos
+
+    def obtener_varios(self, ids):
+        """Diccionario id -> ProductoCatalogo; los que falten se cargan en una sola consulta."""
+        with self._lock:
+            self._comprobar_version()
+            encontrados = {}
+            faltantes = []
+            for id_producto in ids:
+                producto = self._por_id.get(id_producto)
+                if producto is None:
+                    faltantes.append(id_producto)
+                else:
+                    self._por_id.move_to_end(id_producto)
+                    encontrados[id_producto] = producto
+            self.aciertos += len(encontrados)
+            if faltantes:
+                self.fallos += len(faltantes)
+                for producto in _cargar(faltantes):
+                    self._guardar(producto)
+                    encontrados[producto.id_producto] = producto
+            return encontrados
+
+    def obtener(self, id_producto):
+        """El producto con ese id, o None si no existe."""
+        return self.obtener_varios([id_producto]).get(id_producto)
+
+    def invalidar(self):
+        """Descarta todo lo guardado; usar después de modificar productos o inventario."""
+        with self._lock:
+            self._limpiar()
+            self._version = None
+
+
+@st.cache_resource
+def get_catalogo():
+    """Caché del catálogo compartida por todo el proceso."""
+    return CatalogoProductos()
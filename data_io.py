@@ -0,0 +1,255 @@
+# data_io.py
+# Exportación e importación de las tablas como un ZIP con un CSV por tabla.
+import atexit
+import contextlib
+import csv
+import io
+import itertools
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+import pandas as pd
+from sqlalchemy import select, Date, DateTime, Integer, Numeric
+
+from db import (engine, get_version_datos, completar_costos_unitarios, completar_categorias_gasto,
+                Productos, Inventario, Ventas, DetalleVenta, CategoriasGasto, Gastos, MovimientosEfectivo,
+                OrdenesCompra, DetalleOrdenCompra, MovimientosInventario, CortesInventario, DetalleCorteInventario,
+                ReservasStock)
+from inventory import conciliar, TIPO_IMPORTACION
+
+# Un diccionario para mapear los nombres de las tablas a sus clases de SQLAlchemy
+TABLAS = {
+    "productos": Productos,
+    "inventario": Inventario,
+    "ventas": Ventas,
+    "detalle_venta": DetalleVenta,
+    "categorias_gasto": CategoriasGasto,
+    "gastos": Gastos,
+    "ordenes_compra": OrdenesCompra,
+    "detalle_orden_compra": DetalleOrdenCompra,
+    "movimientos_inventario": MovimientosInventario,
+    "cortes_inventario": CortesInventario,
+    "detalle_corte_inventario": DetalleCorteInventario,
+    "movimientos_efectivo": MovimientosEfectivo
+}
+
+# Orden de importación: primero las tablas referenciadas por las demás
+ORDEN_IMPORTACION = ["productos", "inventario", "ventas", "detalle_venta", "categorias_gasto", "gastos",
+                     "ordenes_compra", "detalle_orden_compra", "movimientos_inventario", "cortes_inventario",
+                     "detalle_corte_inventario", "movimientos_efectivo"]
+
+# Filas leídas por lote al exportar e importar
+TAMANO_LOTE = 2000
+TAMANO_LOTE_IMPORTACION = 20000
+
+# PRAGMAs de carga rápida; sus valores originales se restauran al terminar la importación
+PRAGMAS_CARGA_RAPIDA = {
+    "synchronous": "OFF",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+}
+
+
+def _escribir_tabla(zip_file, conn, table_name, table_class):
+    # Lee la tabla por lotes y escribe cada lote directamente en el miembro CSV del ZIP.
+    # Devuelve el número de filas exportadas; las tablas vacías no se agregan al archivo.
+    tabla = table_class.__table__
+    resultado = conn.execution_options(yield_per=TAMANO_LOTE).execute(select(tabla))
+    lotes = resultado.partitions()
+    primer_lote = next(lotes, None)
+    if not primer_lote:
+        resultado.close()
+        return 0
+
+    filas = 0
+    with zip_file.open(f"{table_name}.csv", "w") as miembro:
+        texto = io.TextIOWrapper(miembro, encoding="utf-8", newline="")
+        writer = csv.writer(texto)
+        writer.writerow(resultado.keys())
+        for lote in itertools.chain([primer_lote], lotes):
+            writer.writerows(lote)
+            filas += len(lote)
+        texto.flush()
+        texto.detach()
+    return filas
+
+
+def _construir_zip(ruta):
+    # Escribe en `ruta` el ZIP con todas las tablas; devuelve el total de filas exportadas
+    total_filas = 0
+    with zipfile.ZipFile(ruta, "w", zipfile.ZIP_DEFLATED, False) as zip_file:
+        with engine.connect() as conn:
+            for table_name, table_class in TABLAS.items():
+                total_filas += _escribir_tabla(zip_file, conn, table_name, table_class)
+    return total_filas
+
+
+def _nuevo_zip():
+    # Ruta de un ZIP recién generado en el directorio temporal, o None si no hay datos
+    descriptor, ruta = tempfile.mkstemp(prefix="tienda_exportacion_", suffix=".zip")
+    os.close(descriptor)
+    try:
+        filas = _construir_zip(ruta)
+    except BaseException:
+        _borrar(ruta)
+        raise
+    if filas == 0:
+        _borrar(ruta)
+        return None
+    return ruta
+
+
+def _borrar(ruta):
+    # En Windows no se puede borrar un archivo que otra descarga tiene abierto: se deja
+    if ruta is not None:
+        with contextlib.suppress(OSError):
+            os.remove(ruta)
+
+
+# Último archivo generado, compartido por todas las sesiones del proceso
+_export_lock = threading.Lock()
+_ultimo_export = {"version": None, "ruta": None}
+atexit.register(lambda: _borrar(_ultimo_export["ruta"]))
+
+
+def _ruta_vigente():
+    # Con _export_lock tomado: la ruta del ZIP de la versión de datos actual
+    version = get_version_datos()
+    if _ultimo_export["version"] != version:
+        _borrar(_ultimo_export["ruta"])
+        _ultimo_export["ruta"] = _nuevo_zip()
+        _ultimo_export["version"] = version
+    return _ultimo_export["ruta"]
+
+
+def exportar_tablas_zip():
+    """Ruta del ZIP con todas las tablas, o None si no hay datos.
+
+    El archivo se escribe en disco leyendo por lotes, así la memoria no crece con el tamaño
+    de las tablas, y se reutiliza mientras la versión de datos de la base no cambie.
+    """
+    with _export_lock:
+        return _ruta_vigente()
+
+
+def abrir_exportacion():
+    """El ZIP vigente abierto para lectura binaria (vacío si no hay datos). Pensada para
+    st.download_button: se llama recién al descargar, así el archivo no pasa por memoria en
+    cada ejecución de la página."""
+    with _export_lock:
+        ruta = _ruta_vigente()
+        # Abierto antes de soltar el lock: si otra sesión lo reemplaza, esta lectura sigue
+        return open(ruta, "rb") if ruta else io.BytesIO()
+
+
+def exportacion_vigente():
+    """Indica si hay un ZIP generado que corresponde al estado actual de la base."""
+    with _export_lock:
+        return _ultimo_export["version"] is not None and _ultimo_export["version"] == get_version_datos()
+
+
+# --- Importación ---
+def tablas_en_zip(archivo_zip):
+    """Devuelve los nombres de tabla conocidos que trae el ZIP, en orden de importación."""
+    with zipfile.ZipFile(archivo_zip) as zip_file:
+        nombres = {n[:-len(".csv")] for n in zip_file.namelist() if n.endswith(".csv")}
+    return [t for t in ORDEN_IMPORTACION if t in nombres]
+
+
+def _convertir_columna(serie, tipo):
+    # Convierte una columna completa del lote al formato que SQLAlchemy guarda en SQLite.
+    # Los valores nulos quedan como None.
+    if isinstance(tipo, DateTime):
+        fechas = pd.to_datetime(serie, errors="coerce", format="mixed")
+        valores = fechas.dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    elif isinstance(tipo, Date):
+        fechas = pd.to_datetime(serie, errors="coerce", format="mixed")
+        valores = fechas.dt.strftime("%Y-%m-%d")
+    elif isinstance(tipo, Integer):
+        valores = pd.to_numeric(serie, errors="coerce").astype("Int64")
+    elif isinstance(tipo, Numeric):
+        valores = pd.to_numeric(serie, errors="coerce").round(tipo.scale or 2)
+    else:
+        valores = serie.astype("string")
+    return valores.astype(object).where(valores.notna(), None).tolist()
+
+
+def _leer_pragmas(conn):
+    return {nombre: conn.exec_driver_sql(f"PRAGMA {nombre}").scalar() for nombre in PRAGMAS_CARGA_RAPIDA}
+
+
+def _fijar_pragmas(conn, valores):
+    for nombre, valor in valores.items():
+        conn.exec_driver_sql(f"PRAGMA {nombre} = {valor}")
+
+
+def importar_zip(archivo_zip, progreso=None, tamano_lote=TAMANO_LOTE_IMPORTACION):
+    """Reemplaza las tablas incluidas en el ZIP con el contenido de sus CSV.
+
+    Cada CSV se lee por lotes directamente del ZIP, las columnas se convierten una vez por
+    lote y las filas se insertan con executemany, todo dentro de una sola transacción (si
+    algo falla no se modifica ninguna tabla). `progreso`, si se indica, se llama tras cada
+    lote con (tabla, filas_tabla, filas_totales, segundos). Devuelve un diccionario
+    tabla -> filas importadas.
+    """
+    importadas = {}
+    inicio = time.perf_counter()
+    total = 0
+
+    with zipfile.ZipFile(archivo_zip) as zip_file, engine.connect() as conn:
+        tablas = [t for t in ORDEN_IMPORTACION if f"{t}.csv" in zip_file.namelist()]
+        pragmas_originales = _leer_pragmas(conn)
+        _fijar_pragmas(conn, PRAGMAS_CARGA_RAPIDA)
+        conn.commit()
+        try:
+            with conn.begin():
+                # Limpiar las tablas existentes, primero las que referencian a otras
+                for table_name in reversed(tablas):
+                    conn.execute(TABLAS[table_name].__table__.delete())
+
+                for table_name in tablas:
+                    tabla = TABLAS[table_name].__table__
+                    importadas[table_name] = 0
+                    with zip_file.open(f"{table_name}.csv") as miembro:
+                        try:
+                            lotes = pd.read_csv(miembro, chunksize=tamano_lote, dtype=str, keep_default_na=False, na_values=[""])
+                            for lote in lotes:
+                                columnas = [c for c in lote.columns if c in tabla.c]
+                                if not columnas:
+                                    continue
+                                valores = [_convertir_columna(lote[c], tabla.c[c].type) for c in columnas]
+                                sql = "INSERT INTO {} ({}) VALUES ({})".format(
+                                    tabla.name, ", ".join(columnas), ", ".join("?" * len(columnas))
+                                )
+                                conn.exec_driver_sql(sql, list(zip(*valores)))
+
+                                importadas[table_name] += len(lote)
+                                total += len(lote)
+                                if progreso:
+                                    progreso(table_name, importadas[table_name], total, time.perf_counter() - inicio)
+                        except pd.errors.EmptyDataError:
+                            # CSV sin contenido: la tabla queda vacía
+                            pass
+
+                # Los apartados de carritos en curso se refieren al inventario anterior
+                if "inventario" in tablas:
+                    conn.execute(ReservasStock.__table__.delete())
+                # Lo que el diario de inventario no explica del stock importado queda como
+                # movimiento de importación
+                if {"inventario", "movimientos_inventario", "cortes_inventario"} & set(tablas):
+                    conciliar(conn, TIPO_IMPORTACION)
+                # Los ZIP exportados antes de costo_unitario no traen esa columna
+                if "detalle_venta" in tablas:
+                    completar_costos_unitarios(conn)
+                # Ni categorías ni id_categoria en los ZIP anteriores a las categorías de gasto
+                if "gastos" in tablas or "categorias_gasto" in tablas:
+                    completar_categorias_gasto(conn)
+        finally:
+            conn.rollback()
+            _fijar_pragmas(conn, pragmas_originales)
+            conn.commit()
+
+    return importadas
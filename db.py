@@ -1,8 +1,14 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Numeric, ForeignKey
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
-from datetime import datetime
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from sqlalchemy import (create_engine, event, inspect, select, func, text, Index, Column, Integer, String, Date,
+                        DateTime, Numeric, ForeignKey, MetaData, Table)
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, Session
+from datetime import date, datetime, time, timedelta
 import streamlit as st
+from diagnostics import instrumentar, medir_ejecucion
 
 # La base declarativa debe estar fuera de cualquier función
 Base = declarative_base()
@@ -11,18 +17,20 @@ Base = declarative_base()
 class Productos(Base):
     __tablename__ = 'productos'
     id_producto = Column(Integer, primary_key=True, index=True)
-    nombre = Column(String(50), nullable=False)
+    nombre = Column(String(50), nullable=False, index=True)
     descripcion = Column(String(255))
+    categoria = Column(String(50))
     precio_compra = Column(Numeric(10, 2), nullable=False)
     precio_venta = Column(Numeric(10, 2), nullable=False)
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
     inventario = relationship("Inventario", back_populates="producto", uselist=False)
     detalles_de_venta = relationship("DetalleVenta", back_populates="producto_detalle")
+    __table_args__ = (Index('ix_productos_categoria_nombre', 'categoria', 'nombre'),)
 
 class Inventario(Base):
     __tablename__ = 'inventario'
     id_inventario = Column(Integer, primary_key=True, index=True)
-    id_producto = Column(Integer, ForeignKey("productos.id_producto"))
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), index=True)
     cantidad = Column(Integer, default=0, nullable=False)
     ultima_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     producto = relationship("Productos", back_populates="inventario")
@@ -30,7 +38,7 @@ class Inventario(Base):
 class Ventas(Base):
     __tablename__ = 'ventas'
     id_venta = Column(Integer, primary_key=True, index=True)
-    fecha_venta = Column(DateTime, default=datetime.utcnow)
+    fecha_venta = Column(DateTime, default=datetime.utcnow, index=True)
     total_venta = Column(Numeric(10, 2), nullable=False)
     detalles_de_venta = relationship("DetalleVenta", back_populates="venta")
 
@@ -38,34 +46,596 @@ class DetalleVenta(Base):
     __tablename__ = 'detalle_venta'
     id_detalle = Column(Integer, primary_key=True, index=True)
     id_venta = Column(Integer, ForeignKey("ventas.id_venta"))
-    id_producto = Column(Integer, ForeignKey("productos.id_producto"))
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), index=True)
     cantidad = Column(Integer, nullable=False)
     precio_unitario = Column(Numeric(10, 2), nullable=False)
+    # Precio de compra del producto al momento de la venta
+    costo_unitario = Column(Numeric(10, 2))
     venta = relationship("Ventas", back_populates="detalles_de_venta")
     producto_detalle = relationship("Productos", back_populates="detalles_de_venta")
+    # Cubre las agregaciones de importe y ganancia por venta sin leer la tabla
+    __table_args__ = (Index('ix_detalle_venta_cubre_venta', 'id_venta', 'id_producto', 'cantidad', 'precio_unitario', 'costo_unitario'),)
+
+class CategoriasGasto(Base):
+    __tablename__ = 'categorias_gasto'
+    id_categoria = Column(Integer, primary_key=True)
+    nombre = Column(String(50), nullable=False, unique=True)
 
 class Gastos(Base):
     __tablename__ = 'gastos'
     id_gasto = Column(Integer, primary_key=True, index=True)
     descripcion = Column(String(100), nullable=False)
     monto = Column(Numeric(10, 2), nullable=False)
-    fecha_gasto = Column(DateTime, default=datetime.utcnow)
+    fecha_gasto = Column(DateTime, default=datetime.utcnow, index=True)
+    id_categoria = Column(Integer, ForeignKey("categorias_gasto.id_categoria"), index=True)
+
+# Libro de efectivo (ver cash.py): cada movimiento guarda el saldo resultante, así el saldo
+# actual es la última fila. Los cierres diarios son únicos por fecha.
+class MovimientosEfectivo(Base):
+    __tablename__ = 'movimientos_efectivo'
+    id_movimiento = Column(Integer, primary_key=True)
+    tipo = Column(String(20), nullable=False)  # cierre_diario, retiro o ajuste
+    fecha = Column(Date, nullable=False)
+    monto = Column(Numeric(12, 2), nullable=False)  # positivo entra a caja, negativo sale
+    saldo = Column(Numeric(12, 2), nullable=False)
+    descripcion = Column(String(255))
+    fecha_registro = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_movimientos_efectivo_fecha', 'fecha'),
+        Index('ux_movimientos_efectivo_cierre', 'fecha', unique=True, sqlite_where=text("tipo = 'cierre_diario'")),
+    )
+
+# Tablas de resumen: se actualizan en la misma transacción de cada venta (ver rollups.py)
+# para que el Dashboard y los Reportes lean pocas filas en lugar de recorrer todo el historial.
+class ResumenVentasDiario(Base):
+    __tablename__ = 'resumen_ventas_diario'
+    fecha = Column(Date, primary_key=True)
+    total_ventas = Column(Numeric(12, 2), default=0, nullable=False)
+    num_transacciones = Column(Integer, default=0, nullable=False)
+    unidades_vendidas = Column(Integer, default=0, nullable=False)
+    ganancia = Column(Numeric(12, 2), default=0, nullable=False)
+
+class ResumenProductosDiario(Base):
+    __tablename__ = 'resumen_productos_diario'
+    fecha = Column(Date, primary_key=True)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), primary_key=True)
+    total_ventas = Column(Numeric(12, 2), default=0, nullable=False)
+    num_transacciones = Column(Integer, default=0, nullable=False)
+    unidades_vendidas = Column(Integer, default=0, nullable=False)
+    ganancia = Column(Numeric(12, 2), default=0, nullable=False)
+
+# Ingresos y gastos por periodo (día, semana que empieza en lunes, mes) y categoría.
+# Los ingresos son las ventas, con la categoría 'Ventas'.
+class ResumenFlujoCaja(Base):
+    __tablename__ = 'resumen_flujo_caja'
+    granularidad = Column(String(10), primary_key=True)  # dia, semana o mes
+    periodo = Column(Date, primary_key=True)  # primer día del periodo
+    tipo = Column(String(10), primary_key=True)  # ingreso o gasto
+    categoria = Column(String(50), primary_key=True)
+    monto = Column(Numeric(12, 2), default=0, nullable=False)
+    num_movimientos = Column(Integer, default=0, nullable=False)
+
+# Órdenes de compra: cada recepción de mercancía (ver purchasing.py) guarda su encabezado,
+# sus líneas con el costo pagado y, si se registró, el gasto correspondiente.
+class OrdenesCompra(Base):
+    __tablename__ = 'ordenes_compra'
+    id_orden = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    proveedor = Column(String(100))
+    total = Column(Numeric(12, 2), nullable=False)
+    id_gasto = Column(Integer, ForeignKey("gastos.id_gasto"))
+    lineas = relationship("DetalleOrdenCompra", back_populates="orden")
+
+class DetalleOrdenCompra(Base):
+    __tablename__ = 'detalle_orden_compra'
+    id_detalle = Column(Integer, primary_key=True)
+    id_orden = Column(Integer, ForeignKey("ordenes_compra.id_orden"), nullable=False, index=True)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False, index=True)
+    cantidad = Column(Integer, nullable=False)
+    costo_unitario = Column(Numeric(10, 2), nullable=False)
+    orden = relationship("OrdenesCompra", back_populates="lineas")
+
+# Diario de movimientos de inventario (ver inventory.py): cada cambio de stock (venta,
+# reabasto, ajuste manual o importación) agrega una fila con la cantidad con signo; nunca se
+# modifican ni se borran. `id_referencia` es el id_venta o id_orden que lo originó.
+class MovimientosInventario(Base):
+    __tablename__ = 'movimientos_inventario'
+    id_movimiento = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    tipo = Column(String(20), nullable=False)
+    cantidad = Column(Integer, nullable=False)
+    id_referencia = Column(Integer)
+    __table_args__ = (
+        # Historial de un producto por rango de movimientos
+        Index('ix_movimientos_inventario_producto', 'id_producto', 'id_movimiento', 'cantidad'),
+        # Reportes por tipo y rango de fechas sin leer la tabla
+        Index('ix_movimientos_inventario_tipo_fecha', 'tipo', 'fecha', 'id_producto', 'cantidad'),
+        # Límite en ids de un momento dado (inventory._ULTIMO_MOVIMIENTO_ANTES)
+        Index('ix_movimientos_inventario_fecha_id', 'fecha', 'id_movimiento'),
+    )
+
+# Cortes de inventario: el stock de cada producto después del movimiento `id_movimiento`.
+# El stock en cualquier momento es el último corte anterior más los movimientos que siguen.
+class CortesInventario(Base):
+    __tablename__ = 'cortes_inventario'
+    id_corte = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False)
+    id_movimiento = Column(Integer, nullable=False, index=True)
+
+class DetalleCorteInventario(Base):
+    __tablename__ = 'detalle_corte_inventario'
+    id_corte = Column(Integer, ForeignKey("cortes_inventario.id_corte"), primary_key=True)
+    id_producto = Column(Integer, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+
+# Tandas de ventas movidas al archivo histórico (ver archive.py). Lo archivado es siempre
+# un prefijo de id_venta: todas las ventas hasta ultimo_id_venta están en el archivo y
+# ninguna de la base principal tiene un id menor.
+class CortesArchivo(Base):
+    __tablename__ = 'cortes_archivo'
+    id_corte = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Fecha de corte pedida: en la base principal no queda ninguna venta anterior a ella
+    # con id menor que la primera posterior
+    hasta = Column(Date, nullable=False)
+    ultimo_id_venta = Column(Integer, nullable=False)
+    ultimo_id_detalle = Column(Integer, nullable=False)
+    ventas = Column(Integer, nullable=False)
+    lineas = Column(Integer, nullable=False)
+    total_ventas = Column(Numeric(12, 2), nullable=False)
+
+# Vistas temporales que cada conexión crea si existe el archivo: las filas de la base
+# principal más las archivadas. No forman parte de Base.metadata (create_all no las crea).
+_metadata_vistas = MetaData()
+VentasHistoricas = Table(
+    'ventas_historicas', _metadata_vistas,
+    Column('id_venta', Integer, primary_key=True),
+    Column('fecha_venta', DateTime),
+    Column('total_venta', Numeric(10, 2)),
+)
+DetalleVentaHistorica = Table(
+    'detalle_venta_historica', _metadata_vistas,
+    Column('id_detalle', Integer, primary_key=True),
+    Column('id_venta', Integer),
+    Column('id_producto', Integer),
+    Column('cantidad', Integer),
+    Column('precio_unitario', Numeric(10, 2)),
+    Column('costo_unitario', Numeric(10, 2)),
+)
+
+# Apartados de stock de los carritos en curso (ver reservations.py): el stock disponible
+# para un carrito es inventario.cantidad menos los apartados vigentes de los demás.
+# Viven en su propio archivo, adjunto a cada conexión como el esquema `reservas`: apartar
+# y liberar en cada clic no confirma cambios en la base principal, así no mueven
+# PRAGMA data_version ni invalidan las cachés que dependen de él (get_version_datos).
+ESQUEMA_RESERVAS = "reservas"
+
+class ReservasStock(Base):
+    __tablename__ = 'reservas_stock'
+    id_reserva = Column(Integer, primary_key=True)
+    id_carrito = Column(String(32), nullable=False)
+    id_producto = Column(Integer, ForeignKey("productos.id_producto"), nullable=False)
+    cantidad = Column(Integer, nullable=False)
+    expira = Column(DateTime, nullable=False)
+    __table_args__ = (
+        Index('ux_reservas_stock_carrito_producto', 'id_carrito', 'id_producto', unique=True),
+        # Cubre la suma de los apartados vigentes de un producto
+        Index('ix_reservas_stock_producto_expira', 'id_producto', 'expira', 'cantidad', 'id_carrito'),
+        Index('ix_reservas_stock_expira', 'expira'),
+        {'schema': ESQUEMA_RESERVAS},
+    )
+
+# Último cobro de cada carrito, en la base principal y en la misma transacción que la venta.
+# SQLite no confirma de forma atómica una transacción que escribe en dos archivos en modo
+# WAL: si la venta queda confirmada y el borrado de sus apartados no, la limpieza de
+# reservations.py descarta los apartados que vencen hasta `cubre_hasta` (los hechos antes
+# del cobro). Los de un carrito siguiente con el mismo id vencen después y se conservan.
+class CarritosCobrados(Base):
+    __tablename__ = 'carritos_cobrados'
+    id_carrito = Column(String(32), primary_key=True)
+    cubre_hasta = Column(DateTime, nullable=False)
+
+# --- Rangos de fechas ---
+# Los filtros por día se escriben como rangos semiabiertos [inicio, fin) sobre la columna
+# original, así SQLite puede usar los índices de fecha (func.date(columna) lo impide).
+def rango_dias(inicio, fin=None):
+    """Devuelve (desde, hasta) para filtrar `desde <= columna < hasta` entre dos días inclusive."""
+    fin = fin or inicio
+    return datetime.combine(inicio, time.min), datetime.combine(fin + timedelta(days=1), time.min)
+
+# --- Archivo histórico ---
+# Las lecturas de ventas pasan por las vistas históricas solo cuando su rango (de fechas o
+# de ids) empieza antes de lo que queda en la base; el resto lee las tablas de siempre.
+LimitesArchivo = namedtuple('LimitesArchivo', ['hasta', 'ultimo_id_venta', 'ultimo_id_detalle', 'ventas', 'lineas', 'total_ventas'])
+SIN_ARCHIVO = LimitesArchivo(hasta=None, ultimo_id_venta=0, ultimo_id_detalle=0, ventas=0, lineas=0, total_ventas=0.0)
+
+def get_limites_archivo(conn):
+    """Lo movido al archivo histórico, sumando todas sus tandas; SIN_ARCHIVO si no hay archivo."""
+    if not os.path.exists(archivo_path):
+        return SIN_ARCHIVO
+    fila = conn.execute(select(
+        func.max(CortesArchivo.hasta),
+        func.coalesce(func.max(CortesArchivo.ultimo_id_venta), 0),
+        func.coalesce(func.max(CortesArchivo.ultimo_id_detalle), 0),
+        func.coalesce(func.sum(CortesArchivo.ventas), 0),
+        func.coalesce(func.sum(CortesArchivo.lineas), 0),
+        func.coalesce(func.sum(CortesArchivo.total_ventas), 0),
+    )).one()
+    return LimitesArchivo(fila[0], fila[1], fila[2], fila[3], fila[4], float(fila[5]))
+
+def tablas_ventas(conn, desde=None):
+    """(ventas, detalle_venta) para leer las ventas a partir del día `desde` (None: todo el
+    historial): las tablas de la base, o las vistas históricas si el rango empieza antes
+    del corte del archivo."""
+    hasta = get_limites_archivo(conn).hasta
+    if hasta is not None and (desde is None or desde < hasta):
+        return VentasHistoricas, DetalleVentaHistorica
+    return Ventas.__table__, DetalleVenta.__table__
+
+def consultas_ventas(sql):
+    """(consulta sobre la base, consulta sobre las vistas históricas) de un SQL escrito
+    con {ventas} y {detalle_venta} en lugar de los nombres de las tablas."""
+    return (
+        text(sql.format(ventas=Ventas.__tablename__, detalle_venta=DetalleVenta.__tablename__)),
+        text(sql.format(ventas=VentasHistoricas.name, detalle_venta=DetalleVentaHistorica.name)),
+    )
+
+# --- Migraciones ---
+# La versión del esquema se guarda en PRAGMA user_version. Cada migración lleva la base
+# de la versión N-1 a la N y debe ser idempotente: SQLite ejecuta el DDL fuera de la
+# transacción, así que si algo falla a medias la migración se vuelve a aplicar completa.
+# Las bases nuevas también pasan por todas las migraciones, que crean lo que create_all
+# no sabe crear (tablas virtuales, triggers).
+def _migracion_resumenes(conn):
+    # Tablas de resumen diario (rollups.py); se llenan a partir del historial de ventas en
+    # _migracion_completar_costos, cuando el esquema ya está completo
+    ResumenVentasDiario.__table__.create(conn, checkfirst=True)
+    ResumenProductosDiario.__table__.create(conn, checkfirst=True)
+
+def _migracion_indices_fechas(conn):
+    # Índices para los filtros por fecha y los joins de detalle_venta e inventario
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_ventas_fecha_venta ON ventas (fecha_venta)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_gastos_fecha_gasto ON gastos (fecha_gasto)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_detalle_venta_id_venta ON detalle_venta (id_venta)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_detalle_venta_id_producto ON detalle_venta (id_producto)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_inventario_id_producto ON inventario (id_producto)")
+
+def _agregar_columna(conn, tabla, columna, definicion):
+    # ALTER TABLE ... ADD COLUMN solo si la columna todavía no existe
+    if columna not in {c['name'] for c in inspect(conn).get_columns(tabla)}:
+        conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+def _migracion_categorias(conn):
+    # Categoría de producto e índices para paginar el catálogo por nombre
+    _agregar_columna(conn, "productos", "categoria", "VARCHAR(50)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_productos_nombre ON productos (nombre)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_productos_categoria_nombre ON productos (categoria, nombre)")
+
+def _migracion_busqueda_productos(conn):
+    # Índice de texto completo (FTS5) sobre nombre y descripción, sin distinguir acentos y
+    # con índices de prefijo. Es de contenido externo: los triggers lo mantienen al día.
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+            nombre, descripcion,
+            content='productos', content_rowid='id_producto',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO productos_fts(rowid, nombre, descripcion)
+            VALUES (new.id_producto, new.nombre, new.descripcion);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+            INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion)
+            VALUES ('delete', old.id_producto, old.nombre, old.descripcion);
+        END""")
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF nombre, descripcion ON productos BEGIN
+            INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion)
+            VALUES ('delete', old.id_producto, old.nombre, old.descripcion);
+            INSERT INTO productos_fts(rowid, nombre, descripcion)
+            VALUES (new.id_producto, new.nombre, new.descripcion);
+        END""")
+    conn.exec_driver_sql("INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')")
+    conn.exec_driver_sql("INSERT INTO productos_fts(productos_fts) VALUES ('optimize')")
+
+def completar_costos_unitarios(conn):
+    # Detalles sin costo (anteriores a la columna o importados de un CSV que no la trae):
+    # se toma el precio de compra actual del producto.
+    conn.exec_driver_sql("""
+        UPDATE detalle_venta SET costo_unitario = (
+            SELECT precio_compra FROM productos WHERE productos.id_producto = detalle_venta.id_producto
+        ) WHERE costo_unitario IS NULL""")
+
+def _migracion_costo_unitario(conn):
+    # Costo unitario en cada detalle e índice que cubre las agregaciones por venta;
+    # reemplaza al índice simple de id_venta, que es prefijo del nuevo.
+    _agregar_columna(conn, "detalle_venta", "costo_unitario", "NUMERIC(10, 2)")
+    completar_costos_unitarios(conn)
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_detalle_venta_cubre_venta "
+        "ON detalle_venta (id_venta, id_producto, cantidad, precio_unitario, costo_unitario)"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_detalle_venta_id_venta")
+
+# Archivo que guardaba el efectivo acumulado antes del libro de efectivo
+ARCHIVO_EFECTIVO_ANTERIOR = "efectivo_acumulado.txt"
+# El saldo de ese archivo ya sumaba los días anteriores al de la migración (cash.py)
+DESCRIPCION_SALDO_INICIAL = f"Saldo inicial ({ARCHIVO_EFECTIVO_ANTERIOR})"
+
+def _migracion_movimientos_efectivo(conn):
+    # Libro de efectivo; el saldo del archivo anterior, si existe, queda como ajuste inicial
+    MovimientosEfectivo.__table__.create(conn, checkfirst=True)
+    for indice in MovimientosEfectivo.__table__.indexes:
+        indice.create(conn, checkfirst=True)
+    vacia = conn.exec_driver_sql("SELECT 1 FROM movimientos_efectivo LIMIT 1").first() is None
+    if vacia and os.path.exists(ARCHIVO_EFECTIVO_ANTERIOR):
+        with open(ARCHIVO_EFECTIVO_ANTERIOR) as f:
+            saldo = round(float(f.read() or 0), 2)
+        conn.execute(MovimientosEfectivo.__table__.insert().values(
+            tipo='ajuste', fecha=datetime.utcnow().date(), monto=saldo, saldo=saldo,
+            descripcion=DESCRIPCION_SALDO_INICIAL, fecha_registro=datetime.utcnow()
+        ))
+
+# Categorías de gasto iniciales: las opciones fijas que ofrecía el formulario de gastos.
+# Los gastos cuya descripción no es una de ellas quedan en 'Otro'.
+CATEGORIAS_GASTO = ["Renta Diaria", "Salario", "Inventario", "Gasolina", "Otro"]
+CATEGORIA_GASTO_OTRO = "Otro"
+# Categoría de los gastos que genera la recepción de una orden de compra
+CATEGORIA_GASTO_INVENTARIO = "Inventario"
+
+def completar_categorias_gasto(conn):
+    # Crea las categorías iniciales que falten y asigna categoría a los gastos sin ella
+    for nombre in CATEGORIAS_GASTO:
+        conn.execute(text("INSERT OR IGNORE INTO categorias_gasto (nombre) VALUES (:nombre)"), {"nombre": nombre})
+    conn.execute(text("""
+        UPDATE gastos SET id_categoria = COALESCE(
+            (SELECT id_categoria FROM categorias_gasto WHERE nombre = gastos.descripcion),
+            (SELECT id_categoria FROM categorias_gasto WHERE nombre = :otro)
+        ) WHERE id_categoria IS NULL"""), {"otro": CATEGORIA_GASTO_OTRO})
+
+def _migracion_flujo_caja(conn):
+    # Categorías de gasto y resumen de flujo de caja por día, semana y mes
+    CategoriasGasto.__table__.create(conn, checkfirst=True)
+    _agregar_columna(conn, "gastos", "id_categoria", "INTEGER REFERENCES categorias_gasto (id_categoria)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_gastos_id_categoria ON gastos (id_categoria)")
+    completar_categorias_gasto(conn)
+    existia = inspect(conn).has_table(ResumenFlujoCaja.__tablename__)
+    ResumenFlujoCaja.__table__.create(conn, checkfirst=True)
+    if not existia:
+        from rollups import reconstruir_flujo_caja
+        reconstruir_flujo_caja(Session(bind=conn))
+
+def _migracion_reservas_stock(conn):
+    # Apartados de stock de los carritos en curso
+    ReservasStock.__table__.create(conn, checkfirst=True)
+    for indice in ReservasStock.__table__.indexes:
+        indice.create(conn, checkfirst=True)
+
+def _migracion_ordenes_compra(conn):
+    # Encabezado y líneas de las órdenes de compra
+    for tabla in (OrdenesCompra.__table__, DetalleOrdenCompra.__table__):
+        tabla.create(conn, checkfirst=True)
+        for indice in tabla.indexes:
+            indice.create(conn, checkfirst=True)
+
+def _migracion_movimientos_inventario(conn):
+    # Diario de movimientos y cortes de inventario. El primer corte es el stock actual, así
+    # el diario empieza cuadrado con `inventario` aunque no tenga movimientos anteriores.
+    for tabla in (MovimientosInventario.__table__, CortesInventario.__table__, DetalleCorteInventario.__table__):
+        tabla.create(conn, checkfirst=True)
+        for indice in tabla.indexes:
+            indice.create(conn, checkfirst=True)
+    if conn.exec_driver_sql("SELECT COUNT(*) FROM cortes_inventario").scalar() == 0:
+        id_corte = conn.execute(CortesInventario.__table__.insert().values(
+            fecha=datetime.utcnow(), id_movimiento=0
+        )).inserted_primary_key[0]
+        conn.execute(text("""
+            INSERT INTO detalle_corte_inventario (id_corte, id_producto, cantidad)
+            SELECT :id_corte, id_producto, SUM(cantidad) FROM inventario
+            GROUP BY id_producto HAVING SUM(cantidad) <> 0
+        """), {"id_corte": id_corte})
+
+def _migracion_cortes_archivo(conn):
+    # Registro de las ventas movidas al archivo histórico
+    CortesArchivo.__table__.create(conn, checkfirst=True)
+
+def _migracion_reservas_aparte(conn):
+    # Los apartados pasan al archivo de reservas (lo crea _crear_base); los de la base
+    # principal vencen en minutos y se descartan
+    conn.exec_driver_sql("DROP TABLE IF EXISTS main.reservas_stock")
+
+def _migracion_completar_costos(conn):
+    # Costo de los detalles que aún no lo tienen y resúmenes de las bases anteriores a
+    # ellos. Va después de todas las demás: la reconstrucción usa el código actual de
+    # rollups.py, que lee columnas agregadas por migraciones posteriores a la primera.
+    completar_costos_unitarios(conn)
+    sin_resumen = conn.exec_driver_sql("SELECT NOT EXISTS (SELECT 1 FROM resumen_ventas_diario)").scalar()
+    if sin_resumen and conn.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM ventas)").scalar():
+        from rollups import reconstruir_resumenes
+        reconstruir_resumenes(Session(bind=conn))
+
+def _migracion_indice_fecha_movimientos(conn):
+    # Índice (fecha, id_movimiento) para ubicar un momento en el diario; reemplaza al de
+    # solo fecha
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movimientos_inventario_fecha_id "
+        "ON movimientos_inventario (fecha, id_movimiento)"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_movimientos_inventario_fecha")
+
+def _migracion_carritos_cobrados(conn):
+    # Cobros recientes por carrito, para descartar apartados de carritos ya vendidos
+    CarritosCobrados.__table__.create(conn, checkfirst=True)
+
+MIGRACIONES = [
+    _migracion_resumenes,
+    _migracion_indices_fechas,
+    _migracion_categorias,
+    _migracion_busqueda_productos,
+    _migracion_costo_unitario,
+    _migracion_movimientos_efectivo,
+    _migracion_flujo_caja,
+    _migracion_reservas_stock,
+    _migracion_ordenes_compra,
+    _migracion_movimientos_inventario,
+    _migracion_cortes_archivo,
+    _migracion_reservas_aparte,
+    _migracion_completar_costos,
+    _migracion_indice_fecha_movimientos,
+    _migracion_carritos_cobrados,
+]
+VERSION_ESQUEMA = len(MIGRACIONES)
+
+def get_version_esquema(conn):
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def aplicar_migraciones(engine):
+    """Aplica en orden las migraciones pendientes. Devuelve la lista de versiones aplicadas."""
+    aplicadas = []
+    with engine.begin() as conn:
+        version = get_version_esquema(conn)
+        for numero in range(version + 1, VERSION_ESQUEMA + 1):
+            MIGRACIONES[numero - 1](conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {numero}")
+            aplicadas.append(numero)
+    return aplicadas
 
 # Define la ruta de la base de datos dentro de la carpeta 'data'.
+# TIENDA_DB_PATH permite apuntar a otra base (pruebas de rendimiento, datos sintéticos).
 basedir = os.path.abspath(os.path.dirname(__file__))
-db_path = os.path.join(basedir, "data", "tienda_escolar.db")
+db_path = os.environ.get("TIENDA_DB_PATH", os.path.join(basedir, "data", "tienda_escolar.db"))
 DATABASE_URL = f"sqlite:///{db_path}"
+# Archivo histórico con las ventas de periodos cerrados (archive.py), junto a la base
+archivo_path = os.environ.get("TIENDA_ARCHIVO_PATH", os.path.splitext(db_path)[0] + "_archivo.db")
+ESQUEMA_ARCHIVO = "archivo"
+# Apartados de stock de los carritos en curso; se crea solo si no existe
+reservas_path = os.environ.get("TIENDA_RESERVAS_PATH", os.path.splitext(db_path)[0] + "_reservas.db")
+
+# Configuración de cada conexión nueva: WAL permite que las lecturas no bloqueen a la
+# escritura (y viceversa), busy_timeout espera al lock en lugar de fallar con
+# "database is locked" y synchronous=NORMAL es seguro con WAL y mucho más rápido.
+PRAGMAS_CONEXION = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": "5000",
+    "cache_size": "-16384",
+    "foreign_keys": "OFF",
+}
+TAMANO_POOL = 10
+MAX_OVERFLOW = 20
+
+# Contadores de uso de la base, para confirmar que las sesiones no se bloquean entre sí
+_estadisticas = {"conexiones_creadas": 0, "bloqueos": 0}
+
+def _sql_vista_historica(vista, tabla):
+    # Filas de la base más las archivadas. Las archivadas se limitan a ids menores que la
+    # primera venta de la base: si una tanda quedó copiada pero no borrada, no se duplica.
+    columnas = ", ".join(c.name for c in vista.columns)
+    return (
+        f"CREATE TEMP VIEW IF NOT EXISTS {vista.name} AS "
+        f"SELECT {columnas} FROM main.{tabla} "
+        f"UNION ALL SELECT {columnas} FROM {ESQUEMA_ARCHIVO}.{tabla} "
+        f"WHERE id_venta < (SELECT MIN(id_venta) FROM main.ventas)"
+    )
+
+def _adjuntar_archivo(cursor):
+    cursor.execute(f"ATTACH DATABASE ? AS {ESQUEMA_ARCHIVO}", (archivo_path,))
+    cursor.execute(_sql_vista_historica(VentasHistoricas, Ventas.__tablename__))
+    cursor.execute(_sql_vista_historica(DetalleVentaHistorica, DetalleVenta.__tablename__))
+
+def _configurar_conexion(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for nombre, valor in PRAGMAS_CONEXION.items():
+        cursor.execute(f"PRAGMA {nombre} = {valor}")
+    cursor.execute(f"ATTACH DATABASE ? AS {ESQUEMA_RESERVAS}", (reservas_path,))
+    cursor.execute(f"PRAGMA {ESQUEMA_RESERVAS}.journal_mode = WAL")
+    cursor.execute(f"PRAGMA {ESQUEMA_RESERVAS}.synchronous = NORMAL")
+    # El archivo se adjunta al abrir la conexión: ATTACH no puede ejecutarse dentro de
+    # una transacción. Solo se lee a través de él cuando el rango lo pide (tablas_ventas).
+    if os.path.exists(archivo_path):
+        _adjuntar_archivo(cursor)
+    cursor.close()
+    _estadisticas["conexiones_creadas"] += 1
+
+def _contar_bloqueos(contexto):
+    if "database is locked" in str(contexto.original_exception):
+        _estadisticas["bloqueos"] += 1
+
+def _crear_base(engine):
+    # Crea las tablas solo si el archivo de la base de datos no existe.
+    # Esto previene que se borre si ya está en el repositorio.
+    if not os.path.exists(db_path):
+        # Asegúrate de que la carpeta 'data' exista antes de crear el archivo.
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        Base.metadata.create_all(bind=engine)
+        st.info("Base de datos y tablas creadas por primera vez.")
+
+    # Aplica las migraciones pendientes (todas, si la base es nueva)
+    aplicar_migraciones(engine)
+    # El archivo de reservas no tiene versión: si falta (o es nuevo) se crea su tabla
+    ReservasStock.__table__.create(engine, checkfirst=True)
+
+@st.cache_resource
+def get_recursos_db():
+    """Crea una sola vez por proceso el motor y la fábrica de sesiones compartidos."""
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=TAMANO_POOL,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=30,
+        connect_args={"timeout": 5, "check_same_thread": False},
+    )
+    event.listen(engine, "connect", _configurar_conexion)
+    event.listen(engine, "handle_error", _contar_bloqueos)
+    # Conteo y tiempos de las consultas de cada ejecución de página (ver diagnostics.py)
+    instrumentar(engine)
+    _crear_base(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return engine, session_factory
+
+# Motor y fábrica de sesiones compartidos por todas las páginas y sesiones del navegador
+engine, SessionLocal = get_recursos_db()
+
+@contextmanager
+def get_db():
+    """Sesión para una ejecución de página; se cierra siempre al salir del bloque `with`.
+
+    Las consultas del bloque se registran como una ejecución de la página en curso.
+    """
+    db = SessionLocal()
+    try:
+        with medir_ejecucion():
+            yield db
+    finally:
+        db.close()
+
+def get_estadisticas_pool():
+    """Estado del pool de conexiones y contadores de uso de la base."""
+    pool = engine.pool
+    return {
+        "tamano_pool": pool.size(),
+        "conexiones_en_uso": pool.checkedout(),
+        "conexiones_libres": pool.checkedin(),
+        "desborde": pool.overflow(),
+        "conexiones_creadas": _estadisticas["conexiones_creadas"],
+        "errores_por_bloqueo": _estadisticas["bloqueos"],
+    }
 
-# Crea el motor de la base de datos
-engine = create_engine(DATABASE_URL)
+# --- Contador de cambios ---
+# PRAGMA data_version cambia en una conexión cada vez que *otra* conexión confirma una
+# escritura. Con una conexión dedicada que nunca escribe se obtiene un contador global y
+# muy barato para invalidar cachés en memoria (cualquier commit lo cambia).
+_conexion_observadora = None
+_lock_observadora = threading.Lock()
 
-# Crea las tablas solo si el archivo de la base de datos no existe.
-# Esto previene que se borre si ya está en el repositorio.
-if not os.path.exists(db_path):
-    # Asegúrate de que la carpeta 'data' exista antes de crear el archivo.
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    Base.metadata.create_all(bind=engine)
-    st.info("Base de datos y tablas creadas por primera vez.")
+def get_version_datos():
+    """Devuelve un número que cambia cada vez que se confirma un cambio en la base de datos."""
+    global _conexion_observadora
+    with _lock_observadora:
+        if _conexion_observadora is None:
+            _conexion_observadora = sqlite3.connect(db_path, check_same_thread=False)
+        return _conexion_observadora.execute("PRAGMA data_version").fetchone()[0]
 
-# Crea una sesión para interactuar con la base de datos
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
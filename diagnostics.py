@@ -0,0 +1,272 @@
+# diagnostics.py
+# Instrumentación de las consultas SQL: cuántas hace cada ejecución de una página, cuánto
+# tardan y cuáles se repiten.
+#
+# Los eventos before/after_cursor_execute del motor (db.py) miden cada sentencia y la
+# anotan en la ejecución en curso del hilo, que abre get_db() (o medir_ejecucion). Al
+# cerrarse se guarda su resumen (consultas, tiempo total, p95, las más lentas y las que se
+# repitieron, posibles N+1) en un registro circular compartido por el proceso. Las
+# consultas fuera de una ejecución (hilos de fondo, funciones en caché de páginas que no
+# abren sesión) solo suman a los totales de su origen.
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+from sqlalchemy import event
+
+# Ejecuciones guardadas en el registro, de todas las páginas
+MAX_EJECUCIONES = 500
+# Sentencias más lentas guardadas por ejecución
+MAX_LENTAS = 5
+# Veces que la misma sentencia debe repetirse en una ejecución para marcarla como N+1
+UMBRAL_N_MAS_1 = 5
+# Caracteres guardados de cada sentencia
+LARGO_SQL = 300
+
+FORMATO_JSON = "json"
+FORMATO_PROMETHEUS = "prometheus"
+
+
+@dataclass
+class ResumenEjecucion:
+    pagina: str
+    inicio: datetime
+    duracion_ms: float
+    consultas: int
+    tiempo_sql_ms: float
+    p95_ms: float
+    lentas: list  # [(sentencia, ms)], de la más lenta a la menos
+    repetidas: dict  # sentencia -> veces, solo las que llegan a UMBRAL_N_MAS_1
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por el rango más cercano; 0.0 si no hay valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, round(p / 100 * (len(ordenados) - 1)))]
+
+
+def _sql_corto(sentencia):
+    return " ".join(sentencia.split())[:LARGO_SQL]
+
+
+class _Ejecucion:
+    __slots__ = ('pagina', 'inicio', 't0', 'consultas')
+
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = datetime.now()
+        self.t0 = time.perf_counter()
+        self.consultas = []  # (sentencia, ms)
+
+    def resumir(self):
+        tiempos = [ms for _, ms in self.consultas]
+        veces = Counter(sentencia for sentencia, _ in self.consultas)
+        return ResumenEjecucion(
+            pagina=self.pagina,
+            inicio=self.inicio,
+            duracion_ms=round((time.perf_counter() - self.t0) * 1000, 2),
+            consultas=len(self.consultas),
+            tiempo_sql_ms=round(sum(tiempos), 2),
+            p95_ms=round(percentil(tiempos, 95), 3),
+            lentas=[(_sql_corto(s), round(ms, 3)) for s, ms in heapq.nlargest(MAX_LENTAS, self.consultas, key=lambda c: c[1])],
+            repetidas={_sql_corto(s): n for s, n in veces.items() if n >= UMBRAL_N_MAS_1},
+        )
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_ejecuciones = deque(maxlen=MAX_EJECUCIONES)
+_fuera_de_ejecucion = {}  # origen -> [consultas, tiempo_ms]
+
+
+def _nombre_pagina():
+    # Página de Streamlit que corre en este hilo, o None fuera de Streamlit
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is None:
+            return None
+        pagina = ctx.pages_manager.get_pages().get(ctx.pages_manager.current_page_script_hash)
+        if pagina and pagina.get("page_name"):
+            return pagina["page_name"]
+        return os.path.splitext(os.path.basename(ctx.main_script_path))[0]
+    except Exception:
+        return None
+
+
+def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+    conn.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, sentencia, parametros, contexto, executemany):
+    ms = (time.perf_counter() - conn.info['inicio_consultas'].pop()) * 1000
+    _local.tiempo_sql = getattr(_local, 'tiempo_sql', 0.0) + ms
+    ejecucion = getattr(_local, 'ejecucion', None)
+    if ejecucion is not None:
+        ejecucion.consultas.append((sentencia, ms))
+        return
+    origen = _nombre_pagina() or threading.current_thread().name
+    with _lock:
+        totales = _fuera_de_ejecucion.setdefault(origen, [0, 0.0])
+        totales[0] += 1
+        totales[1] += ms
+
+
+def tiempo_sql_hilo():
+    """Milisegundos acumulados en consultas por el hilo actual; la diferencia entre dos
+    lecturas es el tiempo SQL de lo que corrió entre ellas."""
+    return getattr(_local, 'tiempo_sql', 0.0)
+
+
+def instrumentar(engine):
+    """Mide todas las sentencias que ejecute el motor."""
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _despues)
+
+
+@contextmanager
+def medir_ejecucion(pagina=None):
+    """Agrupa las consultas del bloque en una ejecución de `pagina` (por omisión, la página
+    de Streamlit en curso o el nombre del hilo). Dentro de otra ejecución no hace nada."""
+    if getattr(_local, 'ejecucion', None) is not None:
+        yield
+        return
+    ejecucion = _Ejecucion(pagina or _nombre_pagina() or threading.current_thread().name)
+    _local.ejecucion = ejecucion
+    try:
+        yield
+    finally:
+        _local.ejecucion = None
+        resumen = ejecucion.resumir()
+        with _lock:
+            _ejecuciones.append(resumen)
+
+
+def get_ejecuciones():
+    """Resúmenes guardados, de la ejecución más reciente a la más antigua."""
+    with _lock:
+        return list(reversed(_ejecuciones))
+
+
+def get_fuera_de_ejecucion():
+    """Diccionario origen -> (consultas, tiempo_ms) de las consultas fuera de una ejecución."""
+    with _lock:
+        return {origen: (n, round(ms, 2)) for origen, (n, ms) in _fuera_de_ejecucion.items()}
+
+
+def reiniciar():
+    with _lock:
+        _ejecuciones.clear()
+        _fuera_de_ejecucion.clear()
+
+
+def resumen_por_pagina(ejecuciones=None):
+    """Una fila por página con sus ejecuciones, consultas y tiempos promedio, el p95 del
+    tiempo SQL por ejecución y cuántas ejecuciones tuvieron posibles N+1."""
+    por_pagina = {}
+    for e in get_ejecuciones() if ejecuciones is None else ejecuciones:
+        por_pagina.setdefault(e.pagina, []).append(e)
+    filas = []
+    for pagina, lista in sorted(por_pagina.items()):
+        tiempos_sql = [e.tiempo_sql_ms for e in lista]
+        filas.append({
+            "pagina": pagina,
+            "ejecuciones": len(lista),
+            "consultas_promedio": round(sum(e.consultas for e in lista) / len(lista), 1),
+            "consultas_max": max(e.consultas for e in lista),
+            "tiempo_sql_promedio_ms": round(sum(tiempos_sql) / len(lista), 2),
+            "tiempo_sql_p95_ms": round(percentil(tiempos_sql, 95), 2),
+            "duracion_promedio_ms": round(sum(e.duracion_ms for e in lista) / len(lista), 2),
+            "ejecuciones_con_n_mas_1": sum(1 for e in lista if e.repetidas),
+        })
+    return filas
+
+
+def get_repetidas(ejecuciones=None):
+    """Sentencias marcadas como N+1: una fila por página y sentencia con el máximo de veces
+    en una ejecución y en cuántas ejecuciones pasó."""
+    repetidas = {}
+    for e in get_ejecuciones() if ejecuciones is None else ejecuciones:
+        for sentencia, veces in e.repetidas.items():
+            fila = repetidas.setdefault((e.pagina, sentencia), {"pagina": e.pagina, "sentencia": sentencia,
+                                                                 "veces_max": 0, "ejecuciones": 0})
+            fila["veces_max"] = max(fila["veces_max"], veces)
+            fila["ejecuciones"] += 1
+    return sorted(repetidas.values(), key=lambda f: (-f["veces_max"], f["pagina"]))
+
+
+def get_lentas(n=20, ejecuciones=None):
+    """Las `n` sentencias más lentas registradas, con su página."""
+    lentas = (
+        {"pagina": e.pagina, "inicio": e.inicio, "sentencia": sentencia, "ms": ms}
+        for e in (get_ejecuciones() if ejecuciones is None else ejecuciones) for sentencia, ms in e.lentas
+    )
+    return heapq.nlargest(n, lentas, key=lambda f: f["ms"])
+
+
+# --- Volcado para análisis fuera de línea ---
+def generar_json():
+    ejecuciones = get_ejecuciones()
+    return json.dumps({
+        "generado": datetime.now().isoformat(timespec="seconds"),
+        "paginas": resumen_por_pagina(ejecuciones),
+        "n_mas_1": get_repetidas(ejecuciones),
+        "ejecuciones": [asdict(e) for e in ejecuciones],
+        "fuera_de_ejecucion": {origen: {"consultas": n, "tiempo_ms": ms}
+                               for origen, (n, ms) in get_fuera_de_ejecucion().items()},
+    }, default=str, ensure_ascii=False, indent=2)
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def generar_prometheus():
+    """Métricas por página en el formato de texto de Prometheus."""
+    ejecuciones = get_ejecuciones()
+    por_pagina = {}
+    for e in ejecuciones:
+        por_pagina.setdefault(e.pagina, []).append(e)
+    metricas = [
+        ("tienda_ejecuciones_total", "counter", "Ejecuciones registradas por página.",
+         lambda lista: len(lista)),
+        ("tienda_consultas_total", "counter", "Consultas SQL de las ejecuciones registradas.",
+         lambda lista: sum(e.consultas for e in lista)),
+        ("tienda_consultas_segundos_total", "counter", "Tiempo en consultas SQL de las ejecuciones registradas.",
+         lambda lista: round(sum(e.tiempo_sql_ms for e in lista) / 1000, 6)),
+        ("tienda_n_mas_1_total", "counter", "Ejecuciones con sentencias repetidas (posible N+1).",
+         lambda lista: sum(1 for e in lista if e.repetidas)),
+    ]
+    lineas = []
+    for nombre, tipo, ayuda, valor in metricas:
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+        lineas += [f'{nombre}{{pagina="{_etiqueta(p)}"}} {valor(lista)}' for p, lista in sorted(por_pagina.items())]
+    nombre = "tienda_tiempo_sql_ejecucion_segundos"
+    lineas += [f"# HELP {nombre} Tiempo SQL por ejecución.", f"# TYPE {nombre} summary"]
+    for p, lista in sorted(por_pagina.items()):
+        tiempos = [e.tiempo_sql_ms / 1000 for e in lista]
+        for cuantil in (50, 95, 99):
+            lineas.append(f'{nombre}{{pagina="{_etiqueta(p)}",quantile="{cuantil / 100}"}} {round(percentil(tiempos, cuantil), 6)}')
+        lineas.append(f'{nombre}_sum{{pagina="{_etiqueta(p)}"}} {round(sum(tiempos), 6)}')
+        lineas.append(f'{nombre}_count{{pagina="{_etiqueta(p)}"}} {len(tiempos)}')
+    nombre = "tienda_consultas_fuera_de_ejecucion_total"
+    lineas += [f"# HELP {nombre} Consultas SQL fuera de una ejecución, por origen.", f"# TYPE {nombre} counter"]
+    lineas += [f'{nombre}{{origen="{_etiqueta(o)}"}} {n}' for o, (n, _) in sorted(get_fuera_de_ejecucion().items())]
+    return "\n".join(lineas) + "\n"
+
+
+def volcar(ruta, formato=FORMATO_JSON):
+    """Escribe las estadísticas en `ruta` (JSON o texto de Prometheus); devuelve la ruta."""
+    contenido = generar_prometheus() if formato == FORMATO_PROMETHEUS else generar_json()
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write(contenido)
+    return ruta
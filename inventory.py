@@ -0,0 +1,366 @@
+# inventory.py
+# Diario de movimientos de inventario, cortes periódicos y reportes de merma y rotación.
+#
+# Todo camino que cambia `inventario.cantidad` (ventas, reabastos, ajustes manuales e
+# importaciones) agrega en la misma transacción una fila a `movimientos_inventario` con el
+# cambio con signo; el diario solo crece. Cada tanto se guarda un corte: el stock de cada
+# producto hasta un id_movimiento. El stock en un momento pasado es el último corte anterior
+# más los movimientos entre ese corte y el momento, un rango acotado de la llave primaria,
+# sin recorrer todo el diario.
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select, func, insert, delete, text, bindparam, DateTime
+
+from db import (engine, get_version_datos, rango_dias, SessionLocal, Productos, Inventario, MovimientosInventario,
+                CortesInventario, DetalleCorteInventario)
+
+TIPO_VENTA = 'venta'
+TIPO_REABASTO = 'reabasto'
+TIPO_AJUSTE = 'ajuste'
+TIPO_IMPORTACION = 'importacion'
+NOMBRES_TIPO = {
+    TIPO_VENTA: "Venta",
+    TIPO_REABASTO: "Reabasto",
+    TIPO_AJUSTE: "Ajuste",
+    TIPO_IMPORTACION: "Importación",
+}
+
+# Se guarda un corte nuevo al juntar MOVIMIENTOS_POR_CORTE movimientos desde el anterior, o
+# si el anterior tiene más de INTERVALO_CORTE y hubo movimientos desde entonces
+MOVIMIENTOS_POR_CORTE = 5000
+INTERVALO_CORTE = timedelta(days=1)
+# Cada cuánto revisa el hilo de cortes si corresponde uno nuevo
+INTERVALO_REVISION_SEGUNDOS = 300
+# Diferencia máxima entre el orden de las fechas del diario y el de sus ids: la espera por el
+# lock de escritura (busy_timeout) con holgura
+DESFASE_MAXIMO_SEGUNDOS = 60
+
+
+def registrar_movimientos(db, tipo, cantidades, id_referencia=None, fecha=None):
+    """Agrega al diario un movimiento por producto sin hacer commit.
+
+    `cantidades` es un diccionario id_producto -> cambio de stock con signo; los ceros se
+    omiten. `db` puede ser una sesión o una conexión.
+    """
+    fecha = fecha or datetime.utcnow()
+    filas = [{
+        'fecha': fecha,
+        'id_producto': id_producto,
+        'tipo': tipo,
+        'cantidad': int(cantidad),
+        'id_referencia': id_referencia
+    } for id_producto, cantidad in cantidades.items() if cantidad]
+    if filas:
+        db.execute(insert(MovimientosInventario), filas)
+
+
+# La diferencia se calcula con el stock previo dentro de la sentencia que escribe, así una
+# venta que confirme entre la lectura y el ajuste no queda fuera del diario
+_REGISTRAR_AJUSTE = text("""
+    INSERT INTO movimientos_inventario (fecha, id_producto, tipo, cantidad)
+    SELECT :fecha, id_producto, :tipo, :cantidad - SUM(cantidad) FROM inventario
+    WHERE id_producto = :id_producto
+    GROUP BY id_producto HAVING :cantidad - SUM(cantidad) <> 0
+""").bindparams(bindparam('fecha', type_=DateTime))
+
+_FIJAR_STOCK = text("""
+    UPDATE inventario SET cantidad = :cantidad, ultima_actualizacion = :fecha WHERE id_producto = :id_producto
+""").bindparams(bindparam('fecha', type_=DateTime))
+
+
+def ajustar_stock(db, id_producto, cantidad, tipo=TIPO_AJUSTE):
+    """Fija el stock del producto en `cantidad` y registra la diferencia, sin hacer commit.
+
+    Devuelve False si el producto no tiene fila de inventario.
+    """
+    parametros = {'id_producto': id_producto, 'cantidad': int(cantidad), 'tipo': tipo, 'fecha': datetime.utcnow()}
+    db.execute(_REGISTRAR_AJUSTE, parametros)
+    return db.execute(_FIJAR_STOCK, parametros).rowcount > 0
+
+
+# --- Stock en un momento dado ---
+# Los rangos del diario son de ids: el límite es el mayor id con fecha anterior al momento.
+# Las fechas se toman antes de la transacción de escritura, así que dos movimientos pueden
+# tener fechas en distinto orden que sus ids, pero nunca por más de DESFASE_MAXIMO_SEGUNDOS:
+# basta buscar el mayor id entre la última fecha anterior al momento, menos ese desfase, y
+# el momento. Las dos búsquedas son rangos acotados de ix_movimientos_inventario_fecha_id.
+_ULTIMO_MOVIMIENTO_ANTES = text("""
+    SELECT MAX(id_movimiento) FROM movimientos_inventario
+    WHERE fecha < :momento AND fecha >= (
+        SELECT datetime(MAX(fecha), :desfase) FROM movimientos_inventario WHERE fecha < :momento
+    )
+""").bindparams(bindparam('momento', type_=DateTime), desfase=f"-{DESFASE_MAXIMO_SEGUNDOS} seconds")
+
+_CORTE_BASE = text("""
+    SELECT id_corte, id_movimiento FROM cortes_inventario WHERE id_movimiento <= :hasta
+    ORDER BY id_movimiento DESC, id_corte DESC LIMIT 1
+""")
+
+# Stock por producto: el corte base más los movimientos (desde, hasta]
+_SQL_STOCK_DESDE_CORTE = """
+    SELECT id_producto, SUM(cantidad) AS cantidad FROM (
+        SELECT id_producto, cantidad FROM detalle_corte_inventario WHERE id_corte = :id_corte {filtro}
+        UNION ALL
+        SELECT id_producto, cantidad FROM movimientos_inventario
+        WHERE id_movimiento > :desde AND id_movimiento <= :hasta {filtro}
+    ) GROUP BY id_producto
+"""
+_STOCK_DESDE_CORTE = text(_SQL_STOCK_DESDE_CORTE.format(filtro=""))
+_STOCK_PRODUCTO_DESDE_CORTE = text(_SQL_STOCK_DESDE_CORTE.format(filtro="AND id_producto = :id_producto"))
+_GUARDAR_DETALLE_CORTE = text(f"""
+    INSERT INTO detalle_corte_inventario (id_corte, id_producto, cantidad)
+    SELECT :id_nuevo, id_producto, cantidad FROM ({_SQL_STOCK_DESDE_CORTE.format(filtro="")}) WHERE cantidad <> 0
+""")
+
+
+def _corte_base(db, hasta):
+    # (id_corte, id_movimiento) del último corte hasta ese movimiento; sin corte, desde cero
+    corte = db.execute(_CORTE_BASE, {'hasta': hasta}).first()
+    return tuple(corte) if corte else (None, 0)
+
+
+def _ultimo_movimiento(db):
+    return db.execute(select(func.max(MovimientosInventario.id_movimiento))).scalar() or 0
+
+
+def _stock_hasta(db, hasta, id_producto=None):
+    id_corte, desde = _corte_base(db, hasta)
+    parametros = {'id_corte': id_corte, 'desde': desde, 'hasta': hasta}
+    if id_producto is None:
+        filas = db.execute(_STOCK_DESDE_CORTE, parametros)
+    else:
+        filas = db.execute(_STOCK_PRODUCTO_DESDE_CORTE, {**parametros, 'id_producto': id_producto})
+    return {id_producto: cantidad for id_producto, cantidad in filas if cantidad}
+
+
+def get_stock_en(db, momento, id_producto=None):
+    """Diccionario id_producto -> stock según el diario justo antes de `momento` (datetime).
+
+    Los productos sin stock no aparecen. Antes del primer corte guardado (la migración que
+    crea el diario guarda el stock de ese momento) devuelve ese primer corte.
+    """
+    hasta = db.execute(_ULTIMO_MOVIMIENTO_ANTES, {'momento': momento}).scalar() or 0
+    return _stock_hasta(db, hasta, id_producto)
+
+
+def conciliar(db, tipo=TIPO_IMPORTACION):
+    """Agrega, sin hacer commit, los movimientos que faltan para que el diario cuadre con
+    `inventario` (por ejemplo, tras reemplazar la tabla desde un ZIP). Devuelve cuántos agregó."""
+    segun_diario = _stock_hasta(db, _ultimo_movimiento(db))
+    actual = dict(db.execute(
+        select(Inventario.id_producto, func.sum(Inventario.cantidad)).group_by(Inventario.id_producto)
+    ).all())
+    diferencias = {
+        id_producto: actual.get(id_producto, 0) - segun_diario.get(id_producto, 0)
+        for id_producto in actual.keys() | segun_diario.keys()
+    }
+    registrar_movimientos(db, tipo, diferencias)
+    return sum(1 for diferencia in diferencias.values() if diferencia)
+
+
+# --- Cortes ---
+def _guardar_corte(db, hasta, fecha):
+    id_corte, desde = _corte_base(db, hasta)
+    id_nuevo = db.execute(insert(CortesInventario).values(fecha=fecha, id_movimiento=hasta)).inserted_primary_key[0]
+    db.execute(_GUARDAR_DETALLE_CORTE, {'id_nuevo': id_nuevo, 'id_corte': id_corte, 'desde': desde, 'hasta': hasta})
+    return id_nuevo
+
+
+def tomar_corte(db):
+    """Guarda un corte hasta el último movimiento y hace commit.
+
+    El corte se calcula con el anterior más los movimientos siguientes, no leyendo
+    `inventario`, así queda exacto aunque otras cajas sigan vendiendo. Devuelve el id del
+    corte o None si no hubo movimientos desde el anterior.
+    """
+    hasta = _ultimo_movimiento(db)
+    id_corte, desde = _corte_base(db, hasta)
+    if id_corte is not None and desde == hasta:
+        return None
+    id_corte = _guardar_corte(db, hasta, datetime.utcnow())
+    db.commit()
+    return id_corte
+
+
+def corte_pendiente(db):
+    """Indica si corresponde guardar un corte (ver MOVIMIENTOS_POR_CORTE e INTERVALO_CORTE)."""
+    ultimo = db.execute(
+        select(CortesInventario.id_movimiento, CortesInventario.fecha)
+        .order_by(CortesInventario.id_movimiento.desc(), CortesInventario.id_corte.desc()).limit(1)
+    ).first()
+    # Los ids del diario son consecutivos: la resta cuenta los movimientos sin corte
+    pendientes = _ultimo_movimiento(db) - (ultimo.id_movimiento if ultimo else 0)
+    if pendientes >= MOVIMIENTOS_POR_CORTE:
+        return True
+    return pendientes > 0 and (ultimo is None or datetime.utcnow() - ultimo.fecha >= INTERVALO_CORTE)
+
+
+def reconstruir_cortes(db, cada=MOVIMIENTOS_POR_CORTE):
+    """Vuelve a generar los cortes, uno cada `cada` movimientos, y hace commit.
+
+    Parte de stock cero: sirve solo para un diario completo desde el inicio (datos
+    sintéticos o importados sin cortes). Devuelve cuántos cortes guardó.
+    """
+    db.execute(delete(DetalleCorteInventario))
+    db.execute(delete(CortesInventario))
+    numerados = select(
+        MovimientosInventario.id_movimiento,
+        MovimientosInventario.fecha,
+        func.row_number().over(order_by=MovimientosInventario.id_movimiento).label('n')
+    ).subquery()
+    ultimo = _ultimo_movimiento(db)
+    marcas = db.execute(select(numerados.c.id_movimiento, numerados.c.fecha).where(
+        (numerados.c.n % cada == 0) | (numerados.c.id_movimiento == ultimo)
+    ).order_by(numerados.c.id_movimiento)).all()
+    for hasta, fecha in marcas:
+        _guardar_corte(db, hasta, fecha)
+    db.commit()
+    return len(marcas)
+
+
+class CortesPeriodicos(threading.Thread):
+    """Hilo que guarda un corte cuando corresponde, revisando cada `intervalo` segundos hasta detener()."""
+    def __init__(self, intervalo=INTERVALO_REVISION_SEGUNDOS):
+        super().__init__(name="cortes_inventario", daemon=True)
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                with SessionLocal() as db:
+                    if corte_pendiente(db):
+                        tomar_corte(db)
+            except Exception:
+                # Una base ocupada no debe terminar el hilo; se reintenta en la siguiente vuelta
+                pass
+
+    def detener(self):
+        self._detener.set()
+
+
+@st.cache_resource
+def iniciar_cortes_inventario():
+    """Arranca una sola vez por proceso el hilo de cortes de inventario."""
+    hilo = CortesPeriodicos()
+    hilo.start()
+    return hilo
+
+
+# --- Historial y reportes ---
+def get_movimientos(db, id_producto, inicio, fin):
+    """Movimientos de un producto entre dos días (inclusive), del más reciente al más
+    antiguo, con el stock después de cada uno."""
+    desde, hasta = rango_dias(inicio, fin)
+    # Las fechas se traducen a un rango de ids, que el índice por producto recorre directo
+    id_desde = db.execute(_ULTIMO_MOVIMIENTO_ANTES, {'momento': desde}).scalar() or 0
+    id_hasta = db.execute(_ULTIMO_MOVIMIENTO_ANTES, {'momento': hasta}).scalar() or 0
+    filas = db.execute(select(
+        MovimientosInventario.fecha,
+        MovimientosInventario.tipo,
+        MovimientosInventario.cantidad,
+        MovimientosInventario.id_referencia
+    ).where(
+        MovimientosInventario.id_producto == id_producto,
+        MovimientosInventario.id_movimiento > id_desde,
+        MovimientosInventario.id_movimiento <= id_hasta
+    ).order_by(MovimientosInventario.id_movimiento.desc())).all()
+    movimientos = pd.DataFrame(filas, columns=['Fecha', 'Tipo', 'Cantidad', 'Referencia'])
+    stock_final = _stock_hasta(db, id_hasta, id_producto).get(id_producto, 0)
+    # Del más reciente hacia atrás: el stock tras cada movimiento es el final menos los posteriores
+    posteriores = movimientos['Cantidad'].cumsum().shift(fill_value=0)
+    movimientos['Stock'] = (stock_final - posteriores).astype('int64')
+    movimientos['Tipo'] = movimientos['Tipo'].map(NOMBRES_TIPO).fillna(movimientos['Tipo'])
+    movimientos['Referencia'] = movimientos['Referencia'].astype('Int64')
+    return movimientos
+
+
+@dataclass
+class ReporteInventario:
+    rotacion: pd.DataFrame  # por producto, de mayor a menor rotación
+    merma: pd.DataFrame  # productos con ajustes negativos, de mayor a menor valor
+    unidades_vendidas: int
+    stock_promedio: float
+    unidades_merma: int
+    valor_merma: float
+
+
+def _suma_por_producto(conn, tipo, desde, hasta, solo_salidas=False):
+    # Recorre el índice (tipo, fecha, id_producto, cantidad) sin leer la tabla
+    condiciones = [MovimientosInventario.tipo == tipo, MovimientosInventario.fecha >= desde,
+                   MovimientosInventario.fecha < hasta]
+    if solo_salidas:
+        condiciones.append(MovimientosInventario.cantidad < 0)
+    return dict(conn.execute(
+        select(MovimientosInventario.id_producto, -func.sum(MovimientosInventario.cantidad))
+        .where(*condiciones).group_by(MovimientosInventario.id_producto)
+    ).all())
+
+
+def get_reporte_inventario(conn, inicio, fin):
+    """Rotación y merma por producto entre dos días (inclusive), desde el diario."""
+    desde, hasta = rango_dias(inicio, fin)
+    stock_inicial = get_stock_en(conn, desde)
+    stock_final = get_stock_en(conn, hasta)
+    vendidas = _suma_por_producto(conn, TIPO_VENTA, desde, hasta)
+    perdidas = _suma_por_producto(conn, TIPO_AJUSTE, desde, hasta, solo_salidas=True)
+    productos = pd.DataFrame(conn.execute(select(
+        Productos.id_producto, Productos.nombre, Productos.categoria, Productos.precio_compra
+    )).all(), columns=['ID', 'Producto', 'Categoría', 'precio_compra'])
+
+    dias = (fin - inicio).days + 1
+    datos = productos.assign(**{
+        'Stock Inicial': productos['ID'].map(stock_inicial).fillna(0).astype('int64'),
+        'Stock Final': productos['ID'].map(stock_final).fillna(0).astype('int64'),
+        'Unidades Vendidas': productos['ID'].map(vendidas).fillna(0).astype('int64'),
+        'Unidades Perdidas': productos['ID'].map(perdidas).fillna(0).astype('int64'),
+    })
+    # Rotación = vendidas / stock promedio; el promedio se aproxima con el inicial y el final
+    promedio = (datos['Stock Inicial'] + datos['Stock Final']) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rotacion = np.where(promedio > 0, datos['Unidades Vendidas'] / promedio, np.nan)
+        dias_inventario = np.where(datos['Unidades Vendidas'] > 0, promedio * dias / datos['Unidades Vendidas'], np.nan)
+    datos['Stock Promedio'] = promedio.round(1)
+    datos['Rotación'] = np.round(rotacion, 2)
+    datos['Días de Inventario'] = np.round(dias_inventario, 1)
+
+    activos = datos[(promedio > 0) | (datos['Unidades Vendidas'] > 0)]
+    tabla_rotacion = activos[['ID', 'Producto', 'Categoría', 'Stock Inicial', 'Stock Final', 'Stock Promedio',
+                              'Unidades Vendidas', 'Rotación', 'Días de Inventario']
+                             ].sort_values('Rotación', ascending=False, na_position='last').reset_index(drop=True)
+
+    con_merma = datos[datos['Unidades Perdidas'] > 0]
+    tabla_merma = pd.DataFrame({
+        'ID': con_merma['ID'],
+        'Producto': con_merma['Producto'],
+        'Unidades Perdidas': con_merma['Unidades Perdidas'],
+        'Valor': (con_merma['Unidades Perdidas'] * con_merma['precio_compra'].astype(float)).round(2),
+        '% de Merma': (100 * con_merma['Unidades Perdidas']
+                       / (con_merma['Unidades Vendidas'] + con_merma['Unidades Perdidas'])).round(1),
+    }).sort_values('Valor', ascending=False).reset_index(drop=True)
+
+    return ReporteInventario(
+        rotacion=tabla_rotacion,
+        merma=tabla_merma,
+        unidades_vendidas=int(datos['Unidades Vendidas'].sum()),
+        stock_promedio=float(promedio.sum()),
+        unidades_merma=int(tabla_merma['Unidades Perdidas'].sum()),
+        valor_merma=float(tabla_merma['Valor'].sum()),
+    )
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _calcular_reporte_inventario(inicio, fin, version_datos):
+    # version_datos solo forma parte de la clave de la caché
+    with engine.connect() as conn:
+        return get_reporte_inventario(conn, inicio, fin)
+
+
+def calcular_reporte_inventario(inicio, fin):
+    """Reporte de inventario del rango (ver get_reporte_inventario), memorizado por versión de datos."""
+    return _calcular_reporte_inventario(inicio, fin, get_version_datos())
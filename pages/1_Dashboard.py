@@ -1,7 +1,6 @@
 import streamlit as st
-from db import SessionLocal, Ventas, DetalleVenta, Productos, Inventario
-from sqlalchemy import func
-import pandas as pd
+from reports import get_resumen_del_dia
+from aggregates import get_instantanea, get_estado_agregados, MAX_RETRASO_SEGUNDOS
 from datetime import date
 
 st.set_page_config(
@@ -13,38 +12,23 @@ st.set_page_config(
 st.title("Dashboard de Ventas 📊")
 st.markdown("Aquí puedes ver un resumen de las métricas clave de tu tienda.")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Función para obtener las ventas del día
-def get_ventas_del_dia(db, dia):
-    total_ventas = db.query(func.sum(Ventas.total_venta)).filter(func.date(Ventas.fecha_venta) == dia).scalar()
-    num_transacciones = db.query(Ventas).filter(func.date(Ventas.fecha_venta) == dia).count()
-    return total_ventas, num_transacciones
-
-# Función para obtener los productos más vendidos del día
-def get_productos_mas_vendidos(db, dia):
-    stmt = db.query(
-        Productos.nombre,
-        func.sum(DetalleVenta.cantidad).label('total_cantidad_vendida')
-    ).join(DetalleVenta, Productos.id_producto == DetalleVenta.id_producto
-    ).join(Ventas, DetalleVenta.id_venta == Ventas.id_venta
-    ).filter(func.date(Ventas.fecha_venta) == dia
-    ).group_by(Productos.nombre
-    ).order_by(func.sum(DetalleVenta.cantidad).desc()).limit(5).all()
-    
-    return pd.DataFrame(stmt, columns=['Producto', 'Cantidad Vendida'])
-
-# Conexión a la base de datos
-db = next(get_db())
+# Los datos salen de los agregados en memoria que mantiene un hilo de fondo (ver
+# aggregates.py): la página no consulta la base
 dia_actual = date.today()
+total_ventas_hoy, num_transacciones_hoy, df_mas_vendidos = get_resumen_del_dia(get_instantanea(), dia_actual)
+
+# Indicador de qué tan al día están los agregados
+estado = get_estado_agregados()
+if estado["activo"] and estado["retraso_segundos"] is None:
+    st.info("Poniendo al día los datos: pueden faltar las ventas más recientes.")
+elif estado["atrasado"]:
+    st.warning(f"Los datos pueden estar atrasados: el proceso que los actualiza no responde desde hace más de "
+               f"{MAX_RETRASO_SEGUNDOS} s." + (f" Último error: {estado['error']}" if estado["error"] else ""))
+elif estado["generada"]:
+    st.caption(f"Datos al {estado['generada']:%H:%M:%S} (hasta la venta #{estado['ultimo_id_venta']}); "
+               f"revisados hace {estado['retraso_segundos']:.0f} s.")
 
 # Muestra las métricas principales
-total_ventas_hoy, num_transacciones_hoy = get_ventas_del_dia(db, dia_actual)
 ticket_promedio = total_ventas_hoy / num_transacciones_hoy if num_transacciones_hoy else 0
 
 col1, col2, col3 = st.columns(3)
@@ -60,20 +44,7 @@ with col3:
 
 # Muestra los productos más vendidos
 st.subheader("Productos Más Vendidos Hoy")
-df_mas_vendidos = get_productos_mas_vendidos(db, dia_actual)
 if not df_mas_vendidos.empty:
     st.table(df_mas_vendidos)
 else:
     st.info("Aún no hay ventas registradas para hoy.")
-
-
-
-
-
-
-
-
-
-
-
-
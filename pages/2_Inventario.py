@@ -1,7 +1,9 @@
 import streamlit as st
-from db import SessionLocal, Ventas, DetalleVenta, Productos, Inventario
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+from db import get_db, Productos, Inventario
+from catalog import get_catalogo
+from search import buscar_productos
+from inventory import registrar_movimientos, ajustar_stock, get_movimientos, get_stock_en, iniciar_cortes_inventario, TIPO_AJUSTE
+from datetime import date, datetime, timedelta
 
 st.set_page_config(
     page_title="Inventario",
@@ -11,24 +13,25 @@ st.set_page_config(
 
 st.title("Gestión de Inventario 📦")
 
-# Función para la conexión a la base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # --- Funciones CRUD ---
-def get_productos(db):
-    return db.query(Productos).options(joinedload(Productos.inventario)).all()
+# El catálogo (nombres, precios y stock) se lee de la caché compartida de catalog.py;
+# cada función que modifica productos o inventario la invalida después del commit.
+# Todo cambio de stock queda además en el diario de movimientos (inventory.py).
+# Con texto de búsqueda se devuelven solo las coincidencias, de la más relevante a la menos.
+def get_productos(db, busqueda=""):
+    if not busqueda:
+        return get_catalogo().listar()
+    ids = buscar_productos(db, busqueda, limite=200)
+    encontrados = get_catalogo().obtener_varios(ids)
+    return [encontrados[i] for i in ids if i in encontrados]
 
 # pages/2_Inventario.py
 
-def add_producto(db, nombre, descripcion, precio_compra, precio_venta, cantidad):
+def add_producto(db, nombre, descripcion, precio_compra, precio_venta, cantidad, categoria=None):
     nuevo_producto = Productos(
         nombre=nombre,
         descripcion=descripcion,
+        categoria=categoria or None,
         precio_compra=precio_compra,
         precio_venta=precio_venta
     )
@@ -42,130 +45,176 @@ def add_producto(db, nombre, descripcion, precio_compra, precio_venta, cantidad)
         producto=nuevo_producto # Agrega esta línea para establecer la relación
     )
     db.add(nuevo_inventario)
+    registrar_movimientos(db, TIPO_AJUSTE, {nuevo_producto.id_producto: cantidad})
     db.commit() # Un solo commit para ambas transacciones
+    get_catalogo().invalidar()
 
-def update_producto(db, id_producto, nombre, descripcion, precio_compra, precio_venta):
+def update_producto(db, id_producto, nombre, descripcion, precio_compra, precio_venta, categoria=None):
     producto = db.query(Productos).filter(Productos.id_producto == id_producto).first()
     if producto:
         producto.nombre = nombre
         producto.descripcion = descripcion
+        producto.categoria = categoria or None
         producto.precio_compra = precio_compra
         producto.precio_venta = precio_venta
         db.commit()
+        get_catalogo().invalidar()
         return True
     return False
 
 def update_inventario(db, id_producto, cantidad):
-    inventario = db.query(Inventario).filter(Inventario.id_producto == id_producto).first()
-    if inventario:
-        inventario.cantidad = cantidad
+    if ajustar_stock(db, id_producto, cantidad):
         db.commit()
+        get_catalogo().invalidar()
         return True
     return False
 
 def delete_producto(db, id_producto):
     producto = db.query(Productos).filter(Productos.id_producto == id_producto).first()
     if producto:
-        # Eliminar el inventario asociado primero
+        # Eliminar el inventario asociado primero; el stock que tenía sale del diario como ajuste
+        ajustar_stock(db, id_producto, 0)
         db.query(Inventario).filter(Inventario.id_producto == id_producto).delete()
         db.delete(producto)
         db.commit()
+        get_catalogo().invalidar()
         return True
     return False
 # --- Fin de funciones CRUD ---
 
-# Conexión a la base de datos
-db = next(get_db())
-
-# Menú de acciones
-accion = st.radio("Selecciona una acción:", ("Ver Inventario", "Agregar Producto", "Editar Producto", "Eliminar Producto"))
-
-if accion == "Ver Inventario":
-    st.subheader("Inventario Actual")
-    productos = get_productos(db)
-    if productos:
-        data = []
-        for p in productos:
-            inventario = p.inventario if p.inventario else None
-            cantidad = inventario.cantidad if inventario else 0
-            data.append({
-                'ID': p.id_producto,
-                'Producto': p.nombre,
-                'Stock': cantidad,
-                'Precio de Venta': f'${p.precio_venta}',
-                'Descripción': p.descripcion
-            })
-        st.dataframe(data, use_container_width=True)
-    else:
-        st.info("No hay productos en el inventario.")
-    
-elif accion == "Agregar Producto":
-    st.subheader("Agregar Nuevo Producto")
-    with st.form("form_agregar_producto", clear_on_submit=True):
-        nombre = st.text_input("Nombre del Producto")
-        descripcion = st.text_area("Descripción")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            precio_compra = st.number_input("Precio de Compra", min_value=0.01, format="%.2f")
-        with col2:
-            precio_venta = st.number_input("Precio de Venta", min_value=0.01, format="%.2f")
-        with col3:
-            cantidad = st.number_input("Cantidad Inicial", min_value=0, step=1)
-        
-        submitted = st.form_submit_button("Agregar Producto")
-        if submitted:
-            if nombre and precio_compra > 0 and precio_venta > 0:
-                add_producto(db, nombre, descripcion, precio_compra, precio_venta, cantidad)
-                st.success(f"Producto '{nombre}' agregado exitosamente.")
+# Cortes periódicos del diario de inventario, un solo hilo por proceso
+iniciar_cortes_inventario()
+
+# Conexión a la base de datos: la sesión se cierra al terminar la ejecución de la página
+with get_db() as db:
+    # Menú de acciones
+    accion = st.radio("Selecciona una acción:", ("Ver Inventario", "Agregar Producto", "Editar Producto", "Eliminar Producto",
+                                                 "Historial de Movimientos"))
+    if accion != "Agregar Producto":
+        busqueda = st.text_input("Buscar producto", placeholder="Nombre o descripción").strip()
+
+    if accion == "Ver Inventario":
+        st.subheader("Inventario Actual")
+        productos = get_productos(db, busqueda)
+        if productos:
+            data = []
+            for p in productos:
+                data.append({
+                    'ID': p.id_producto,
+                    'Producto': p.nombre,
+                    'Categoría': p.categoria,
+                    'Stock': p.stock,
+                    'Precio de Venta': f'${p.precio_venta}',
+                    'Descripción': p.descripcion
+                })
+            st.dataframe(data, use_container_width=True)
+        else:
+            st.info("No hay productos en el inventario.")
+
+    elif accion == "Agregar Producto":
+        st.subheader("Agregar Nuevo Producto")
+        with st.form("form_agregar_producto", clear_on_submit=True):
+            nombre = st.text_input("Nombre del Producto")
+            descripcion = st.text_area("Descripción")
+            categoria = st.text_input("Categoría (opcional)")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                precio_compra = st.number_input("Precio de Compra", min_value=0.01, format="%.2f")
+            with col2:
+                precio_venta = st.number_input("Precio de Venta", min_value=0.01, format="%.2f")
+            with col3:
+                cantidad = st.number_input("Cantidad Inicial", min_value=0, step=1)
+
+            submitted = st.form_submit_button("Agregar Producto")
+            if submitted:
+                if nombre and precio_compra > 0 and precio_venta > 0:
+                    add_producto(db, nombre, descripcion, precio_compra, precio_venta, cantidad, categoria.strip())
+                    st.success(f"Producto '{nombre}' agregado exitosamente.")
+                else:
+                    st.error("Por favor, completa todos los campos requeridos.")
+
+    elif accion == "Editar Producto":
+        st.subheader("Editar un Producto Existente")
+        productos = {p.id_producto: p for p in get_productos(db, busqueda)}
+        if not productos:
+            st.warning("No hay productos para editar.")
+        else:
+            producto_seleccionado = st.selectbox(
+                "Selecciona el producto a editar:",
+                options=list(productos),
+                format_func=lambda x: productos[x].nombre
+            )
+            if producto_seleccionado:
+                producto = productos[producto_seleccionado]
+
+                with st.form("form_editar_producto", clear_on_submit=False):
+                    nombre_edit = st.text_input("Nombre del Producto", value=producto.nombre)
+                    descripcion_edit = st.text_area("Descripción", value=producto.descripcion)
+                    categoria_edit = st.text_input("Categoría (opcional)", value=producto.categoria or "")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        precio_compra_edit = st.number_input("Precio de Compra", value=float(producto.precio_compra), min_value=0.01, format="%.2f")
+                    with col2:
+                        precio_venta_edit = st.number_input("Precio de Venta", value=float(producto.precio_venta), min_value=0.01, format="%.2f")
+                    cantidad_edit = st.number_input("Cantidad en Stock", value=producto.stock, min_value=0, step=1)
+
+                    submitted_edit = st.form_submit_button("Actualizar Producto")
+                    if submitted_edit:
+                        update_producto(db, producto.id_producto, nombre_edit, descripcion_edit, precio_compra_edit, precio_venta_edit, categoria_edit.strip())
+                        update_inventario(db, producto.id_producto, cantidad_edit)
+                        st.success(f"Producto '{nombre_edit}' actualizado exitosamente.")
+                        st.rerun()
+
+    elif accion == "Eliminar Producto":
+        st.subheader("Eliminar un Producto")
+        productos = {p.id_producto: p for p in get_productos(db, busqueda)}
+        if not productos:
+            st.warning("No hay productos para eliminar.")
+        else:
+            producto_a_eliminar = st.selectbox(
+                "Selecciona el producto a eliminar:",
+                options=list(productos),
+                format_func=lambda x: productos[x].nombre
+            )
+            if st.button("Eliminar Producto", help="Esta acción es irreversible."):
+                if delete_producto(db, producto_a_eliminar):
+                    st.success("Producto eliminado exitosamente.")
+                    st.rerun()
+                else:
+                    st.error("No se pudo eliminar el producto.")
+
+    elif accion == "Historial de Movimientos":
+        st.subheader("Historial de Movimientos")
+        productos = {p.id_producto: p for p in get_productos(db, busqueda)}
+        if not productos:
+            st.warning("No hay productos para consultar.")
+        else:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                id_historial = st.selectbox(
+                    "Producto:",
+                    options=list(productos),
+                    format_func=lambda x: productos[x].nombre
+                )
+            with col2:
+                inicio_historial = st.date_input("Desde", date.today() - timedelta(days=30))
+            with col3:
+                fin_historial = st.date_input("Hasta", date.today())
+
+            if inicio_historial > fin_historial:
+                st.error("La fecha de inicio debe ser anterior a la de fin.")
             else:
-                st.error("Por favor, completa todos los campos requeridos.")
-
-elif accion == "Editar Producto":
-    st.subheader("Editar un Producto Existente")
-    productos = db.query(Productos).all()
-    if not productos:
-        st.warning("No hay productos para editar.")
-    else:
-        producto_seleccionado = st.selectbox(
-            "Selecciona el producto a editar:",
-            options=[p.id_producto for p in productos],
-            format_func=lambda x: db.query(Productos).filter(Productos.id_producto == x).first().nombre
-        )
-        if producto_seleccionado:
-            producto = db.query(Productos).filter(Productos.id_producto == producto_seleccionado).first()
-            inventario = db.query(Inventario).filter(Inventario.id_producto == producto_seleccionado).first()
-            
-            with st.form("form_editar_producto", clear_on_submit=False):
-                nombre_edit = st.text_input("Nombre del Producto", value=producto.nombre)
-                descripcion_edit = st.text_area("Descripción", value=producto.descripcion)
-                col1, col2 = st.columns(2)
+                # Stock al empezar el primer día, desde el último corte del diario
+                stock_inicial = get_stock_en(db, datetime.combine(inicio_historial, datetime.min.time()), id_historial)
+                movimientos = get_movimientos(db, id_historial, inicio_historial, fin_historial)
+                col1, col2, col3 = st.columns(3)
                 with col1:
-                    precio_compra_edit = st.number_input("Precio de Compra", value=float(producto.precio_compra), min_value=0.01, format="%.2f")
+                    st.metric("Stock al inicio", stock_inicial.get(id_historial, 0))
                 with col2:
-                    precio_venta_edit = st.number_input("Precio de Venta", value=float(producto.precio_venta), min_value=0.01, format="%.2f")
-                cantidad_edit = st.number_input("Cantidad en Stock", value=inventario.cantidad, min_value=0, step=1)
-
-                submitted_edit = st.form_submit_button("Actualizar Producto")
-                if submitted_edit:
-                    update_producto(db, producto.id_producto, nombre_edit, descripcion_edit, precio_compra_edit, precio_venta_edit)
-                    update_inventario(db, producto.id_producto, cantidad_edit)
-                    st.success(f"Producto '{nombre_edit}' actualizado exitosamente.")
-                    st.experimental_rerun()
-
-elif accion == "Eliminar Producto":
-    st.subheader("Eliminar un Producto")
-    productos = db.query(Productos).all()
-    if not productos:
-        st.warning("No hay productos para eliminar.")
-    else:
-        producto_a_eliminar = st.selectbox(
-            "Selecciona el producto a eliminar:",
-            options=[p.id_producto for p in productos],
-            format_func=lambda x: db.query(Productos).filter(Productos.id_producto == x).first().nombre
-        )
-        if st.button("Eliminar Producto", help="Esta acción es irreversible."):
-            if delete_producto(db, producto_a_eliminar):
-                st.success("Producto eliminado exitosamente.")
-                st.experimental_rerun()
-            else:
-                st.error("No se pudo eliminar el producto.")
+                    st.metric("Movimientos", len(movimientos))
+                with col3:
+                    st.metric("Stock actual", productos[id_historial].stock)
+                if movimientos.empty:
+                    st.info("El producto no tuvo movimientos en el periodo.")
+                else:
+                    st.dataframe(movimientos, use_container_width=True, hide_index=True)
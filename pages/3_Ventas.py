@@ -1,7 +1,15 @@
+import time
+
 import streamlit as st
-from db import SessionLocal, Ventas, DetalleVenta, Productos, Inventario
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+from db import get_db
+from catalog import get_catalogo
+from sales import (get_productos_disponibles, get_categorias, registrar_carrito, StockInsuficienteError,
+                   ORDEN_NOMBRE, ORDEN_POPULARIDAD)
+from reservations import (nuevo_id_carrito, reservar, renovar, liberar, get_disponibles,
+                          iniciar_limpieza_reservas, DURACION_RESERVA)
+from inventory import iniciar_cortes_inventario
+from profiling import perfilar_pagina, seccion
+from diagnostics import medir_ejecucion
 
 st.set_page_config(
     page_title="Ventas",
@@ -12,135 +20,261 @@ st.set_page_config(
 st.title("Registro de Ventas 💰")
 st.markdown("Agrega productos al carrito y finaliza la venta rápidamente.")
 
-# Función para la conexión a la base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Conexión a la base de datos
-db = next(get_db())
+TODAS_LAS_CATEGORIAS = "Todas"
+# Fragmentos de la página: cada uno se vuelve a ejecutar por separado (ver más abajo)
+FRAGMENTO_CATALOGO = "catalogo"
+FRAGMENTO_CARRITO = "carrito"
+FRAGMENTO_COBRO = "cobro"
 
 # Inicializar el carrito de compras en la sesión de Streamlit
 if 'carrito' not in st.session_state:
     st.session_state.carrito = {}
+# Identifica los apartados de stock de este carrito (ver reservations.py)
+if 'id_carrito' not in st.session_state:
+    st.session_state.id_carrito = nuevo_id_carrito()
+    st.session_state.reserva_renovada = time.monotonic()
+# Cursores de inicio de cada página visitada del catálogo (paginación por clave)
+if 'cursores_pagina' not in st.session_state:
+    st.session_state.cursores_pagina = [None]
+# Última consulta del catálogo: ((filtros, cursor), productos, cursor siguiente). Esta parte
+# solo corre en las ejecuciones completas (al entrar a la página); ahí se descarta y el
+# fragmento del catálogo vuelve a consultar.
+st.session_state.consulta_catalogo = None
+st.session_state.categorias = None
 
-# --- Funciones de venta ---
-def get_productos_disponibles(db):
-    # Obtiene todos los productos con su cantidad en inventario
-    productos = db.query(Productos).options(joinedload(Productos.inventario)).all()
-    # Filtra solo los que tienen stock
-    return [p for p in productos if p.inventario and p.inventario.cantidad > 0]
+# --- Funciones de venta (las consultas están en sales.py) ---
+# Dejan su mensaje en la sesión: corren desde los botones, antes de que se vuelvan a
+# dibujar los fragmentos que lo muestran.
+def _pagina_siguiente(cursor):
+    st.session_state.cursores_pagina.append(cursor)
 
-def add_to_carrito(producto_id, cantidad):
-    if producto_id in st.session_state.carrito:
-        st.session_state.carrito[producto_id]['cantidad'] += cantidad
+def _pagina_anterior():
+    if len(st.session_state.cursores_pagina) > 1:
+        st.session_state.cursores_pagina.pop()
+
+def add_to_carrito(db, producto_id, cantidad):
+    # El producto se aparta antes de entrar al carrito; si otra caja se llevó las unidades,
+    # el aviso aparece ahora y no al finalizar la venta
+    item = st.session_state.carrito.get(producto_id)
+    en_carrito = item['cantidad'] if item else 0
+    if not reservar(db, st.session_state.id_carrito, producto_id, en_carrito + cantidad):
+        disponible = get_disponibles(db, [producto_id], st.session_state.id_carrito).get(producto_id, 0)
+        st.session_state.aviso_carrito = (
+            "warning", f"Solo hay {disponible} unidad(es) disponibles; el resto está vendido o apartado por otra caja."
+        )
+        return
+
+    if item:
+        item['cantidad'] += cantidad
     else:
-        producto = db.query(Productos).filter(Productos.id_producto == producto_id).first()
+        producto = get_catalogo().obtener(producto_id)
         st.session_state.carrito[producto_id] = {
             'nombre': producto.nombre,
             'precio_venta': float(producto.precio_venta),
             'cantidad': cantidad
         }
-    st.success(f"{cantidad} x {st.session_state.carrito[producto_id]['nombre']} agregado(s) al carrito.")
+    st.session_state.aviso_carrito = (
+        "success", f"{cantidad} x {st.session_state.carrito[producto_id]['nombre']} agregado(s) al carrito."
+    )
 
-def remove_from_carrito(producto_id):
+def remove_from_carrito(db, producto_id):
     if producto_id in st.session_state.carrito:
+        liberar(db, st.session_state.id_carrito, producto_id)
         del st.session_state.carrito[producto_id]
-        st.success("Producto eliminado del carrito.")
+        st.session_state.aviso_carrito = ("success", "Producto eliminado del carrito.")
     else:
-        st.warning("El producto no está en el carrito.")
+        st.session_state.aviso_carrito = ("warning", "El producto no está en el carrito.")
 
 def finalizar_venta(db):
     if not st.session_state.carrito:
-        st.error("El carrito está vacío. Agrega productos para finalizar la venta.")
-        return
+        st.session_state.resultado_venta = ("error", "El carrito está vacío. Agrega productos para finalizar la venta.", None)
+        return False
 
-    # Iniciar la transacción de la venta
     try:
-        total_venta = sum(item['precio_venta'] * item['cantidad'] for item in st.session_state.carrito.values())
-        nueva_venta = Ventas(total_venta=total_venta)
-        db.add(nueva_venta)
-        db.flush()  # Obtener el id_venta antes de commitear
-
-        for producto_id, item in st.session_state.carrito.items():
-            # Crear el detalle de la venta
-            detalle = DetalleVenta(
-                id_venta=nueva_venta.id_venta,
-                id_producto=producto_id,
-                cantidad=item['cantidad'],
-                precio_unitario=item['precio_venta']
-            )
-            db.add(detalle)
-
-            # Actualizar el inventario
-            inventario_item = db.query(Inventario).filter(Inventario.id_producto == producto_id).first()
-            if inventario_item:
-                inventario_item.cantidad -= item['cantidad']
-            
-        db.commit()
-        st.success(f"Venta finalizada exitosamente. Total: ${total_venta:.2f}")
-        
+        id_venta, total_venta = registrar_carrito(db, st.session_state.carrito, st.session_state.id_carrito)
+        st.session_state.resultado_venta = ("success", f"Venta #{id_venta} finalizada exitosamente. Total: ${total_venta:.2f}", None)
+
         # Limpiar el carrito después de la venta
         st.session_state.carrito = {}
+        return True
 
+    except StockInsuficienteError as e:
+        st.session_state.resultado_venta = ("error", "No hay stock suficiente para completar la venta. Ajusta el carrito:", e.faltantes)
+        return False
     except Exception as e:
-        db.rollback()
-        st.error(f"Ocurrió un error al procesar la venta: {e}")
-
-# --- Interfaz de la aplicación ---
-col_productos, col_carrito = st.columns([2, 1])
-
-# Sección de productos
-with col_productos:
-    st.subheader("Productos Disponibles")
-    productos = get_productos_disponibles(db)
-    
-    if productos:
-        for producto in productos:
-            inventario = producto.inventario
-            with st.container():
-                st.write(f"**{producto.nombre}** - ${producto.precio_venta:.2f}")
-                st.write(f"Stock: {inventario.cantidad}")
-                col1, col2 = st.columns([1, 10])
+        st.session_state.resultado_venta = ("error", f"Ocurrió un error al procesar la venta: {e}", None)
+        return False
+
+def renovar_apartados(db):
+    # Los apartados vencen si la caja queda inactiva; mientras haya carrito se renuevan
+    # cada media duración
+    if not st.session_state.carrito:
+        st.session_state.reserva_renovada = time.monotonic()
+    elif time.monotonic() - st.session_state.reserva_renovada > DURACION_RESERVA.total_seconds() / 2:
+        cantidades = {producto_id: item['cantidad'] for producto_id, item in st.session_state.carrito.items()}
+        sin_stock = renovar(db, st.session_state.id_carrito, cantidades)
+        st.session_state.reserva_renovada = time.monotonic()
+        if sin_stock:
+            nombres = ", ".join(st.session_state.carrito[producto_id]['nombre'] for producto_id in sin_stock)
+            st.warning(f"Venció el apartado y ya no hay stock suficiente de: {nombres}. Ajusta el carrito.")
+
+
+# --- Acciones de los botones ---
+# Eligen qué fragmentos se vuelven a ejecutar: un cambio del carrito solo redibuja el
+# carrito y el total; el catálogo se vuelve a consultar solo cuando una venta cambia el stock.
+def _agregar(producto_id):
+    with get_db() as db:
+        add_to_carrito(db, producto_id, st.session_state[f"cantidad_{producto_id}"])
+    st.rerun([FRAGMENTO_CARRITO, FRAGMENTO_COBRO])
+
+def _quitar(producto_id):
+    with get_db() as db:
+        remove_from_carrito(db, producto_id)
+    st.rerun([FRAGMENTO_CARRITO, FRAGMENTO_COBRO])
+
+def _finalizar():
+    with get_db() as db:
+        vendida = finalizar_venta(db)
+    if vendida:
+        st.session_state.consulta_catalogo = None
+        st.rerun([FRAGMENTO_CATALOGO, FRAGMENTO_CARRITO, FRAGMENTO_COBRO])
+
+
+# --- Fragmentos de la interfaz ---
+# Cada uno abre su propia sesión: al volver a ejecutarse solo, el resto de la página ya
+# terminó. Con el perfilado activo sus ejecuciones sueltas se miden aparte.
+@st.fragment(key=FRAGMENTO_CATALOGO)
+def catalogo():
+    with get_db() as db, perfilar_pagina("Ventas (catálogo)", mostrar_controles=False), seccion("productos"):
+        with seccion("renovar apartados"):
+            renovar_apartados(db)
+
+        st.subheader("Productos Disponibles")
+        col_busqueda, col_categoria, col_orden = st.columns([2, 1, 1])
+        with col_busqueda:
+            busqueda = st.text_input("Buscar producto", placeholder="Nombre o descripción").strip()
+        with col_categoria:
+            if st.session_state.categorias is None:
+                st.session_state.categorias = get_categorias(db)
+            categoria = st.selectbox("Categoría", [TODAS_LAS_CATEGORIAS] + st.session_state.categorias)
+        with col_orden:
+            orden = st.selectbox("Ordenar por", [ORDEN_NOMBRE, ORDEN_POPULARIDAD])
+
+        # Si cambian los filtros se vuelve a la primera página
+        filtros = (busqueda, categoria, orden)
+        if st.session_state.get('filtros_catalogo') != filtros:
+            st.session_state.filtros_catalogo = filtros
+            st.session_state.cursores_pagina = [None]
+
+        # Cambiar la cantidad de un producto vuelve a dibujar el catálogo con la misma consulta
+        clave = (filtros, st.session_state.cursores_pagina[-1])
+        consulta = st.session_state.consulta_catalogo
+        if consulta is None or consulta[0] != clave:
+            with seccion("consulta de productos"):
+                productos, cursor_siguiente = get_productos_disponibles(
+                    db,
+                    busqueda=busqueda,
+                    categoria=None if categoria == TODAS_LAS_CATEGORIAS else categoria,
+                    orden=orden,
+                    cursor=st.session_state.cursores_pagina[-1],
+                    id_carrito=st.session_state.id_carrito
+                )
+            st.session_state.consulta_catalogo = (clave, productos, cursor_siguiente)
+        else:
+            _, productos, cursor_siguiente = consulta
+
+        if productos:
+            for producto in productos:
+                # `disponible` ya descuenta lo apartado por otras cajas; lo que este carrito
+                # pida de más lo rechaza el apartado al agregar
+                with st.container():
+                    st.write(f"**{producto.nombre}** - ${producto.precio_venta:.2f}")
+                    if producto.disponible < producto.stock:
+                        st.write(f"Stock: {producto.stock} ({producto.stock - producto.disponible} apartado(s) en otras cajas)")
+                    else:
+                        st.write(f"Stock: {producto.stock}")
+                    col1, col2 = st.columns([1, 10])
+                    with col1:
+                        st.number_input(
+                            f"Cantidad_{producto.id_producto}",
+                            min_value=1,
+                            max_value=max(producto.disponible, 1),
+                            value=1,
+                            key=f"cantidad_{producto.id_producto}",
+                            disabled=producto.disponible < 1,
+                            label_visibility="collapsed"
+                        )
+                    with col2:
+                        st.button("Agregar al Carrito", key=f"add_{producto.id_producto}", disabled=producto.disponible < 1,
+                                  on_click=_agregar, args=(producto.id_producto,))
+                    st.markdown("---")
+
+            col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+            with col_anterior:
+                st.button("◀ Anterior", on_click=_pagina_anterior, disabled=len(st.session_state.cursores_pagina) == 1)
+            with col_pagina:
+                st.caption(f"Página {len(st.session_state.cursores_pagina)}")
+            with col_siguiente:
+                st.button("Siguiente ▶", on_click=_pagina_siguiente, args=(cursor_siguiente,), disabled=cursor_siguiente is None)
+        elif busqueda or categoria != TODAS_LAS_CATEGORIAS:
+            st.info("Ningún producto con stock coincide con la búsqueda.")
+        else:
+            st.warning("No hay productos en stock para vender.")
+
+
+@st.fragment(key=FRAGMENTO_CARRITO)
+def carrito():
+    with get_db() as db, perfilar_pagina("Ventas (carrito)", mostrar_controles=False), seccion("carrito"):
+        with seccion("renovar apartados"):
+            renovar_apartados(db)
+
+        st.subheader("Carrito de Compras")
+        if 'aviso_carrito' in st.session_state:
+            tipo, mensaje = st.session_state.pop('aviso_carrito')
+            getattr(st, tipo)(mensaje)
+
+        if st.session_state.carrito:
+            for producto_id, item in st.session_state.carrito.items():
+                total_producto = item['precio_venta'] * item['cantidad']
+                col1, col2 = st.columns([3, 1])
                 with col1:
-                    cantidad_a_agregar = st.number_input(
-                        f"Cantidad_{producto.id_producto}", 
-                        min_value=1, 
-                        max_value=inventario.cantidad, 
-                        value=1, 
-                        label_visibility="collapsed"
-                    )
+                    st.write(f"{item['nombre']} x {item['cantidad']} = ${total_producto:.2f}")
                 with col2:
-                    if st.button("Agregar al Carrito", key=f"add_{producto.id_producto}"):
-                        add_to_carrito(producto.id_producto, cantidad_a_agregar)
-                st.markdown("---")
-    else:
-        st.warning("No hay productos en stock para vender.")
-
-# Sección del carrito de compras
-with col_carrito:
-    st.subheader("Carrito de Compras")
-    if st.session_state.carrito:
-        total_carrito = 0
-        for producto_id, item in st.session_state.carrito.items():
-            total_producto = item['precio_venta'] * item['cantidad']
-            total_carrito += total_producto
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"{item['nombre']} x {item['cantidad']} = ${total_producto:.2f}")
-            with col2:
-                if st.button("X", key=f"remove_{producto_id}"):
-                    remove_from_carrito(producto_id)
-                    st.experimental_rerun()
-        
-        st.markdown("---")
-        st.subheader(f"Total: ${total_carrito:.2f}")
-        
-        if st.button("Finalizar Venta"):
-            finalizar_venta(db)
-            st.experimental_rerun()
-    else:
-        st.info("El carrito está vacío.")
+                    st.button("X", key=f"remove_{producto_id}", on_click=_quitar, args=(producto_id,))
+        else:
+            st.info("El carrito está vacío.")
+
+
+@st.fragment(key=FRAGMENTO_COBRO)
+def cobro():
+    with perfilar_pagina("Ventas (cobro)", mostrar_controles=False), seccion("cobro"):
+        if 'resultado_venta' in st.session_state:
+            tipo, mensaje, faltantes = st.session_state.pop('resultado_venta')
+            getattr(st, tipo)(mensaje)
+            if faltantes:
+                st.dataframe(faltantes, use_container_width=True)
+
+        if st.session_state.carrito:
+            total_carrito = sum(item['precio_venta'] * item['cantidad'] for item in st.session_state.carrito.values())
+            st.markdown("---")
+            st.subheader(f"Total: ${total_carrito:.2f}")
+            st.button("Finalizar Venta", on_click=_finalizar)
+
+
+iniciar_limpieza_reservas()
+iniciar_cortes_inventario()
+
+# Las consultas de una ejecución completa cuentan como una sola en Diagnóstico, aunque
+# cada fragmento abra su sesión. Con el perfilado activo se mide cada sección (ver profiling.py).
+with medir_ejecucion(), perfilar_pagina("Ventas"):
+    # --- Interfaz de la aplicación ---
+    col_productos, col_carrito = st.columns([2, 1])
+
+    # Sección de productos
+    with col_productos:
+        catalogo()
+
+    # Sección del carrito de compras y cobro
+    with col_carrito:
+        carrito()
+        cobro()
@@ -1,6 +1,7 @@
 import streamlit as st
-from db import SessionLocal, Productos, Inventario
-from sqlalchemy.orm import joinedload
+from db import get_db
+from catalog import get_catalogo
+from purchasing import calcular_lista_compras, registrar_recepcion, ParametrosReorden, ESTADO_BAJO
 
 st.set_page_config(
     page_title="Lista de Compras",
@@ -11,67 +12,94 @@ st.set_page_config(
 st.title("Lista de Compras 🛒")
 st.markdown("Reabastece tu inventario para evitar quedarte sin productos populares.")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Parámetros del punto de reorden (ver purchasing.py)
+predeterminados = ParametrosReorden()
+with st.expander("Parámetros de reabastecimiento"):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ventana_dias = st.number_input("Días de ventas para la velocidad", min_value=7, max_value=365, value=predeterminados.ventana_dias, step=7)
+        dias_entrega = st.number_input("Días de entrega del proveedor", min_value=0, max_value=60, value=predeterminados.dias_entrega, step=1)
+    with col2:
+        dias_cobertura = st.number_input("Días de venta que cubre cada pedido", min_value=0, max_value=90, value=predeterminados.dias_cobertura, step=1)
+        nivel_servicio = st.slider("Nivel de servicio", min_value=0.50, max_value=0.99, value=predeterminados.nivel_servicio, step=0.01,
+                                   help="Probabilidad de no quedarse sin stock mientras llega el pedido.")
+    with col3:
+        # Opcional: Permitir al usuario definir un umbral de stock bajo
+        umbral = st.number_input("Establece un umbral de stock bajo:", min_value=1, value=predeterminados.stock_minimo, step=1,
+                                 help="Punto de reorden mínimo, también para productos sin ventas recientes.")
+parametros = ParametrosReorden(ventana_dias, dias_entrega, dias_cobertura, nivel_servicio, umbral)
 
-db = next(get_db())
+# Conexión a la base de datos: la sesión se cierra al terminar la ejecución de la página
+with get_db() as db:
+    # Muestra el inventario con una columna de alerta, de lo más urgente a lo menos
+    st.subheader("Inventario para Reabastecer")
+    lista = calcular_lista_compras(parametros)
 
-# Muestra el inventario con una columna de alerta
-st.subheader("Inventario para Reabastecer")
-productos = db.query(Productos).options(joinedload(Productos.inventario)).all()
+    if not lista.empty:
+        st.dataframe(lista, use_container_width=True, hide_index=True)
 
-# Opcional: Permitir al usuario definir un umbral de stock bajo
-umbral = st.number_input("Establece un umbral de stock bajo:", min_value=1, value=5, step=1)
+        st.markdown("---")
 
-if productos:
-    data = []
-    lista_de_compras = []
-    
-    for p in productos:
-        cantidad = p.inventario.cantidad if p.inventario else 0
-        alerta = "⚠️ Stock Bajo" if cantidad <= umbral else "✅ Stock Suficiente"
-        
-        data.append({
-            'ID': p.id_producto,
-            'Producto': p.nombre,
-            'Stock Actual': cantidad,
-            'Estado': alerta
-        })
+        # Muestra la lista de productos a comprar
+        st.subheader("Productos para Comprar")
+        lista_de_compras = lista[lista['Estado'] == ESTADO_BAJO]
+        if not lista_de_compras.empty:
+            st.dataframe(lista_de_compras[['ID', 'Producto', 'Stock Actual', 'Punto de Reorden', 'Cantidad Sugerida']],
+                         use_container_width=True, hide_index=True)
+        else:
+            st.info("¡No hay productos con stock bajo en este momento!")
 
-        if cantidad <= umbral:
-            lista_de_compras.append(p)
-    
-    st.dataframe(data, use_container_width=True)
+        st.markdown("---")
 
-    st.markdown("---")
+        # Recepción del pedido: todas las cantidades se registran juntas en una orden de compra
+        st.subheader("Recibir Pedido")
+        if "recepcion_registrada" in st.session_state:
+            st.success(st.session_state.pop("recepcion_registrada"))
 
-    # Muestra la lista de productos a comprar
-    st.subheader("Productos para Comprar")
-    if lista_de_compras:
-        for producto in lista_de_compras:
-            col1, col2 = st.columns([1, 4])
-            with col1:
-                st.write(f"**{producto.nombre}**")
-            with col2:
-                cantidad_a_comprar = st.number_input(
-                    f"Cantidad a comprar para {producto.nombre}", 
-                    min_value=1, 
-                    value=10, 
-                    step=1, 
-                    key=f"compra_{producto.id_producto}"
+        mostrar_todos = st.checkbox("Mostrar todos los productos", value=lista_de_compras.empty)
+        a_recibir = (lista if mostrar_todos else lista_de_compras)[['ID', 'Producto', 'Stock Actual', 'Cantidad Sugerida']]
+        if not a_recibir.empty:
+            productos = get_catalogo().obtener_varios(a_recibir['ID'].tolist())
+            a_recibir = a_recibir.assign(**{
+                'Cantidad a Recibir': a_recibir['Cantidad Sugerida'],
+                'Costo Unitario': [float(productos[i].precio_compra) if i in productos else 0.0 for i in a_recibir['ID']],
+            })
+            with st.form("recibir_pedido"):
+                editado = st.data_editor(
+                    a_recibir,
+                    use_container_width=True,
+                    hide_index=True,
+                    disabled=['ID', 'Producto', 'Stock Actual', 'Cantidad Sugerida'],
+                    column_config={
+                        'Cantidad a Recibir': st.column_config.NumberColumn(min_value=0, step=1, format="%d"),
+                        'Costo Unitario': st.column_config.NumberColumn(min_value=0.0, step=0.01, format="$%.2f"),
+                    },
+                    key="editor_recepcion"
                 )
-                if st.button("Comprar y Actualizar Stock", key=f"actualizar_{producto.id_producto}"):
-                    inventario = db.query(Inventario).filter(Inventario.id_producto == producto.id_producto).first()
-                    if inventario:
-                        inventario.cantidad += cantidad_a_comprar
-                        db.commit()
-                        st.success(f"Stock de {producto.nombre} actualizado. Cantidad total: {inventario.cantidad}")
-                        st.experimental_rerun()
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    proveedor = st.text_input("Proveedor (opcional)", max_chars=100)
+                with col2:
+                    como_gasto = st.checkbox("Registrar como gasto", value=True,
+                                             help="Agrega el total del pedido a Gastos, en la categoría Inventario.")
+                enviado = st.form_submit_button("Registrar Pedido y Actualizar Stock")
+
+            if enviado:
+                # Las celdas vaciadas en el editor cuentan como cero
+                editado = editado.fillna({'Cantidad a Recibir': 0, 'Costo Unitario': 0.0})
+                lineas = {
+                    int(fila['ID']): (int(fila['Cantidad a Recibir']), float(fila['Costo Unitario']))
+                    for _, fila in editado.iterrows() if fila['Cantidad a Recibir'] > 0
+                }
+                if not lineas:
+                    st.warning("Indica la cantidad recibida de al menos un producto.")
+                else:
+                    try:
+                        id_orden, total = registrar_recepcion(db, lineas, proveedor.strip() or None, como_gasto)
+                    except Exception as e:
+                        st.error(f"Error al registrar el pedido: {e}")
                     else:
-                        st.error("Error al actualizar el inventario.")
-    else:
-        st.info("¡No hay productos con stock bajo en este momento!")
+                        st.session_state["recepcion_registrada"] = (
+                            f"Orden de compra #{id_orden} registrada: {len(lineas)} productos, total ${total:.2f}."
+                        )
+                        st.rerun()
@@ -1,9 +1,11 @@
 import streamlit as st
-from db import SessionLocal, Ventas, Gastos
-from sqlalchemy import func
+from db import get_db, CATEGORIA_GASTO_OTRO
+from cash import (cerrar_dias_pendientes, get_saldo, retirar, ajustar, get_movimientos,
+                  get_categorias_gasto, registrar_gasto)
+from rollups import TIPO_INGRESO, TIPO_GASTO
+from aggregates import get_instantanea, actualizar_agregados
 from datetime import date, timedelta
 import pandas as pd
-import os
 
 st.set_page_config(
     page_title="Gestión Financiera",
@@ -14,113 +16,131 @@ st.set_page_config(
 st.title("Gestión Financiera 💸")
 st.markdown("Registra y analiza tus gastos para una visión completa del flujo de caja.")
 
-# Función para la conexión a la base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-db = next(get_db())
-
-# --- 1. Sección de Gastos ---
-st.subheader("Registrar Nuevo Gasto")
-opciones_gastos = ["Renta Diaria", "Salario", "Inventario", "Gasolina", "Otro"]
-with st.form("form_gasto", clear_on_submit=True):
-    tipo_gasto = st.selectbox("Tipo de Gasto", opciones_gastos)
-    monto = st.number_input("Monto", min_value=0.01, format="%.2f")
-    
-    # Si el tipo de gasto es "Otro", permite al usuario escribir la descripción
-    if tipo_gasto == "Otro":
-        descripcion = st.text_input("Descripción del Gasto")
-    else:
-        descripcion = tipo_gasto
-        
-    submitted = st.form_submit_button("Registrar Gasto")
-    if submitted:
-        if descripcion and monto > 0:
-            nuevo_gasto = Gastos(descripcion=descripcion, monto=monto)
-            db.add(nuevo_gasto)
-            db.commit()
-            st.success(f"Gasto '{descripcion}' de ${monto:.2f} registrado exitosamente.")
+# Conexión a la base de datos: la sesión se cierra al terminar la ejecución de la página
+with get_db() as db:
+    # --- 1. Sección de Gastos ---
+    st.subheader("Registrar Nuevo Gasto")
+    categorias_gasto = dict(get_categorias_gasto(db))
+    with st.form("form_gasto", clear_on_submit=True):
+        id_categoria = st.selectbox("Tipo de Gasto", list(categorias_gasto), format_func=categorias_gasto.get)
+        monto = st.number_input("Monto", min_value=0.01, format="%.2f")
+
+        # Si el tipo de gasto es "Otro", permite al usuario escribir la descripción
+        if categorias_gasto.get(id_categoria) == CATEGORIA_GASTO_OTRO:
+            descripcion = st.text_input("Descripción del Gasto")
         else:
-            st.error("Por favor, completa todos los campos.")
-
-st.markdown("---")
-
-# --- 2. Sección de Cuenta de Efectivo ---
-st.subheader("Cuenta de Efectivo")
-
-# Archivo para guardar el efectivo acumulado
-efectivo_file = "efectivo_acumulado.txt"
-if not os.path.exists(efectivo_file):
-    with open(efectivo_file, "w") as f:
-        f.write("0.00")
-
-with open(efectivo_file, "r") as f:
-    efectivo_acumulado = float(f.read())
-
-# Obtener ventas y gastos del día anterior para calcular la ganancia neta diaria
-ayer = date.today() - timedelta(days=1)
-ventas_ayer = db.query(func.sum(Ventas.total_venta)).filter(func.date(Ventas.fecha_venta) == ayer).scalar() or 0
-gastos_ayer = db.query(func.sum(Gastos.monto)).filter(func.date(Gastos.fecha_gasto) == ayer).scalar() or 0
-ganancia_neta_ayer = ventas_ayer - gastos_ayer
-
-# Actualizar el efectivo acumulado
-efectivo_acumulado += ganancia_neta_ayer
-with open(efectivo_file, "w") as f:
-    f.write(f"{efectivo_acumulado:.2f}")
-
-col_efectivo, col_retirar = st.columns(2)
-with col_efectivo:
-    st.metric("Efectivo Acumulado", f"${efectivo_acumulado:.2f}")
-
-with col_retirar:
-    st.markdown("#### Retirar Efectivo")
-    monto_a_retirar = st.number_input("¿Cuánto desea retirar?", min_value=0.00, max_value=efectivo_acumulado, format="%.2f")
-    if st.button("Retirar Monto"):
-        if monto_a_retirar > 0 and monto_a_retirar <= efectivo_acumulado:
-            efectivo_acumulado -= monto_a_retirar
-            with open(efectivo_file, "w") as f:
-                f.write(f"{efectivo_acumulado:.2f}")
-            st.success(f"Se ha retirado ${monto_a_retirar:.2f}. Nuevo efectivo acumulado: ${efectivo_acumulado:.2f}")
-            st.experimental_rerun()
+            descripcion = categorias_gasto.get(id_categoria)
+
+        submitted = st.form_submit_button("Registrar Gasto")
+        if submitted:
+            if descripcion and monto > 0:
+                registrar_gasto(db, id_categoria, descripcion, monto)
+                # El análisis de abajo ya debe incluirlo
+                actualizar_agregados()
+                st.success(f"Gasto '{descripcion}' de ${monto:.2f} registrado exitosamente.")
+            else:
+                st.error("Por favor, completa todos los campos.")
+
+    st.markdown("---")
+
+    # --- 2. Sección de Cuenta de Efectivo ---
+    st.subheader("Cuenta de Efectivo")
+
+    # Cierra los días pendientes (hasta ayer); los ya cerrados no se vuelven a sumar
+    cerrar_dias_pendientes(db)
+    efectivo_acumulado = get_saldo(db)
+
+    col_efectivo, col_retirar = st.columns(2)
+    with col_efectivo:
+        st.metric("Efectivo Acumulado", f"${efectivo_acumulado:.2f}")
+
+        with st.expander("Ajustar saldo"):
+            with st.form("form_ajuste", clear_on_submit=True):
+                monto_ajuste = st.number_input("Monto del ajuste (negativo para restar)", format="%.2f")
+                motivo_ajuste = st.text_input("Motivo")
+                if st.form_submit_button("Registrar Ajuste"):
+                    if monto_ajuste != 0 and motivo_ajuste:
+                        ajustar(db, monto_ajuste, motivo_ajuste)
+                        st.rerun()
+                    else:
+                        st.warning("Indica un monto distinto de cero y el motivo del ajuste.")
+
+    with col_retirar:
+        st.markdown("#### Retirar Efectivo")
+        monto_a_retirar = st.number_input("¿Cuánto desea retirar?", min_value=0.00, max_value=max(efectivo_acumulado, 0.0), format="%.2f")
+        if st.button("Retirar Monto"):
+            # El saldo se vuelve a comprobar al registrar: otra sesión pudo retirar antes
+            if monto_a_retirar > 0 and retirar(db, monto_a_retirar, "Retiro de efectivo"):
+                st.success(f"Se ha retirado ${monto_a_retirar:.2f}. Nuevo efectivo acumulado: ${get_saldo(db):.2f}")
+                st.rerun()
+            else:
+                st.warning("Ingrese un monto válido para retirar.")
+
+    st.markdown("---")
+
+    # --- 3. Sección de Análisis Financiero ---
+    st.subheader("Análisis de Flujo de Caja")
+    start_date = st.date_input("Fecha de Inicio del Análisis", date.today() - timedelta(days=30))
+    end_date = st.date_input("Fecha de Fin del Análisis", date.today())
+
+    # Totales exactos del periodo y del periodo anterior de la misma duración, de los
+    # agregados por día en memoria (ver aggregates.py)
+    instantanea = get_instantanea()
+    dias_periodo = (end_date - start_date).days + 1
+    ventas_totales, gastos_totales = instantanea.totales_flujo(start_date, end_date)
+    ventas_anteriores, gastos_anteriores = instantanea.totales_flujo(
+        start_date - timedelta(days=dias_periodo), start_date - timedelta(days=1)
+    )
+    ganancia_neta = ventas_totales - gastos_totales
+    ganancia_anterior = ventas_anteriores - gastos_anteriores
+
+    st.caption(f"Comparado con los {dias_periodo} días anteriores.")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Ventas Totales", f"${ventas_totales:.2f}", delta=f"{ventas_totales - ventas_anteriores:.2f}")
+    with col2:
+        st.metric("Gastos Totales", f"${gastos_totales:.2f}", delta=f"{gastos_totales - gastos_anteriores:.2f}", delta_color="inverse")
+    with col3:
+        st.metric("Ganancia Neta", f"${ganancia_neta:.2f}", delta=f"{ganancia_neta - ganancia_anterior:.2f}")
+
+    st.markdown("---")
+
+    # Visualización con gráficos: pocas filas por día, semana o mes
+    st.subheader("Ingresos y Gastos por Periodo")
+    granularidades = {'dia': "Día", 'semana': "Semana", 'mes': "Mes"}
+    sugerida = 0 if dias_periodo <= 62 else 1 if dias_periodo <= 366 else 2
+    granularidad = st.radio("Agrupar por", list(granularidades), index=sugerida,
+                            format_func=granularidades.get, horizontal=True)
+
+    df_flujo = pd.DataFrame(instantanea.flujo_caja(start_date, end_date, granularidad),
+                            columns=['Periodo', 'Tipo', 'Categoría', 'Monto'])
+    if not df_flujo.empty:
+        df_periodos = df_flujo.pivot_table(index='Periodo', columns='Tipo', values='Monto', aggfunc='sum', fill_value=0)
+        df_periodos = df_periodos.reindex(columns=[TIPO_INGRESO, TIPO_GASTO], fill_value=0)
+        df_periodos.columns = ['Ventas', 'Gastos']
+        df_periodos['Ganancia Neta'] = df_periodos['Ventas'] - df_periodos['Gastos']
+
+        st.bar_chart(df_periodos[['Ventas', 'Gastos']], stack=False)
+        st.line_chart(df_periodos[['Ganancia Neta']])
+
+        st.write("#### Gastos por Categoría")
+        df_gastos = df_flujo[df_flujo['Tipo'] == TIPO_GASTO]
+        if not df_gastos.empty:
+            st.bar_chart(df_gastos.pivot_table(index='Periodo', columns='Categoría', values='Monto', aggfunc='sum', fill_value=0))
         else:
-            st.warning("Ingrese un monto válido para retirar.")
-
-st.markdown("---")
-
-# --- 3. Sección de Análisis Financiero ---
-st.subheader("Análisis de Flujo de Caja")
-start_date = st.date_input("Fecha de Inicio del Análisis", date.today() - timedelta(days=30))
-end_date = st.date_input("Fecha de Fin del Análisis", date.today())
-
-ventas_totales = db.query(func.sum(Ventas.total_venta)).filter(Ventas.fecha_venta >= start_date, Ventas.fecha_venta <= end_date).scalar() or 0
-gastos_totales = db.query(func.sum(Gastos.monto)).filter(Gastos.fecha_gasto >= start_date, Gastos.fecha_gasto <= end_date).scalar() or 0
-ganancia_neta = ventas_totales - gastos_totales
-
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric("Ventas Totales", f"${ventas_totales:.2f}")
-with col2:
-    st.metric("Gastos Totales", f"${gastos_totales:.2f}")
-with col3:
-    st.metric("Ganancia Neta", f"${ganancia_neta:.2f}")
-
-# ... (resto de la sección de análisis financiero, incluyendo el gráfico de barras) ...
-st.markdown("---")
-
-# Visualización con gráfico
-st.subheader("Distribución de Ingresos y Gastos")
-datos_flujo = pd.DataFrame({
-    'Tipo': ['Ventas', 'Gastos'],
-    'Monto': [ventas_totales, gastos_totales]
-})
-
-# Ajustar los valores para el gráfico de barras si son negativos
-datos_flujo['Monto'] = datos_flujo['Monto'].abs()
-
-st.bar_chart(datos_flujo, x='Tipo', y='Monto')
-
-st.write("Esta gráfica te ayuda a visualizar la relación entre tus ventas y tus gastos en el periodo seleccionado.")
+            st.info("No hay gastos en el periodo seleccionado.")
+    else:
+        st.info("No hay ventas ni gastos en el periodo seleccionado.")
+
+    st.write("Estas gráficas te ayudan a visualizar la relación entre tus ventas y tus gastos en el periodo seleccionado.")
+
+    # Movimientos de la caja en el mismo periodo
+    st.subheader("Movimientos de Efectivo")
+    movimientos = get_movimientos(db, start_date, end_date)
+    if movimientos:
+        st.dataframe(
+            pd.DataFrame(movimientos, columns=['Fecha', 'Tipo', 'Descripción', 'Monto', 'Saldo']),
+            use_container_width=True
+        )
+    else:
+        st.info("No hay movimientos de efectivo en el periodo seleccionado.")
@@ -0,0 +1,147 @@
+import io
+import os
+import pstats
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from db import db_path, get_estadisticas_pool
+from diagnostics import (get_ejecuciones, resumen_por_pagina, get_repetidas, get_lentas, get_fuera_de_ejecucion,
+                         reiniciar, volcar, generar_json, generar_prometheus, FORMATO_JSON, FORMATO_PROMETHEUS,
+                         UMBRAL_N_MAS_1)
+import profiling
+
+st.set_page_config(
+    page_title="Diagnóstico",
+    page_icon="🩺",
+    layout="wide"
+)
+
+st.title("Diagnóstico de Consultas 🩺")
+st.markdown("Consultas a la base de datos de cada ejecución de las páginas, desde que se inició la aplicación.")
+
+# Los volcados se guardan junto a la base de datos
+DIRECTORIO_VOLCADOS = os.path.join(os.path.dirname(db_path), "diagnostico")
+
+# Las estadísticas son del proceso; esta página no abre sesión, así no aparece en ellas
+ejecuciones = get_ejecuciones()
+repetidas = get_repetidas(ejecuciones)
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Ejecuciones registradas", len(ejecuciones))
+with col2:
+    st.metric("Consultas", sum(e.consultas for e in ejecuciones))
+with col3:
+    st.metric("Con posible N+1", sum(1 for e in ejecuciones if e.repetidas),
+              help=f"Ejecuciones en las que la misma sentencia se repitió {UMBRAL_N_MAS_1} veces o más.")
+with col4:
+    st.metric("Errores por bloqueo", get_estadisticas_pool()["errores_por_bloqueo"])
+
+if not ejecuciones:
+    st.info("Todavía no hay ejecuciones registradas. Navega por las demás páginas y vuelve aquí.")
+else:
+    st.subheader("Por Página")
+    st.dataframe(pd.DataFrame(resumen_por_pagina(ejecuciones)).rename(columns={
+        "pagina": "Página",
+        "ejecuciones": "Ejecuciones",
+        "consultas_promedio": "Consultas (prom.)",
+        "consultas_max": "Consultas (máx.)",
+        "tiempo_sql_promedio_ms": "SQL ms (prom.)",
+        "tiempo_sql_p95_ms": "SQL ms (p95)",
+        "duracion_promedio_ms": "Duración ms (prom.)",
+        "ejecuciones_con_n_mas_1": "Con N+1",
+    }), use_container_width=True, hide_index=True)
+
+    st.subheader("Posibles N+1")
+    if repetidas:
+        st.dataframe(pd.DataFrame(repetidas).rename(columns={
+            "pagina": "Página", "sentencia": "Sentencia", "veces_max": "Veces (máx.)", "ejecuciones": "Ejecuciones"
+        }), use_container_width=True, hide_index=True)
+    else:
+        st.success("Ninguna sentencia se repitió dentro de una misma ejecución.")
+
+    st.subheader("Consultas Más Lentas")
+    st.dataframe(pd.DataFrame(get_lentas(20, ejecuciones)).rename(columns={
+        "pagina": "Página", "inicio": "Ejecución", "sentencia": "Sentencia", "ms": "ms"
+    }), use_container_width=True, hide_index=True)
+
+    st.subheader("Últimas Ejecuciones")
+    st.dataframe(pd.DataFrame([{
+        "Inicio": e.inicio,
+        "Página": e.pagina,
+        "Consultas": e.consultas,
+        "SQL ms": e.tiempo_sql_ms,
+        "p95 ms": e.p95_ms,
+        "Duración ms": e.duracion_ms,
+        "N+1": len(e.repetidas),
+    } for e in ejecuciones[:100]]), use_container_width=True, hide_index=True)
+
+fuera = get_fuera_de_ejecucion()
+if fuera:
+    with st.expander("Consultas fuera de una ejecución"):
+        st.caption("Hilos de fondo y funciones en caché de páginas que no abren una sesión.")
+        st.dataframe(pd.DataFrame([
+            {"Origen": origen, "Consultas": n, "Tiempo ms": ms} for origen, (n, ms) in sorted(fuera.items())
+        ]), use_container_width=True, hide_index=True)
+
+# --- Tiempos por sección (perfilado opcional, ver profiling.py) ---
+st.markdown("---")
+st.subheader("Tiempos por Sección")
+estadisticas = profiling.get_estadisticas()
+if not estadisticas:
+    st.info(f"El perfilado está apagado o no ha medido nada. Actívalo en la barra lateral de Ventas o Reportes, "
+            f"o para todas las sesiones con {profiling.VARIABLE_ENTORNO}=1 ({profiling.VARIABLE_ENTORNO}="
+            f"{profiling.MODO_CPROFILE} guarda además perfiles cProfile).")
+else:
+    st.caption(f"Percentiles de las últimas {profiling.VENTANA} ejecuciones medidas de cada sección; "
+               f"\"{profiling.SECCION_TOTAL}\" es la ejecución completa.")
+    st.dataframe(pd.DataFrame(estadisticas).rename(columns={
+        "pagina": "Página",
+        "seccion": "Sección",
+        "ejecuciones": "Ejecuciones",
+        "p50_ms": "p50 ms",
+        "p95_ms": "p95 ms",
+        "p99_ms": "p99 ms",
+        "max_ms": "Máx. ms",
+        "sql_pct": "% SQL",
+    }), use_container_width=True, hide_index=True)
+
+    perfiles = profiling.get_perfiles_guardados()
+    if perfiles:
+        st.write("#### Perfiles de las Ejecuciones Más Lentas")
+        ruta_perfil = st.selectbox("Perfil:", [ruta for _, _, ruta in perfiles],
+                                   format_func=lambda ruta: os.path.basename(ruta))
+        if os.path.exists(ruta_perfil):
+            salida = io.StringIO()
+            pstats.Stats(ruta_perfil, stream=salida).sort_stats("cumulative").print_stats(25)
+            st.code(salida.getvalue(), language=None)
+            st.caption(f"Para explorarlo: python -m pstats {ruta_perfil}")
+
+    if st.button("Reiniciar tiempos"):
+        profiling.reiniciar()
+        st.rerun()
+
+# --- Volcado para análisis fuera de línea ---
+st.markdown("---")
+st.subheader("Guardar Estadísticas")
+formato = st.radio("Formato", (FORMATO_JSON, FORMATO_PROMETHEUS), horizontal=True,
+                   format_func={FORMATO_JSON: "JSON", FORMATO_PROMETHEUS: "Prometheus (texto)"}.get)
+extension = "json" if formato == FORMATO_JSON else "prom"
+col1, col2, col3 = st.columns(3)
+with col1:
+    if st.button("Guardar en archivo"):
+        nombre = f"consultas_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+        ruta = volcar(os.path.join(DIRECTORIO_VOLCADOS, nombre), formato)
+        st.success(f"Estadísticas guardadas en {ruta}")
+with col2:
+    st.download_button(
+        "Descargar",
+        data=generar_json() if formato == FORMATO_JSON else generar_prometheus(),
+        file_name=f"consultas.{extension}",
+        mime="application/json" if formato == FORMATO_JSON else "text/plain"
+    )
+with col3:
+    if st.button("Reiniciar estadísticas"):
+        reiniciar()
+        st.rerun()
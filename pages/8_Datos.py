@@ -1,11 +1,11 @@
 import streamlit as st
-import pandas as pd
-from db import SessionLocal, Productos, Inventario, Ventas, DetalleVenta, Gastos
-from sqlalchemy.orm import sessionmaker
-import zipfile
-import io
-import os
-import io
+from db import get_db
+from rollups import reconstruir_resumenes, reconstruir_flujo_caja
+from sales_history import get_historial
+from aggregates import reiniciar_agregados
+from data_io import exportar_tablas_zip, abrir_exportacion, exportacion_vigente, tablas_en_zip, importar_zip
+from archive import archivar, compactar, fecha_maxima_archivable, get_estado_archivo
+import time
 
 st.set_page_config(
     page_title="Gestión de Datos",
@@ -16,53 +16,24 @@ st.set_page_config(
 st.title("Gestión de Datos 💾")
 st.markdown("Exporta e importa todas tus tablas para mantener un respaldo de tus datos.")
 
-# Un diccionario para mapear los nombres de las tablas a sus clases de SQLAlchemy
-TABLAS = {
-    "productos": Productos,
-    "inventario": Inventario,
-    "ventas": Ventas,
-    "detalle_venta": DetalleVenta,
-    "gastos": Gastos
-}
-
 # --- Exportar Datos ---
 st.header("Exportar Tablas a CSV")
 st.markdown("Descarga todas tus tablas en archivos CSV separados.")
 
-def export_all_tables_to_zip():
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, False) as zip_file:
-        db = SessionLocal()
-        try:
-            for table_name, table_class in TABLAS.items():
-                data = db.query(table_class).all()
-                df = pd.DataFrame([vars(d) for d in data])
-                
-                if not df.empty:
-                    # Limpiar columnas internas de SQLAlchemy
-                    if '_sa_instance_state' in df.columns:
-                        df = df.drop(columns=['_sa_instance_state'])
-                    
-                    # Escribir el DataFrame al buffer del zip
-                    csv_string = df.to_csv(index=False).encode('utf-8')
-                    zip_file.writestr(f"{table_name}.csv", csv_string)
-        finally:
-            db.close()
-
-    zip_buffer.seek(0)
-    return zip_buffer
-
-# Botón de descarga para el archivo ZIP
-zip_file = export_all_tables_to_zip()
-if zip_file:
-    st.download_button(
-        label="Descargar Todas las Tablas (ZIP)",
-        data=zip_file,
-        file_name="tablas_tienda_escolar.zip",
-        mime="application/zip"
-    )
-else:
-    st.warning("No hay datos para exportar.")
+# El ZIP solo se genera cuando se pide; mientras la base no cambie se reutiliza el último
+if exportacion_vigente() or st.button("Preparar Exportación"):
+    with st.spinner("Generando archivo de exportación..."):
+        ruta_zip = exportar_tablas_zip()
+    if ruta_zip:
+        # El archivo se lee recién al descargar
+        st.download_button(
+            label="Descargar Todas las Tablas (ZIP)",
+            data=abrir_exportacion,
+            file_name="tablas_tienda_escolar.zip",
+            mime="application/zip"
+        )
+    else:
+        st.warning("No hay datos para exportar.")
 
 # --- Importar Datos ---
 st.header("Importar Datos desde CSV")
@@ -75,53 +46,77 @@ uploaded_files = st.file_uploader(
 )
 
 if uploaded_files is not None:
-    zip_buffer = uploaded_files.getvalue()
-    zip_file = zipfile.ZipFile(io.BytesIO(zip_buffer), "r")
-    
-    st.info("Descomprimiendo archivos...")
-    
-    uploaded_dfs = {}
-    
-    for filename in zip_file.namelist():
-        with zip_file.open(filename) as file:
-            # Revisa si el archivo no está vacío
-            if file.seek(0, os.SEEK_END) > 0:
-                file.seek(0) # Regresa al inicio del archivo
-                try:
-                    df = pd.read_csv(file)
-                    table_name = filename.replace(".csv", "")
-                    if table_name in TABLAS:
-                        uploaded_dfs[table_name] = df
-                except pd.errors.EmptyDataError:
-                    st.warning(f"El archivo '{filename}' está vacío y será ignorado.")
-    
-    st.success("Archivos leídos exitosamente.")
-    
+    tablas_zip = tablas_en_zip(uploaded_files)
+    if tablas_zip:
+        st.success(f"Tablas encontradas en el archivo: {', '.join(tablas_zip)}")
+    else:
+        st.warning("El archivo no contiene CSV de tablas conocidas.")
+
     # Botón para confirmar la carga
-    if st.button("Guardar Datos en la Base de Datos"):
-        db = SessionLocal()
+    if tablas_zip and st.button("Guardar Datos en la Base de Datos"):
+        barra = st.progress(0.0, text="Importando...")
+        tablas_terminadas = []
+
+        def mostrar_progreso(tabla, filas_tabla, filas_totales, segundos):
+            if tabla not in tablas_terminadas:
+                tablas_terminadas.append(tabla)
+            velocidad = filas_totales / segundos if segundos else 0
+            barra.progress(
+                len(tablas_terminadas) / len(tablas_zip),
+                text=f"Importando **{tabla}**: {filas_tabla:,} filas ({velocidad:,.0f} filas/s)"
+            )
+
         try:
-            import_order = ["productos", "inventario", "ventas", "detalle_venta", "gastos"]
+            inicio = time.perf_counter()
+            importadas = importar_zip(uploaded_files, progreso=mostrar_progreso)
+            segundos = time.perf_counter() - inicio
+            barra.progress(1.0, text="Importación terminada")
+
+            # Los resúmenes diarios, el historial columnar y los agregados en memoria dependen
+            # de las ventas importadas
+            with get_db() as db:
+                reconstruir_resumenes(db)
+                reconstruir_flujo_caja(db)
+            get_historial().reiniciar()
+            reiniciar_agregados()
 
-            for table_name in import_order:
-                if table_name in uploaded_dfs and not uploaded_dfs[table_name].empty:
-                    st.write(f"Importando tabla: **{table_name}**")
-                    df = uploaded_dfs[table_name]
-                    
-                    # Limpiar la tabla existente
-                    db.query(TABLAS[table_name]).delete()
-                    
-                    for index, row in df.iterrows():
-                        instance = TABLAS[table_name]()
-                        for col, value in row.items():
-                            setattr(instance, col, value)
-                        db.add(instance)
-            
-            db.commit()
-            st.success("¡Datos importados y repoblados exitosamente!")
-            
+            total = sum(importadas.values())
+            st.success(f"¡Datos importados y repoblados exitosamente! {total:,} filas en {segundos:.1f} s "
+                       f"({total / segundos if segundos else 0:,.0f} filas/s).")
+            st.dataframe(
+                [{"Tabla": tabla, "Filas": filas} for tabla, filas in importadas.items()],
+                use_container_width=True
+            )
         except Exception as e:
-            db.rollback()
             st.error(f"Ocurrió un error al importar los datos: {e}")
-        finally:
-            db.close()
+
+# --- Archivo Histórico ---
+st.header("Archivo Histórico")
+st.markdown("Mueve las ventas de ciclos escolares cerrados a una base aparte. Los reportes y resúmenes "
+            "no cambian; la base principal queda más chica y rápida de respaldar. "
+            "La exportación de arriba no incluye las ventas archivadas.")
+
+estado = get_estado_archivo()
+col1, col2, col3 = st.columns(3)
+col1.metric("Ventas archivadas", f"{estado['ventas']:,}")
+col2.metric("Base principal", f"{estado['tamano_base_mb']:,.1f} MB")
+col3.metric("Archivo", f"{estado['tamano_archivo_mb']:,.1f} MB")
+if estado['hasta']:
+    st.caption(f"Archivadas las ventas anteriores al {estado['hasta']:%d/%m/%Y} "
+               f"({estado['lineas']:,} líneas, ${estado['total_ventas']:,.2f}).")
+
+maxima = fecha_maxima_archivable()
+hasta = st.date_input("Archivar las ventas anteriores al", value=maxima, max_value=maxima)
+compactar_base = st.checkbox("Compactar la base principal al terminar (VACUUM)", value=True)
+if st.button("Archivar Ventas"):
+    barra = st.progress(0.0, text="Archivando...")
+    try:
+        ventas, lineas = archivar(hasta, progreso=lambda hechas, total: barra.progress(
+            hechas / total, text=f"Archivando... {hechas:,} de {total:,} ventas"))
+        if compactar_base:
+            with st.spinner("Compactando la base..."):
+                compactar()
+        barra.progress(1.0, text="Archivo terminado")
+        st.success(f"{ventas:,} ventas y {lineas:,} líneas movidas al archivo histórico.")
+    except Exception as e:
+        st.error(f"Ocurrió un error al archivar las ventas: {e}")
@@ -0,0 +1,183 @@
+# profiling.py
+# Perfilado opcional de las páginas: cuánto tarda cada sección con nombre de una ejecución
+# (consulta del catálogo, carrito, gráficas...) y cuánto de ese tiempo fue SQL.
+#
+# Se activa con TIENDA_PERFILADO=1 para todas las sesiones o con el interruptor de la barra
+# lateral para una sola; apagado, seccion() no mide nada. Cada sección guarda sus últimas
+# VENTANA duraciones por página para calcular percentiles. Con TIENDA_PERFILADO=cprofile (o
+# la casilla de la barra lateral) cada ejecución corre además bajo cProfile y las
+# MAX_PERFILES_POR_PAGINA más lentas de cada página quedan en data/perfiles/, para
+# revisarlas con pstats o snakeviz.
+import cProfile
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import streamlit as st
+
+from db import db_path
+from diagnostics import percentil, tiempo_sql_hilo
+
+VARIABLE_ENTORNO = "TIENDA_PERFILADO"
+MODO_CPROFILE = "cprofile"
+# Duraciones guardadas por página y sección
+VENTANA = 200
+MAX_PERFILES_POR_PAGINA = 5
+DIRECTORIO_PERFILES = os.path.join(os.path.dirname(db_path), "perfiles")
+# Nombre de la sección que cubre toda la ejecución
+SECCION_TOTAL = "(total)"
+
+
+class _Perfil:
+    __slots__ = ('pagina', 'secciones', 'profiler')
+
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.secciones = []  # (nombre, ms, sql_ms)
+        self.profiler = None
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_ventanas = {}  # (pagina, seccion) -> deque de (ms, sql_ms)
+_perfiles = {}  # pagina -> montículo de (ms, ruta) con las ejecuciones más lentas guardadas
+# cProfile no admite dos perfiladores activos a la vez en Python 3.12+: uno por proceso
+_lock_cprofile = threading.Lock()
+
+
+def _modo_entorno():
+    return os.environ.get(VARIABLE_ENTORNO, "").strip().lower()
+
+
+def _controles(mostrar):
+    # (activo, con_cprofile) según la variable de entorno o los controles de la sesión
+    modo = _modo_entorno()
+    if modo in ("1", MODO_CPROFILE):
+        return True, modo == MODO_CPROFILE
+    if not mostrar:
+        activo = st.session_state.get("perfilado", False)
+        return activo, activo and st.session_state.get("perfilado_cprofile", False)
+    with st.sidebar:
+        activo = st.toggle("Medir tiempos de la página", key="perfilado",
+                           help="Tiempo de cada sección de la página; ver la página Diagnóstico.")
+        con_cprofile = activo and st.checkbox("Guardar perfil (cProfile) de las ejecuciones más lentas",
+                                              key="perfilado_cprofile")
+    return activo, con_cprofile
+
+
+@contextmanager
+def _medir(nombre, perfil):
+    t0 = time.perf_counter()
+    sql0 = tiempo_sql_hilo()
+    try:
+        yield
+    finally:
+        perfil.secciones.append((nombre, (time.perf_counter() - t0) * 1000, tiempo_sql_hilo() - sql0))
+
+
+@contextmanager
+def perfilar_pagina(pagina, mostrar_controles=True):
+    """Perfila el bloque como una ejecución de `pagina` si el perfilado está activo.
+
+    Muestra en la barra lateral el interruptor del perfilado, salvo que lo fije
+    TIENDA_PERFILADO. Los fragmentos, que se vuelven a ejecutar sin el resto de la página,
+    usan mostrar_controles=False y el estado que dejó el interruptor.
+    """
+    activo, con_cprofile = _controles(mostrar_controles)
+    if not activo or getattr(_local, 'perfil', None) is not None:
+        yield
+        return
+
+    perfil = _Perfil(pagina)
+    if con_cprofile and _lock_cprofile.acquire(blocking=False):
+        perfil.profiler = cProfile.Profile()
+        try:
+            perfil.profiler.enable()
+        except ValueError:
+            # Otra herramienta de perfilado ya está activa
+            perfil.profiler = None
+            _lock_cprofile.release()
+    _local.perfil = perfil
+    try:
+        with _medir(SECCION_TOTAL, perfil):
+            yield
+    finally:
+        _local.perfil = None
+        if perfil.profiler is not None:
+            perfil.profiler.disable()
+            _lock_cprofile.release()
+        _registrar(perfil)
+
+
+@contextmanager
+def seccion(nombre):
+    """Mide el bloque como una sección de la ejecución perfilada en curso; fuera de una
+    ejecución perfilada no hace nada. Las secciones pueden anidarse."""
+    perfil = getattr(_local, 'perfil', None)
+    if perfil is None:
+        yield
+        return
+    with _medir(nombre, perfil):
+        yield
+
+
+def _registrar(perfil):
+    total = next(ms for nombre, ms, _ in reversed(perfil.secciones) if nombre == SECCION_TOTAL)
+    with _lock:
+        for nombre, ms, sql_ms in perfil.secciones:
+            _ventanas.setdefault((perfil.pagina, nombre), deque(maxlen=VENTANA)).append((ms, sql_ms))
+        if perfil.profiler is None:
+            return
+        # Solo se guarda si está entre las más lentas de la página; la más rápida guardada sale
+        guardados = _perfiles.setdefault(perfil.pagina, [])
+        if len(guardados) >= MAX_PERFILES_POR_PAGINA and total <= guardados[0][0]:
+            return
+        ruta = os.path.join(DIRECTORIO_PERFILES, f"{perfil.pagina}_{datetime.now():%Y%m%d_%H%M%S_%f}_{total:.0f}ms.prof")
+        os.makedirs(DIRECTORIO_PERFILES, exist_ok=True)
+        perfil.profiler.dump_stats(ruta)
+        heapq.heappush(guardados, (total, ruta))
+        if len(guardados) > MAX_PERFILES_POR_PAGINA:
+            _, descartado = heapq.heappop(guardados)
+            try:
+                os.remove(descartado)
+            except OSError:
+                pass
+
+
+def get_estadisticas():
+    """Una fila por página y sección con las ejecuciones medidas en la ventana y sus
+    percentiles de duración, y la parte promedio que fue SQL."""
+    with _lock:
+        ventanas = {clave: list(valores) for clave, valores in _ventanas.items()}
+    filas = []
+    for (pagina, nombre), valores in sorted(ventanas.items()):
+        tiempos = [ms for ms, _ in valores]
+        total = sum(tiempos)
+        filas.append({
+            "pagina": pagina,
+            "seccion": nombre,
+            "ejecuciones": len(valores),
+            "p50_ms": round(percentil(tiempos, 50), 2),
+            "p95_ms": round(percentil(tiempos, 95), 2),
+            "p99_ms": round(percentil(tiempos, 99), 2),
+            "max_ms": round(max(tiempos), 2),
+            "sql_pct": round(100 * sum(sql for _, sql in valores) / total, 1) if total else 0.0,
+        })
+    return filas
+
+
+def get_perfiles_guardados():
+    """[(pagina, ms, ruta)] de los perfiles cProfile guardados, del más lento al más rápido."""
+    with _lock:
+        perfiles = [(pagina, ms, ruta) for pagina, guardados in _perfiles.items() for ms, ruta in guardados]
+    return sorted(perfiles, key=lambda p: -p[1])
+
+
+def reiniciar():
+    with _lock:
+        _ventanas.clear()
+        _perfiles.clear()
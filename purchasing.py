@@ -0,0 +1,188 @@
+# purchasing.py
+# Lista de compras: punto de reorden y cantidad sugerida de cada producto a partir de su
+# velocidad de venta reciente.
+#
+# La demanda diaria de cada producto (promedio y desviación en la ventana) sale de una sola
+# consulta agrupada sobre el resumen por día y producto (rollups.py), unida al catálogo y al
+# stock; el resto se calcula vectorizado con pandas. El resultado se memoriza por
+# parámetros y versión de datos, así solo se recalcula tras una venta o un cambio de stock.
+#
+#   punto de reorden = venta diaria x días de entrega + stock de seguridad
+#   stock de seguridad = z(nivel de servicio) x desviación diaria x raíz(días de entrega)
+#   cantidad sugerida = punto de reorden + venta diaria x días de cobertura - stock actual
+#
+# La recepción de un pedido (registrar_recepcion) suma todas las cantidades al inventario y
+# guarda la orden de compra, su gasto y sus movimientos de inventario en una sola transacción.
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select, func, insert, text, bindparam, DateTime
+
+from db import (engine, get_version_datos, Productos, Inventario, ResumenProductosDiario, OrdenesCompra,
+                DetalleOrdenCompra, CategoriasGasto, CATEGORIA_GASTO_INVENTARIO, CATEGORIA_GASTO_OTRO)
+from cash import agregar_gasto
+from catalog import get_catalogo
+from inventory import registrar_movimientos, TIPO_REABASTO
+
+ESTADO_BAJO = "⚠️ Stock Bajo"
+ESTADO_SUFICIENTE = "✅ Stock Suficiente"
+
+COLUMNAS_LISTA = ['ID', 'Producto', 'Categoría', 'Stock Actual', 'Venta Diaria', 'Punto de Reorden',
+                  'Cantidad Sugerida', 'Días de Cobertura', 'Estado']
+
+
+@dataclass(frozen=True)
+class ParametrosReorden:
+    ventana_dias: int = 28  # días de ventas para la velocidad, contando hoy
+    dias_entrega: int = 3  # días entre hacer el pedido y tener el producto
+    dias_cobertura: int = 7  # días de venta que debe cubrir cada pedido, además del reorden
+    nivel_servicio: float = 0.95  # probabilidad de no quedarse sin stock durante la entrega
+    stock_minimo: int = 5  # punto de reorden mínimo, también para productos sin ventas
+
+
+def get_demanda(conn, desde, hasta):
+    """Un renglón por producto con su stock y la suma y suma de cuadrados de sus unidades
+    vendidas por día entre dos fechas (inclusive)."""
+    unidades = ResumenProductosDiario.unidades_vendidas
+    vendidos = select(
+        ResumenProductosDiario.id_producto,
+        func.sum(unidades).label('unidades'),
+        func.sum(unidades * unidades).label('cuadrados')
+    ).where(ResumenProductosDiario.fecha >= desde, ResumenProductosDiario.fecha <= hasta
+    ).group_by(ResumenProductosDiario.id_producto).subquery()
+
+    filas = conn.execute(select(
+        Productos.id_producto,
+        Productos.nombre,
+        Productos.categoria,
+        func.coalesce(Inventario.cantidad, 0),
+        func.coalesce(vendidos.c.unidades, 0),
+        func.coalesce(vendidos.c.cuadrados, 0)
+    ).outerjoin(Inventario, Productos.id_producto == Inventario.id_producto
+    ).outerjoin(vendidos, Productos.id_producto == vendidos.c.id_producto)).all()
+    return pd.DataFrame(filas, columns=['id_producto', 'nombre', 'categoria', 'stock', 'unidades', 'cuadrados'])
+
+
+def calcular_reorden(demanda, parametros):
+    """Agrega a `demanda` (ver get_demanda) las columnas de la lista de compras, ordenada
+    de lo más urgente a lo menos: primero los productos bajo su punto de reorden, por días
+    de cobertura."""
+    dias = parametros.ventana_dias
+    # Los días sin ventas cuentan como cero en el promedio y la desviación
+    media = demanda['unidades'].to_numpy(dtype=float) / dias
+    varianza = np.maximum(demanda['cuadrados'].to_numpy(dtype=float) / dias - media ** 2, 0)
+    z = NormalDist().inv_cdf(parametros.nivel_servicio)
+    seguridad = z * np.sqrt(varianza) * np.sqrt(parametros.dias_entrega)
+
+    stock = demanda['stock'].to_numpy(dtype=float)
+    reorden = np.maximum(np.ceil(media * parametros.dias_entrega + seguridad), parametros.stock_minimo)
+    objetivo = reorden + np.ceil(media * parametros.dias_cobertura)
+    bajo = stock <= reorden
+    sugerida = np.where(bajo, np.maximum(objetivo - stock, 0), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cobertura = np.where(media > 0, stock / media, np.nan)
+
+    lista = pd.DataFrame({
+        'ID': demanda['id_producto'],
+        'Producto': demanda['nombre'],
+        'Categoría': demanda['categoria'],
+        'Stock Actual': demanda['stock'].astype('int64'),
+        'Venta Diaria': media.round(2),
+        'Punto de Reorden': reorden.astype('int64'),
+        'Cantidad Sugerida': sugerida.astype('int64'),
+        'Días de Cobertura': cobertura.round(1),
+        'Estado': np.where(bajo, ESTADO_BAJO, ESTADO_SUFICIENTE),
+    })
+    orden = np.lexsort((-media, np.nan_to_num(cobertura, nan=np.inf), ~bajo))
+    return lista.iloc[orden].reset_index(drop=True)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _calcular_lista_compras(hoy, parametros, version_datos):
+    # version_datos solo forma parte de la clave de la caché
+    with engine.connect() as conn:
+        demanda = get_demanda(conn, hoy - timedelta(days=parametros.ventana_dias - 1), hoy)
+    return calcular_reorden(demanda, parametros)
+
+
+def calcular_lista_compras(parametros=ParametrosReorden()):
+    """Lista de compras de todos los productos (DataFrame con COLUMNAS_LISTA)."""
+    return _calcular_lista_compras(date.today(), parametros, get_version_datos())
+
+
+# --- Recepción de órdenes de compra ---
+# Lo recibido llega como un objeto JSON {"id_producto": cantidad}; un solo UPDATE suma todo
+_SUMAR_STOCK = text("""
+    UPDATE inventario SET cantidad = inventario.cantidad + recibido.cantidad, ultima_actualizacion = :ahora
+    FROM (SELECT CAST(key AS INTEGER) AS id_producto, value AS cantidad FROM json_each(:recibido)) AS recibido
+    WHERE inventario.id_producto = recibido.id_producto
+    RETURNING inventario.id_producto
+""").bindparams(bindparam('ahora', type_=DateTime))
+
+
+def _id_categoria_inventario(db):
+    categorias = dict(db.execute(select(CategoriasGasto.nombre, CategoriasGasto.id_categoria).where(
+        CategoriasGasto.nombre.in_([CATEGORIA_GASTO_INVENTARIO, CATEGORIA_GASTO_OTRO])
+    )).all())
+    return categorias.get(CATEGORIA_GASTO_INVENTARIO, categorias.get(CATEGORIA_GASTO_OTRO))
+
+
+def registrar_recepcion(db, lineas, proveedor=None, registrar_gasto=True):
+    """Registra la recepción de una orden de compra y hace commit.
+
+    `lineas` es un diccionario id_producto -> (cantidad, costo_unitario); las líneas sin
+    cantidad se ignoran. En una sola transacción suma las cantidades al inventario con un
+    solo UPDATE (y crea la fila de inventario de los productos que no la tengan), guarda el
+    encabezado y las líneas de la orden y, si `registrar_gasto`, un gasto de categoría
+    Inventario por el total. Devuelve (id_orden, total), o None si no hay nada que recibir;
+    lanza ValueError si algún producto no existe.
+    """
+    lineas = {
+        int(id_producto): (int(cantidad), round(float(costo_unitario), 2))
+        for id_producto, (cantidad, costo_unitario) in lineas.items() if cantidad > 0
+    }
+    if not lineas:
+        return None
+    existentes = set(db.execute(select(Productos.id_producto).where(Productos.id_producto.in_(lineas))).scalars())
+    if len(existentes) < len(lineas):
+        raise ValueError(f"Productos inexistentes: {sorted(set(lineas) - existentes)}")
+    total = round(sum(cantidad * costo_unitario for cantidad, costo_unitario in lineas.values()), 2)
+    ahora = datetime.utcnow()
+
+    try:
+        recibido = json.dumps({str(id_producto): cantidad for id_producto, (cantidad, _) in lineas.items()})
+        actualizados = {id_producto for (id_producto,) in db.execute(_SUMAR_STOCK, {'recibido': recibido, 'ahora': ahora})}
+        sin_inventario = [id_producto for id_producto in lineas if id_producto not in actualizados]
+        if sin_inventario:
+            db.execute(insert(Inventario), [
+                {'id_producto': id_producto, 'cantidad': lineas[id_producto][0], 'ultima_actualizacion': ahora}
+                for id_producto in sin_inventario
+            ])
+
+        orden = OrdenesCompra(fecha=ahora, proveedor=proveedor or None, total=total)
+        db.add(orden)
+        db.flush()  # Obtener el id_orden para las líneas y el gasto
+        id_orden = orden.id_orden
+        registrar_movimientos(db, TIPO_REABASTO, {
+            id_producto: cantidad for id_producto, (cantidad, _) in lineas.items()
+        }, id_orden, ahora)
+        db.execute(insert(DetalleOrdenCompra), [
+            {'id_orden': id_orden, 'id_producto': id_producto, 'cantidad': cantidad, 'costo_unitario': costo_unitario}
+            for id_producto, (cantidad, costo_unitario) in lineas.items()
+        ])
+        if registrar_gasto and total > 0:
+            descripcion = f"Orden de compra #{id_orden}" + (f" ({proveedor})" if proveedor else "")
+            orden.id_gasto = agregar_gasto(db, _id_categoria_inventario(db), descripcion[:100], total)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # El stock cambió: el catálogo compartido se recarga en la próxima lectura
+    get_catalogo().invalidar()
+    return id_orden, total
@@ -0,0 +1,159 @@
+# reports.py
+# Consultas del Dashboard y motor de reportes de ventas para un rango de fechas.
+#
+# Las páginas leen los agregados en memoria que mantiene el hilo de aggregates.py: los
+# rangos cortos se arman sin consultar la base, con el stock del catálogo en caché
+# (catalog.py). Los rangos largos se agregan sobre el historial columnar (sales_history.py).
+# El resultado se memoriza por (inicio, fin, versión de los datos), así cambiar de pestaña
+# o de opciones de visualización no vuelve a calcularlo.
+from dataclasses import dataclass
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select, func
+
+from db import engine, get_version_datos, Productos, Inventario
+from sales_history import get_historial
+from catalog import get_catalogo
+from aggregates import get_instantanea
+
+# Rangos distintos que se mantienen en memoria; se descarta el usado hace más tiempo
+MAX_REPORTES_EN_CACHE = 32
+# Rangos de al menos estos días se calculan sobre el historial columnar
+DIAS_RANGO_LARGO = 90
+
+TIPOS_VENTAS = {
+    'Fecha': 'datetime64[ns]',
+    'Ventas Diarias': 'float64',
+    'Transacciones': 'int64',
+}
+TIPOS_PRODUCTOS = {
+    'Producto': 'object',
+    'Stock_Actual': 'int64',
+    'Cantidad Vendida': 'int64',
+    'Ingresos': 'float64',
+    'Ganancia': 'float64',
+}
+
+
+@dataclass(frozen=True)
+class ReporteVentas:
+    inicio: date
+    fin: date
+    total_ventas: float
+    total_ganancia: float
+    num_transacciones: int
+    # Fecha (datetime64), Ventas Diarias (float64), Transacciones (int64)
+    ventas_diarias: pd.DataFrame
+    # Producto, Cantidad Vendida (int64), Ingresos (float64), Ganancia (float64);
+    # solo productos con ventas en el rango
+    productos: pd.DataFrame
+    # Producto, Stock_Actual (int64), Cantidad Vendida (int64); todos los productos
+    inventario: pd.DataFrame
+
+
+# --- Dashboard ---
+def get_resumen_del_dia(instantanea, dia, limite=5):
+    """(total_ventas, num_transacciones, DataFrame de los más vendidos) del día, de los
+    agregados en memoria; los nombres salen del catálogo en caché."""
+    total_ventas, num_transacciones = instantanea.ventas_del_dia(dia)
+    vendidos = instantanea.mas_vendidos(dia, limite)
+    productos = get_catalogo().obtener_varios([id_producto for id_producto, _ in vendidos])
+    df_mas_vendidos = pd.DataFrame(
+        [(productos[id_producto].nombre, unidades) for id_producto, unidades in vendidos if id_producto in productos],
+        columns=['Producto', 'Cantidad Vendida']
+    )
+    return total_ventas, num_transacciones, df_mas_vendidos
+
+
+# --- Reportes por rango ---
+def get_reporte_historial(conn, start_date, end_date):
+    # Serie diaria y tabla de productos agregando con pandas las líneas del historial
+    # columnar; de SQLite solo se lee el catálogo con stock.
+    lineas = get_historial().lineas_en_rango(start_date, end_date)
+    lineas = lineas.assign(
+        Fecha=pd.to_datetime(lineas['fecha'] // 86400 * 86400, unit='s'),
+        ingresos=lineas['cantidad'] * lineas['precio_unitario'],
+        ganancia=lineas['cantidad'] * (lineas['precio_unitario'] - lineas['costo_unitario']),
+    )
+
+    df_ventas = lineas.groupby('Fecha', as_index=False).agg(**{
+        'Ventas Diarias': ('ingresos', 'sum'),
+        'Transacciones': ('id_venta', 'nunique'),
+    })
+
+    vendidos = lineas.groupby('id_producto').agg(**{
+        'Cantidad Vendida': ('cantidad', 'sum'),
+        'Ingresos': ('ingresos', 'sum'),
+        'Ganancia': ('ganancia', 'sum'),
+    })
+    stock = pd.DataFrame(conn.execute(select(
+        Productos.id_producto,
+        Productos.nombre,
+        func.coalesce(Inventario.cantidad, 0)
+    ).outerjoin(Inventario, Productos.id_producto == Inventario.id_producto)).all(),
+        columns=['id_producto', 'Producto', 'Stock_Actual'])
+    df_productos = stock.join(vendidos, on='id_producto').fillna(0)
+
+    return df_ventas[list(TIPOS_VENTAS)].astype(TIPOS_VENTAS), df_productos[list(TIPOS_PRODUCTOS)].astype(TIPOS_PRODUCTOS)
+
+
+def get_vendidos_agregados(instantanea, start_date, end_date):
+    # Serie diaria y agregado por producto (índice id_producto) de los agregados por día de
+    # la instantánea; no consulta la base
+    dias = instantanea.dias(start_date, end_date)
+    df_ventas = pd.DataFrame(
+        [(pd.Timestamp(dia), *instantanea.ventas[dia]) for dia in dias if dia in instantanea.ventas],
+        columns=list(TIPOS_VENTAS)
+    )
+
+    vendidos = {}
+    for dia in dias:
+        for id_producto, valores in instantanea.productos.get(dia, {}).items():
+            anterior = vendidos.get(id_producto)
+            vendidos[id_producto] = valores if anterior is None else tuple(a + b for a, b in zip(anterior, valores))
+    df_vendidos = pd.DataFrame.from_dict(vendidos, orient='index', columns=['Cantidad Vendida', 'Ingresos', 'Ganancia'])
+    return df_ventas.astype(TIPOS_VENTAS), df_vendidos
+
+
+def _armar_reporte(start_date, end_date, df_ventas, df_todos):
+    df_productos = df_todos.loc[df_todos['Cantidad Vendida'] > 0, ['Producto', 'Cantidad Vendida', 'Ingresos', 'Ganancia']]
+    return ReporteVentas(
+        inicio=start_date,
+        fin=end_date,
+        total_ventas=float(df_ventas['Ventas Diarias'].sum()),
+        total_ganancia=float(df_productos['Ganancia'].sum()),
+        num_transacciones=int(df_ventas['Transacciones'].sum()),
+        ventas_diarias=df_ventas,
+        productos=df_productos.reset_index(drop=True),
+        inventario=df_todos[['Producto', 'Stock_Actual', 'Cantidad Vendida']],
+    )
+
+
+@st.cache_data(max_entries=MAX_REPORTES_EN_CACHE, show_spinner=False)
+def _calcular_reporte(start_date, end_date, version_datos):
+    # version_datos solo forma parte de la clave de la caché
+    with engine.connect() as conn:
+        df_ventas, df_todos = get_reporte_historial(conn, start_date, end_date)
+    return _armar_reporte(start_date, end_date, df_ventas, df_todos)
+
+
+@st.cache_data(max_entries=MAX_REPORTES_EN_CACHE, show_spinner=False)
+def _calcular_vendidos(start_date, end_date, version_instantanea, _instantanea):
+    # La instantánea no se hashea (guion bajo): la identifica su versión
+    return get_vendidos_agregados(_instantanea, start_date, end_date)
+
+
+def calcular_reporte(start_date, end_date):
+    """Todas las métricas de ventas entre dos fechas (inclusive) como un ReporteVentas."""
+    if (end_date - start_date).days + 1 >= DIAS_RANGO_LARGO:
+        return _calcular_reporte(start_date, end_date, get_version_datos())
+    # Lo vendido cambia solo con cada instantánea nueva; el stock, que cambia también con
+    # cada apartado y ajuste, se une después desde el catálogo en caché
+    instantanea = get_instantanea()
+    df_ventas, df_vendidos = _calcular_vendidos(start_date, end_date, instantanea.version, instantanea)
+    stock = pd.DataFrame([(p.id_producto, p.nombre, p.stock) for p in get_catalogo().listar()],
+                         columns=['id_producto', 'Producto', 'Stock_Actual'])
+    df_todos = stock.join(df_vendidos, on='id_producto').fillna(0)
+    return _armar_reporte(start_date, end_date, df_ventas, df_todos[list(TIPOS_PRODUCTOS)].astype(TIPOS_PRODUCTOS))
@@ -0,0 +1,181 @@
+# reservations.py
+# Apartados de stock con vencimiento para los carritos en curso (tabla `reservas_stock`,
+# en el archivo de reservas adjunto a cada conexión; ver db.ESQUEMA_RESERVAS).
+#
+# Agregar un producto al carrito lo aparta por DURACION_RESERVA; el disponible para un
+# carrito es el stock en inventario menos los apartados vigentes de los demás carritos,
+# una suma sobre el índice (id_producto, expira, cantidad). Así dos cajas no pueden llenar
+# sus carritos con las mismas últimas unidades y el conflicto aparece al agregar, no al
+# cobrar, sin bloquear `inventario`. Los apartados vencidos ya no cuentan; un hilo en
+# segundo plano solo los borra para que la tabla no crezca.
+#
+# Cobrar un carrito borra sus apartados en la misma transacción que la venta, pero esa
+# transacción escribe en dos archivos y SQLite no la confirma de forma atómica entre ellos.
+# Si se corta a mitad, la venta puede quedar sin sus apartados borrados (o al revés: los
+# apartados borrados sin venta, que solo obliga a la caja a volver a cobrar). Para lo
+# primero, la venta registra el cobro en db.CarritosCobrados, en la base principal, y el
+# mismo hilo borra los apartados de carritos ya cobrados en su siguiente vuelta.
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import streamlit as st
+from sqlalchemy import DateTime, bindparam, delete, text
+
+from db import SessionLocal, ReservasStock, CarritosCobrados, ESQUEMA_RESERVAS
+
+DURACION_RESERVA = timedelta(minutes=10)
+# Cada cuánto se borran los apartados vencidos
+INTERVALO_LIMPIEZA_SEGUNDOS = 60
+
+# Unidades apartadas por los carritos distintos de :id_carrito para el producto de la
+# columna indicada. Con :id_carrito nulo (una venta sin carrito) cuentan todos los apartados.
+SQL_APARTADO_POR_OTROS = f"""COALESCE((
+    SELECT SUM(r.cantidad) FROM {ESQUEMA_RESERVAS}.reservas_stock AS r
+    WHERE r.id_producto = {{columna}} AND r.expira > :ahora AND r.id_carrito IS NOT :id_carrito
+), 0)"""
+
+# Aparta (o cambia a) :cantidad unidades solo si alcanzan; la comprobación y la escritura
+# son una sola sentencia, así dos carritos no pueden apartar la misma unidad
+_RESERVAR = text(f"""
+    INSERT INTO {ESQUEMA_RESERVAS}.reservas_stock (id_carrito, id_producto, cantidad, expira)
+    SELECT :id_carrito, i.id_producto, :cantidad, :expira
+    FROM inventario AS i
+    WHERE i.id_producto = :id_producto
+      AND i.cantidad - {SQL_APARTADO_POR_OTROS.format(columna='i.id_producto')} >= :cantidad
+    ON CONFLICT (id_carrito, id_producto) DO UPDATE SET cantidad = excluded.cantidad, expira = excluded.expira
+""").bindparams(bindparam('ahora', type_=DateTime), bindparam('expira', type_=DateTime))
+
+_DISPONIBLES = text(f"""
+    SELECT i.id_producto, MAX(i.cantidad - {SQL_APARTADO_POR_OTROS.format(columna='i.id_producto')}, 0)
+    FROM inventario AS i
+    WHERE i.id_producto IN :ids
+""").bindparams(bindparam('ahora', type_=DateTime), bindparam('ids', expanding=True))
+
+
+# Apartados de carritos cobrados que se hicieron antes del cobro
+_LIBERAR_COBRADOS = text(f"""
+    DELETE FROM {ESQUEMA_RESERVAS}.reservas_stock
+    WHERE EXISTS (
+        SELECT 1 FROM main.carritos_cobrados AS c
+        WHERE c.id_carrito = reservas_stock.id_carrito AND reservas_stock.expira <= c.cubre_hasta
+    )
+""")
+
+_REGISTRAR_COBRO = text("""
+    INSERT INTO carritos_cobrados (id_carrito, cubre_hasta) VALUES (:id_carrito, :cubre_hasta)
+    ON CONFLICT (id_carrito) DO UPDATE SET cubre_hasta = excluded.cubre_hasta
+""").bindparams(bindparam('cubre_hasta', type_=DateTime))
+
+
+def nuevo_id_carrito():
+    return uuid.uuid4().hex
+
+
+def get_disponibles(db, ids, id_carrito=None):
+    """Diccionario id_producto -> unidades que `id_carrito` puede llevarse.
+
+    Es el stock en inventario menos lo apartado por los demás carritos; los productos sin
+    fila de inventario no aparecen.
+    """
+    if not ids:
+        return {}
+    return dict(db.execute(_DISPONIBLES, {
+        'ids': list(ids), 'id_carrito': id_carrito, 'ahora': datetime.utcnow()
+    }).all())
+
+
+def _reservar(db, id_carrito, id_producto, cantidad):
+    ahora = datetime.utcnow()
+    return db.execute(_RESERVAR, {
+        'id_carrito': id_carrito,
+        'id_producto': id_producto,
+        'cantidad': cantidad,
+        'ahora': ahora,
+        'expira': ahora + DURACION_RESERVA,
+    }).rowcount == 1
+
+
+def reservar(db, id_carrito, id_producto, cantidad):
+    """Fija en `cantidad` las unidades apartadas del producto y hace commit.
+
+    Devuelve False (sin cambiar el apartado anterior) si no hay tantas disponibles. Con
+    cantidad 0 libera el apartado.
+    """
+    if cantidad <= 0:
+        liberar(db, id_carrito, id_producto)
+        return True
+    reservado = _reservar(db, id_carrito, id_producto, cantidad)
+    db.commit()
+    return reservado
+
+
+def renovar(db, id_carrito, cantidades):
+    """Vuelve a apartar todo el carrito por DURACION_RESERVA y hace commit.
+
+    `cantidades` es un diccionario id_producto -> cantidad. También recupera los apartados
+    que ya vencieron, si el stock todavía alcanza. Devuelve la lista de ids que no se
+    pudieron apartar.
+    """
+    sin_stock = [
+        id_producto for id_producto, cantidad in cantidades.items()
+        if not _reservar(db, id_carrito, id_producto, cantidad)
+    ]
+    db.commit()
+    return sin_stock
+
+
+def liberar(db, id_carrito, id_producto=None):
+    """Libera los apartados del carrito (o solo el de un producto) y hace commit."""
+    stmt = delete(ReservasStock).where(ReservasStock.id_carrito == id_carrito)
+    if id_producto is not None:
+        stmt = stmt.where(ReservasStock.id_producto == id_producto)
+    db.execute(stmt)
+    db.commit()
+
+
+def cerrar_carrito(db, id_carrito, fecha_cobro):
+    """Borra los apartados del carrito y registra su cobro, sin hacer commit: va dentro de
+    la transacción de la venta."""
+    db.execute(delete(ReservasStock).where(ReservasStock.id_carrito == id_carrito))
+    # Solo importan los cobros cuyos apartados anteriores aún no vencen
+    db.execute(delete(CarritosCobrados).where(CarritosCobrados.cubre_hasta <= fecha_cobro))
+    db.execute(_REGISTRAR_COBRO, {'id_carrito': id_carrito, 'cubre_hasta': fecha_cobro + DURACION_RESERVA})
+
+
+def limpiar_vencidas(db):
+    """Borra los apartados vencidos y los de carritos ya cobrados, y hace commit; devuelve
+    cuántos borró."""
+    borrados = db.execute(delete(ReservasStock).where(ReservasStock.expira <= datetime.utcnow())).rowcount
+    borrados += db.execute(_LIBERAR_COBRADOS).rowcount
+    db.commit()
+    return borrados
+
+
+class LimpiezaReservas(threading.Thread):
+    """Hilo que borra los apartados vencidos y los de carritos cobrados cada `intervalo`
+    segundos hasta detener()."""
+    def __init__(self, intervalo=INTERVALO_LIMPIEZA_SEGUNDOS):
+        super().__init__(name="limpieza_reservas", daemon=True)
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                with SessionLocal() as db:
+                    limpiar_vencidas(db)
+            except Exception:
+                # Una base ocupada no debe terminar el hilo; se reintenta en la siguiente vuelta
+                pass
+
+    def detener(self):
+        self._detener.set()
+
+
+@st.cache_resource
+def iniciar_limpieza_reservas():
+    """Arranca una sola vez por proceso el hilo de limpieza de apartados."""
+    hilo = LimpiezaReservas()
+    hilo.start()
+    return hilo
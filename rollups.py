@@ -0,0 +1,212 @@
+# rollups.py
+# Mantenimiento de las tablas de resumen: ventas por día y por día y producto, y flujo de
+# caja (ingresos y gastos por categoría) por día, semana y mes.
+#
+# Uso desde la línea de comandos para regenerarlas a partir del historial:
+#   $ python rollups.py
+#   $ python rollups.py --desde 2024-08-01
+import argparse
+import functools
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, delete, select, distinct, literal, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import (rango_dias, tablas_ventas, Gastos, CategoriasGasto, CATEGORIA_GASTO_OTRO,
+                ResumenVentasDiario, ResumenProductosDiario, ResumenFlujoCaja)
+
+CAMPOS_ACUMULABLES = ('total_ventas', 'num_transacciones', 'unidades_vendidas', 'ganancia')
+CAMPOS_FLUJO = ('monto', 'num_movimientos')
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+TIPO_INGRESO = 'ingreso'
+TIPO_GASTO = 'gasto'
+CATEGORIA_VENTAS = 'Ventas'
+
+# Modificadores de date() de SQLite que llevan una fecha al primer día de su periodo
+_MODIFICADORES_PERIODO = {
+    'dia': (),
+    'semana': ('weekday 0', '-6 days'),  # domingo siguiente (o el mismo) menos 6: lunes
+    'mes': ('start of month',),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _upsert_acumulando(tabla, campos=CAMPOS_ACUMULABLES):
+    # INSERT ... ON CONFLICT DO UPDATE que suma los valores nuevos a los existentes. Se
+    # construye una vez por tabla y las filas se pasan al ejecutar (executemany): con
+    # .values(filas) la sentencia no entra en la caché de compilación de SQLAlchemy y se
+    # recompilaba en cada venta.
+    stmt = sqlite_insert(tabla)
+    return stmt.on_conflict_do_update(
+        index_elements=[c for c in tabla.primary_key.columns],
+        set_={campo: tabla.c[campo] + stmt.excluded[campo] for campo in campos}
+    )
+
+
+def inicio_periodo(fecha, granularidad):
+    """Primer día del periodo (día, semana desde el lunes o mes) que contiene a `fecha`."""
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def registrar_flujo(db, fecha, tipo, categoria, monto):
+    """Suma un ingreso o gasto a los resúmenes de flujo de caja sin hacer commit."""
+    db.execute(_upsert_acumulando(ResumenFlujoCaja.__table__, CAMPOS_FLUJO), [{
+        'granularidad': granularidad,
+        'periodo': inicio_periodo(fecha, granularidad),
+        'tipo': tipo,
+        'categoria': categoria,
+        'monto': float(monto),
+        'num_movimientos': 1,
+    } for granularidad in GRANULARIDADES])
+
+
+def registrar_venta(db, fecha, total_venta, lineas):
+    """Suma una venta a los resúmenes del día sin hacer commit.
+
+    `lineas` es una lista de diccionarios con `id_producto`, `cantidad`,
+    `precio_unitario` y `costo_unitario`. Debe llamarse dentro de la misma
+    transacción que inserta la venta para que los resúmenes nunca queden desfasados.
+    """
+    if not lineas:
+        return
+
+    filas_producto = []
+    unidades_total = 0
+    ganancia_total = 0
+    for linea in lineas:
+        ganancia = linea['cantidad'] * (float(linea['precio_unitario']) - float(linea['costo_unitario']))
+        unidades_total += linea['cantidad']
+        ganancia_total += ganancia
+        filas_producto.append({
+            'fecha': fecha,
+            'id_producto': linea['id_producto'],
+            'total_ventas': linea['cantidad'] * float(linea['precio_unitario']),
+            'num_transacciones': 1,
+            'unidades_vendidas': linea['cantidad'],
+            'ganancia': ganancia,
+        })
+
+    db.execute(_upsert_acumulando(ResumenVentasDiario.__table__), [{
+        'fecha': fecha,
+        'total_ventas': float(total_venta),
+        'num_transacciones': 1,
+        'unidades_vendidas': unidades_total,
+        'ganancia': ganancia_total,
+    }])
+    db.execute(_upsert_acumulando(ResumenProductosDiario.__table__), filas_producto)
+    registrar_flujo(db, fecha, TIPO_INGRESO, CATEGORIA_VENTAS, total_venta)
+
+
+def reconstruir_resumenes(db, desde=None):
+    """Regenera los resúmenes a partir de `ventas` y `detalle_venta` y hace commit.
+
+    Si se indica `desde` (una fecha), solo se recalculan los días a partir de ella. Si el
+    rango empieza antes del corte del archivo histórico, también se leen las archivadas.
+    """
+    ventas, detalle = tablas_ventas(db, desde)
+    fecha_venta = func.date(ventas.c.fecha_venta)
+    filtro = [ventas.c.fecha_venta >= rango_dias(desde)[0]] if desde else []
+
+    borrar_diario = delete(ResumenVentasDiario)
+    borrar_productos = delete(ResumenProductosDiario)
+    if desde:
+        borrar_diario = borrar_diario.where(ResumenVentasDiario.fecha >= desde)
+        borrar_productos = borrar_productos.where(ResumenProductosDiario.fecha >= desde)
+    db.execute(borrar_diario)
+    db.execute(borrar_productos)
+
+    # Un INSERT ... SELECT agrupado por día y producto. Importe y ganancia salen solo de
+    # detalle_venta (costo_unitario guardado en cada línea), leída por su índice cubriente;
+    # de `ventas` solo se toma la fecha.
+    filtro_detalle = list(filtro)
+    if desde:
+        # Rango de id_venta: ninguna venta del periodo tiene un id menor al primero de ellas
+        primera_venta = select(func.min(ventas.c.id_venta)).where(*filtro).scalar_subquery()
+        filtro_detalle.append(detalle.c.id_venta >= primera_venta)
+    por_producto = select(
+        fecha_venta,
+        detalle.c.id_producto,
+        func.sum(detalle.c.cantidad * detalle.c.precio_unitario),
+        func.count(distinct(detalle.c.id_venta)),
+        func.sum(detalle.c.cantidad),
+        func.sum(detalle.c.cantidad * (detalle.c.precio_unitario - func.coalesce(detalle.c.costo_unitario, 0))),
+    ).join(ventas, detalle.c.id_venta == ventas.c.id_venta
+    ).where(*filtro_detalle
+    ).group_by(fecha_venta, detalle.c.id_producto)
+    db.execute(insert(ResumenProductosDiario).from_select(
+        ['fecha', 'id_producto', 'total_ventas', 'num_transacciones', 'unidades_vendidas', 'ganancia'],
+        por_producto
+    ))
+
+    # Totales por día: importe y número de tickets salen de `ventas`,
+    # unidades y ganancia del resumen por producto recién calculado.
+    resumen_producto = ResumenProductosDiario.__table__
+    unidades_dia = select(func.coalesce(func.sum(resumen_producto.c.unidades_vendidas), 0)
+        ).where(resumen_producto.c.fecha == fecha_venta).scalar_subquery()
+    ganancia_dia = select(func.coalesce(func.sum(resumen_producto.c.ganancia), 0)
+        ).where(resumen_producto.c.fecha == fecha_venta).scalar_subquery()
+    por_dia = select(
+        fecha_venta,
+        func.sum(ventas.c.total_venta),
+        func.count(ventas.c.id_venta),
+        unidades_dia,
+        ganancia_dia,
+    ).where(*filtro).group_by(fecha_venta)
+    db.execute(insert(ResumenVentasDiario).from_select(
+        ['fecha', 'total_ventas', 'num_transacciones', 'unidades_vendidas', 'ganancia'],
+        por_dia
+    ))
+    db.commit()
+
+
+def reconstruir_flujo_caja(db, desde=None):
+    """Regenera el resumen de flujo de caja a partir de `ventas` y `gastos` y hace commit.
+
+    Si se indica `desde`, se recalculan los periodos que contienen esa fecha y los siguientes.
+    """
+    for granularidad in GRANULARIDADES:
+        inicio = inicio_periodo(desde, granularidad) if desde else None
+        ventas = tablas_ventas(db, inicio)[0]
+        borrar = delete(ResumenFlujoCaja).where(ResumenFlujoCaja.granularidad == granularidad)
+        filtro_ventas, filtro_gastos = [], []
+        if desde:
+            borrar = borrar.where(ResumenFlujoCaja.periodo >= inicio)
+            filtro_ventas.append(ventas.c.fecha_venta >= rango_dias(inicio)[0])
+            filtro_gastos.append(Gastos.fecha_gasto >= rango_dias(inicio)[0])
+        db.execute(borrar)
+
+        periodo_venta = func.date(ventas.c.fecha_venta, *_MODIFICADORES_PERIODO[granularidad])
+        periodo_gasto = func.date(Gastos.fecha_gasto, *_MODIFICADORES_PERIODO[granularidad])
+        categoria_gasto = func.coalesce(CategoriasGasto.nombre, CATEGORIA_GASTO_OTRO)
+        ingresos = select(
+            literal(granularidad), periodo_venta, literal(TIPO_INGRESO), literal(CATEGORIA_VENTAS),
+            func.sum(ventas.c.total_venta), func.count()
+        ).where(*filtro_ventas).group_by(periodo_venta)
+        gastos = select(
+            literal(granularidad), periodo_gasto, literal(TIPO_GASTO), categoria_gasto,
+            func.sum(Gastos.monto), func.count()
+        ).outerjoin(CategoriasGasto, Gastos.id_categoria == CategoriasGasto.id_categoria
+        ).where(*filtro_gastos).group_by(periodo_gasto, categoria_gasto)
+        db.execute(insert(ResumenFlujoCaja).from_select(
+            ['granularidad', 'periodo', 'tipo', 'categoria', 'monto', 'num_movimientos'],
+            union_all(ingresos, gastos)
+        ))
+    db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye las tablas de resumen de ventas y de flujo de caja.")
+    parser.add_argument("--desde", type=date.fromisoformat, default=None,
+                        help="Fecha (AAAA-MM-DD) a partir de la cual recalcular. Por defecto, todo el historial.")
+    args = parser.parse_args()
+
+    from db import SessionLocal
+    with SessionLocal() as db:
+        reconstruir_resumenes(db, args.desde)
+        reconstruir_flujo_caja(db, args.desde)
+    print("Resúmenes reconstruidos.")
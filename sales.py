@@ -0,0 +1,206 @@
+# sales.py
+# Consultas y escritura de la página de Ventas: catálogo paginado de productos con stock
+# y registro de una venta completa a partir del carrito.
+import json
+import numbers
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import insert, select, literal, func, and_, or_, tuple_, text, bindparam, DateTime
+
+from db import Ventas, DetalleVenta, Productos, Inventario, ResumenProductosDiario, ReservasStock
+from reservations import SQL_APARTADO_POR_OTROS, get_disponibles, cerrar_carrito
+from rollups import registrar_venta
+from catalog import get_catalogo
+from search import subconsulta_ids
+from inventory import registrar_movimientos, TIPO_VENTA
+
+PRODUCTOS_POR_PAGINA = 20
+# Días de ventas que cuentan para ordenar por popularidad
+VENTANA_POPULARIDAD_DIAS = 30
+ORDEN_NOMBRE = "Nombre"
+ORDEN_POPULARIDAD = "Popularidad"
+
+
+def get_productos_disponibles(db, busqueda="", categoria=None, orden=ORDEN_NOMBRE, cursor=None, limite=PRODUCTOS_POR_PAGINA,
+                              id_carrito=None):
+    """Una página de productos con stock, filtrada y ordenada en SQL.
+
+    La paginación es por clave: `cursor` es la clave de orden del último producto de la
+    página anterior (o None para la primera). Devuelve (productos, cursor_siguiente), con
+    cursor_siguiente en None si no hay más páginas. Cada producto trae `stock` (en
+    inventario) y `disponible` (sin lo apartado por carritos distintos de `id_carrito`).
+    """
+    por_popularidad = orden == ORDEN_POPULARIDAD
+    if por_popularidad:
+        # Unidades vendidas en los últimos días, desde el resumen por día y producto
+        desde = date.today() - timedelta(days=VENTANA_POPULARIDAD_DIAS)
+        ventas_recientes = select(
+            ResumenProductosDiario.id_producto,
+            func.sum(ResumenProductosDiario.unidades_vendidas).label('unidades')
+        ).where(ResumenProductosDiario.fecha >= desde
+        ).group_by(ResumenProductosDiario.id_producto).subquery()
+        popularidad = func.coalesce(ventas_recientes.c.unidades, 0)
+    else:
+        popularidad = literal(0)
+
+    condiciones_apartado = [ReservasStock.id_producto == Productos.id_producto, ReservasStock.expira > datetime.utcnow()]
+    if id_carrito is not None:
+        condiciones_apartado.append(ReservasStock.id_carrito != id_carrito)
+    apartado = select(func.coalesce(func.sum(ReservasStock.cantidad), 0)).where(*condiciones_apartado).scalar_subquery()
+
+    stmt = select(
+        Productos.id_producto,
+        Productos.nombre,
+        Productos.precio_venta,
+        Inventario.cantidad.label('stock'),
+        func.max(Inventario.cantidad - apartado, 0).label('disponible'),
+        popularidad.label('popularidad')
+    ).join(Inventario, Productos.id_producto == Inventario.id_producto
+    ).where(Inventario.cantidad > 0)
+    coincidencias = subconsulta_ids(busqueda)
+    if coincidencias is not None:
+        stmt = stmt.where(Productos.id_producto.in_(coincidencias))
+    if categoria:
+        stmt = stmt.where(Productos.categoria == categoria)
+
+    if por_popularidad:
+        stmt = stmt.outerjoin(ventas_recientes, Productos.id_producto == ventas_recientes.c.id_producto)
+        if cursor:
+            stmt = stmt.where(or_(popularidad < cursor[0], and_(popularidad == cursor[0], Productos.id_producto > cursor[1])))
+        stmt = stmt.order_by(popularidad.desc(), Productos.id_producto)
+    else:
+        # SQLite recorre el índice de nombre y se detiene al llenar la página
+        if cursor:
+            stmt = stmt.where(tuple_(Productos.nombre, Productos.id_producto) > tuple_(*cursor))
+        stmt = stmt.order_by(Productos.nombre, Productos.id_producto)
+
+    productos = db.execute(stmt.limit(limite + 1)).all()
+    if len(productos) <= limite:
+        return productos, None
+    productos = productos[:limite]
+    ultimo = productos[-1]
+    clave = (ultimo.popularidad, ultimo.id_producto) if por_popularidad else (ultimo.nombre, ultimo.id_producto)
+    return productos, clave
+
+
+def get_categorias(db):
+    return [c for (c,) in db.query(Productos.categoria).filter(Productos.categoria.isnot(None)).distinct().order_by(Productos.categoria)]
+
+
+class StockInsuficienteError(Exception):
+    """Una o más líneas del carrito piden más unidades de las que hay en inventario.
+
+    `faltantes` es una lista de diccionarios con `id_producto`, `nombre`,
+    `solicitado` y `disponible`, uno por cada línea rechazada.
+    """
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__("Stock insuficiente para: " + ", ".join(f['nombre'] for f in faltantes))
+
+
+# El carrito llega como un objeto JSON {"id_producto": cantidad}; la sentencia es siempre la
+# misma, así SQLAlchemy y SQLite la preparan una sola vez. Las unidades apartadas por otros
+# carritos (reservations.py) no se pueden vender.
+_DESCONTAR_STOCK = text(f"""
+    UPDATE inventario SET cantidad = inventario.cantidad - carrito.cantidad
+    FROM (SELECT CAST(key AS INTEGER) AS id_producto, value AS cantidad FROM json_each(:carrito)) AS carrito
+    WHERE inventario.id_producto = carrito.id_producto
+      AND inventario.cantidad - {SQL_APARTADO_POR_OTROS.format(columna='carrito.id_producto')} >= carrito.cantidad
+    RETURNING inventario.id_producto
+""").bindparams(bindparam('ahora', type_=DateTime))
+
+
+def _validar_cantidades(cantidades):
+    # Una cantidad cero o negativa sumaría stock en vez de descontarlo, y una fraccionaria
+    # se truncaría al pasarla al UPDATE: se rechazan antes de tocar la base.
+    for producto_id, cantidad in cantidades.items():
+        if isinstance(cantidad, bool) or not isinstance(cantidad, numbers.Integral) or cantidad <= 0:
+            raise ValueError(f"La cantidad del producto {producto_id} debe ser un entero mayor que cero: {cantidad!r}")
+
+
+def descontar_stock(db, cantidades, id_carrito=None):
+    """Descuenta el carrito completo con un único UPDATE condicional.
+
+    `cantidades` es un diccionario id_producto -> cantidad. Solo se actualizan las filas con
+    `cantidad - apartado por otros carritos >= pedido`, así dos cajas no pueden vender la
+    misma última unidad. Devuelve el conjunto de ids descontados; quien llama debe hacer
+    rollback si falta alguno. Lanza ValueError si alguna cantidad no es un entero positivo.
+    """
+    _validar_cantidades(cantidades)
+    carrito = json.dumps({str(id_producto): int(cantidad) for id_producto, cantidad in cantidades.items()})
+    return {id_producto for (id_producto,) in db.execute(_DESCONTAR_STOCK, {
+        'carrito': carrito, 'id_carrito': id_carrito, 'ahora': datetime.utcnow()
+    })}
+
+
+def registrar_carrito(db, carrito, id_carrito=None):
+    """Registra la venta del carrito y hace commit; devuelve (id_venta, total_venta).
+
+    `carrito` es un diccionario id_producto -> {'nombre', 'precio_venta', 'cantidad'}. Si
+    alguna línea no tiene stock suficiente hace rollback y lanza StockInsuficienteError;
+    ante cualquier otro error también hace rollback antes de propagarlo. Los apartados de
+    `id_carrito` cuentan como propios y se liberan con la venta. Una cantidad que no sea un
+    entero positivo lanza ValueError antes de cualquier consulta.
+    """
+    cantidades = {producto_id: item['cantidad'] for producto_id, item in carrito.items()}
+    _validar_cantidades(cantidades)
+
+    # Lecturas previas fuera de la transacción de escritura: precios de compra, que se
+    # guardan como costo de cada detalle, desde la caché del catálogo.
+    costos = {
+        producto_id: producto.precio_compra
+        for producto_id, producto in get_catalogo().obtener_varios(list(cantidades)).items()
+    }
+    total_venta = sum(item['precio_venta'] * item['cantidad'] for item in carrito.values())
+    fecha_venta = datetime.utcnow()
+
+    # Transacción de escritura corta: stock, venta, detalles, movimientos de inventario y
+    # resúmenes, y commit
+    try:
+        descontados = descontar_stock(db, cantidades, id_carrito)
+        if len(descontados) < len(cantidades):
+            db.rollback()
+            rechazados = [producto_id for producto_id in cantidades if producto_id not in descontados]
+            stock_actual = get_disponibles(db, rechazados, id_carrito)
+            raise StockInsuficienteError([{
+                'id_producto': producto_id,
+                'nombre': carrito[producto_id]['nombre'],
+                'solicitado': cantidades[producto_id],
+                'disponible': stock_actual.get(producto_id, 0)
+            } for producto_id in rechazados])
+
+        if id_carrito is not None:
+            cerrar_carrito(db, id_carrito, fecha_venta)
+
+        nueva_venta = Ventas(total_venta=total_venta, fecha_venta=fecha_venta)
+        db.add(nueva_venta)
+        db.flush()  # Obtener el id_venta antes de commitear
+        id_venta = nueva_venta.id_venta
+        registrar_movimientos(db, TIPO_VENTA, {
+            producto_id: -cantidad for producto_id, cantidad in cantidades.items()
+        }, id_venta, fecha_venta)
+
+        # Todos los detalles en un solo INSERT de varias filas
+        db.execute(insert(DetalleVenta), [{
+            'id_venta': id_venta,
+            'id_producto': producto_id,
+            'cantidad': item['cantidad'],
+            'precio_unitario': item['precio_venta'],
+            'costo_unitario': costos.get(producto_id, 0)
+        } for producto_id, item in carrito.items()])
+
+        # Actualiza los resúmenes diarios en la misma transacción
+        registrar_venta(db, fecha_venta.date(), total_venta, [{
+            'id_producto': producto_id,
+            'cantidad': item['cantidad'],
+            'precio_unitario': item['precio_venta'],
+            'costo_unitario': costos.get(producto_id, 0)
+        } for producto_id, item in carrito.items()])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # El stock cambió: el catálogo compartido se recarga en la próxima lectura
+    get_catalogo().invalidar()
+    return id_venta, total_venta
@@ -0,0 +1,258 @@
+# sales_history.py
+# Copia columnar, solo de anexado, de las líneas de venta (detalle_venta + ventas) para
+# reportes de rangos largos.
+#
+# Cada columna es un archivo binario de NumPy (.bin) en `data/historial_ventas/` y un JSON
+# guarda cuántas filas son válidas y el último id_detalle copiado. La copia se extiende
+# desde ese id y se lee con np.memmap, sin copiar los datos a memoria; así los reportes de
+# todo un ciclo escolar se agregan con NumPy/pandas sin cargar SQLite. Un rango de fechas
+# se ubica con búsqueda binaria y se lee como un tramo contiguo de los archivos. Incluye las líneas
+# movidas al archivo histórico (archive.py): la copia se hizo antes de moverlas y, si hay
+# que reconstruirla, se leen a través del archivo.
+import itertools
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from db import engine, db_path, get_version_datos, get_limites_archivo, consultas_ventas
+
+DIRECTORIO_HISTORIAL = os.path.join(os.path.dirname(db_path), "historial_ventas")
+ARCHIVO_METADATOS = "metadatos.json"
+
+# Columnas en el orden de la consulta de extracción y su tipo en disco.
+# fecha: segundos desde 1970 de fecha_venta, en la misma hora local (naive) que guarda la base.
+COLUMNAS = {
+    "id_detalle": np.int64,
+    "id_venta": np.int64,
+    "fecha": np.int64,
+    "id_producto": np.int32,
+    "cantidad": np.int32,
+    "precio_unitario": np.float64,
+    "costo_unitario": np.float64,
+}
+
+# Máximo acumulado de `fecha` hasta cada fila: las fechas van casi en orden de id (se toman
+# antes de confirmar la venta), y sobre este máximo, que nunca baja, se busca por rango
+FECHA_MAXIMA = "fecha_max"
+ARCHIVOS = {**COLUMNAS, FECHA_MAXIMA: np.int64}
+
+# Filas leídas de SQLite por lote al extender la copia
+TAMANO_LOTE = 50000
+
+_CONSULTA_NUEVAS, _CONSULTA_NUEVAS_CON_ARCHIVO = consultas_ventas("""
+    SELECT d.id_detalle, d.id_venta, COALESCE(CAST(strftime('%s', v.fecha_venta) AS INTEGER), 0),
+           d.id_producto, COALESCE(d.cantidad, 0), COALESCE(d.precio_unitario, 0),
+           COALESCE(d.costo_unitario, 0)
+    FROM {detalle_venta} AS d
+    LEFT JOIN {ventas} AS v ON v.id_venta = d.id_venta
+    WHERE d.id_detalle > :ultimo
+    ORDER BY d.id_detalle
+""")
+
+_CONTAR_COPIADAS, _CONTAR_COPIADAS_CON_ARCHIVO = consultas_ventas(
+    "SELECT COUNT(*) FROM {detalle_venta} WHERE id_detalle <= :ultimo"
+)
+
+# La última línea copiada, por llave primaria
+_ULTIMA_COPIADA, _ULTIMA_COPIADA_CON_ARCHIVO = consultas_ventas(
+    "SELECT id_venta, COALESCE(cantidad, 0) FROM {detalle_venta} WHERE id_detalle = :ultimo"
+)
+
+
+def _metadatos_vacios():
+    # desorden: cuántos segundos queda, como mucho, la fecha de una línea por debajo de la
+    # fecha máxima anterior a ella; sin_fecha: líneas de ventas sin fecha (fecha 0)
+    return {"columnas": list(ARCHIVOS), "filas": 0, "ultimo_id_detalle": 0,
+            "fecha_max": 0, "desorden": 0, "sin_fecha": 0}
+
+
+class HistorialVentas:
+    def __init__(self, directorio=DIRECTORIO_HISTORIAL):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._version = None
+        self._columnas = None
+        # El conteo completo contra SQLite se hace una vez al abrir; después basta revisar
+        # la última línea copiada
+        self._comprobado = False
+        os.makedirs(directorio, exist_ok=True)
+        self._metadatos = self._leer_metadatos()
+        self._recortar()
+
+    # --- Archivos ---
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def _leer_metadatos(self):
+        try:
+            with open(self._ruta(ARCHIVO_METADATOS), encoding="utf-8") as archivo:
+                metadatos = json.load(archivo)
+            if set(metadatos.get("columnas", [])) == set(ARCHIVOS):
+                return metadatos
+        except (OSError, ValueError):
+            pass
+        return _metadatos_vacios()
+
+    def _escribir_metadatos(self):
+        # Se escriben al final de cada anexado y se reemplazan de forma atómica: si el proceso
+        # se detiene a mitad de un lote, las filas de más se descartan al abrir (_recortar).
+        temporal = self._ruta(ARCHIVO_METADATOS + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(self._metadatos, archivo)
+        os.replace(temporal, self._ruta(ARCHIVO_METADATOS))
+
+    def _recortar(self):
+        filas = self._metadatos["filas"]
+        for nombre, tipo in ARCHIVOS.items():
+            ruta = self._ruta(f"{nombre}.bin")
+            tamano = filas * np.dtype(tipo).itemsize
+            if not os.path.exists(ruta) or os.path.getsize(ruta) < tamano:
+                # Falta información: se vuelve a copiar todo
+                self._reiniciar_archivos()
+                return
+            if os.path.getsize(ruta) > tamano:
+                os.truncate(ruta, tamano)
+
+    def _reiniciar_archivos(self):
+        # Archivos nuevos en lugar de truncar: los np.memmap ya abiertos siguen siendo válidos
+        for nombre in ARCHIVOS:
+            temporal = self._ruta(f"{nombre}.bin.tmp")
+            open(temporal, "wb").close()
+            os.replace(temporal, self._ruta(f"{nombre}.bin"))
+        self._metadatos = _metadatos_vacios()
+        self._escribir_metadatos()
+        self._columnas = None
+        self._comprobado = True
+
+    # --- Sincronización con SQLite ---
+    def _es_consistente(self, conn):
+        # Si se borraron o reemplazaron líneas ya copiadas, el conteo deja de coincidir. Las
+        # archivadas, si ya se copiaron todas, se cuentan con los totales de sus tandas.
+        ultimo = self._metadatos["ultimo_id_detalle"]
+        archivo = get_limites_archivo(conn)
+        if ultimo >= archivo.ultimo_id_detalle:
+            copiadas = archivo.lineas + conn.execute(_CONTAR_COPIADAS, {"ultimo": ultimo}).scalar()
+        else:
+            copiadas = conn.execute(_CONTAR_COPIADAS_CON_ARCHIVO, {"ultimo": ultimo}).scalar()
+        return copiadas == self._metadatos["filas"]
+
+    def _ultima_coincide(self, conn):
+        # Revisión de cada sincronización: la última línea copiada sigue en la base igual
+        # (una importación o un borrado la reemplazan). Una consulta por llave primaria.
+        ultimo = self._metadatos["ultimo_id_detalle"]
+        if not ultimo:
+            return True
+        consulta = _ULTIMA_COPIADA_CON_ARCHIVO if ultimo <= get_limites_archivo(conn).ultimo_id_detalle else _ULTIMA_COPIADA
+        fila = conn.execute(consulta, {"ultimo": ultimo}).first()
+        columnas = self._leer_columnas()
+        return fila is not None and tuple(fila) == (int(columnas["id_venta"][-1]), int(columnas["cantidad"][-1]))
+
+    def _anexar(self, conn):
+        ultimo = self._metadatos["ultimo_id_detalle"]
+        # Solo al copiar desde antes del corte (al reconstruir) se lee el archivo histórico
+        consulta = _CONSULTA_NUEVAS_CON_ARCHIVO if ultimo < get_limites_archivo(conn).ultimo_id_detalle else _CONSULTA_NUEVAS
+        resultado = conn.execute(consulta, {"ultimo": ultimo})
+        nuevas = 0
+        for lote in resultado.partitions(TAMANO_LOTE):
+            # fromiter sobre las filas aplanadas es mucho más rápido que np.array(lista de tuplas)
+            valores = np.fromiter(
+                itertools.chain.from_iterable(lote), dtype=np.float64, count=len(lote) * len(COLUMNAS)
+            ).reshape(-1, len(COLUMNAS))
+            fechas = valores[:, 2].astype(np.int64)
+            fecha_max = np.maximum.accumulate(np.maximum(fechas, self._metadatos["fecha_max"]))
+            con_fecha = fechas > 0
+            if con_fecha.any():
+                atraso = int((fecha_max - fechas)[con_fecha].max())
+                self._metadatos["desorden"] = max(self._metadatos["desorden"], atraso)
+            self._metadatos["sin_fecha"] += int((~con_fecha).sum())
+            self._metadatos["fecha_max"] = int(fecha_max[-1])
+            for i, (nombre, tipo) in enumerate(COLUMNAS.items()):
+                with open(self._ruta(f"{nombre}.bin"), "ab") as archivo:
+                    archivo.write(valores[:, i].astype(tipo).tobytes())
+            with open(self._ruta(f"{FECHA_MAXIMA}.bin"), "ab") as archivo:
+                archivo.write(fecha_max.tobytes())
+            self._metadatos["filas"] += len(lote)
+            self._metadatos["ultimo_id_detalle"] = int(valores[-1, 0])
+            self._escribir_metadatos()
+            nuevas += len(lote)
+        return nuevas
+
+    def sincronizar(self):
+        """Copia las líneas de venta nuevas; devuelve cuántas se agregaron.
+
+        Solo consulta la base si cambió su versión de datos desde la última sincronización.
+        """
+        with self._lock:
+            version = get_version_datos()
+            if version == self._version:
+                return 0
+            with engine.connect() as conn:
+                consistente = self._ultima_coincide(conn) if self._comprobado else self._es_consistente(conn)
+                self._comprobado = True
+                if not consistente:
+                    self._reiniciar_archivos()
+                nuevas = self._anexar(conn)
+            if nuevas:
+                self._columnas = None
+            self._version = version
+            return nuevas
+
+    def reiniciar(self):
+        """Descarta la copia; la siguiente sincronización la reconstruye desde cero.
+
+        Usar después de reemplazar las ventas (por ejemplo, al importar un ZIP).
+        """
+        with self._lock:
+            self._reiniciar_archivos()
+            self._version = None
+
+    # --- Lectura ---
+    def _leer_columnas(self):
+        # Con el lock tomado: nombre -> np.memmap de solo lectura de cada archivo
+        if self._columnas is None:
+            filas = self._metadatos["filas"]
+            self._columnas = {
+                nombre: (np.memmap(self._ruta(f"{nombre}.bin"), dtype=tipo, mode="r", shape=(filas,))
+                         if filas else np.empty(0, dtype=tipo))
+                for nombre, tipo in ARCHIVOS.items()
+            }
+        return self._columnas
+
+    def columnas(self):
+        """Diccionario nombre -> np.memmap de solo lectura con todas las filas copiadas."""
+        with self._lock:
+            leidas = self._leer_columnas()
+            return {nombre: leidas[nombre] for nombre in COLUMNAS}
+
+    def lineas_en_rango(self, inicio, fin):
+        """DataFrame con las líneas de venta entre dos fechas (inclusive), ya sincronizado.
+
+        Solo lee el tramo de los archivos que puede contener el rango.
+        """
+        self.sincronizar()
+        with self._lock:
+            columnas = self._leer_columnas()
+            desorden, sin_fecha = self._metadatos["desorden"], self._metadatos["sin_fecha"]
+        # Timestamp sin zona horaria: timestamp() lo toma como UTC, igual que strftime('%s')
+        desde = int(pd.Timestamp(inicio).timestamp())
+        hasta = int((pd.Timestamp(fin) + pd.Timedelta(days=1)).timestamp())
+        # Una línea con fecha en el rango tiene fecha máxima desde `desde` y por debajo de
+        # `hasta` más el desorden; el tramo entre esas dos posiciones es una vista sin copia
+        fecha_max = columnas[FECHA_MAXIMA]
+        primera = np.searchsorted(fecha_max, desde, side="left")
+        ultima = np.searchsorted(fecha_max, hasta + desorden, side="left")
+        tramo = {nombre: columnas[nombre][primera:ultima] for nombre in COLUMNAS}
+        if desorden or sin_fecha:
+            # Fechas fuera de orden o sin fecha: se filtra solo dentro del tramo
+            en_rango = (tramo["fecha"] >= desde) & (tramo["fecha"] < hasta)
+            tramo = {nombre: valores[en_rango] for nombre, valores in tramo.items()}
+        return pd.DataFrame(tramo, copy=False)
+
+
+@st.cache_resource
+def get_historial():
+    """Historial columnar compartido por todo el proceso."""
+    return HistorialVentas()
@@ -0,0 +1,49 @@
+# search.py
+# Búsqueda de productos por nombre y descripción sobre el índice FTS5 `productos_fts`
+# (ver la migración _migracion_busqueda_productos en db.py).
+import re
+
+from sqlalchemy import Integer, column, text
+
+# Peso de cada columna del índice para el orden por relevancia (bm25): nombre, descripción
+PESOS_BM25 = (10.0, 1.0)
+
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el usuario en una consulta FTS5, o None si no hay palabras.
+
+    Cada palabra se busca como prefijo ("choco" encuentra "Chocolate") y todas deben
+    aparecer. Las comillas y operadores del usuario se descartan, así cualquier texto es
+    una consulta válida. Los acentos los ignora el propio índice.
+    """
+    palabras = _PALABRA.findall(texto or "")
+    if not palabras:
+        return None
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def subconsulta_ids(texto):
+    """SELECT de los ids que coinciden con `texto`, para usar en `columna.in_(...)`.
+
+    Devuelve None si el texto no tiene palabras que buscar.
+    """
+    consulta = consulta_fts(texto)
+    if consulta is None:
+        return None
+    return text(
+        "SELECT rowid FROM productos_fts WHERE productos_fts MATCH :consulta"
+    ).bindparams(consulta=consulta).columns(column("rowid", Integer))
+
+
+def buscar_productos(db, texto, limite=50):
+    """Ids de los productos que coinciden con `texto`, del más al menos relevante."""
+    consulta = consulta_fts(texto)
+    if consulta is None:
+        return []
+    filas = db.execute(text(
+        "SELECT rowid FROM productos_fts WHERE productos_fts MATCH :consulta "
+        f"ORDER BY bm25(productos_fts, {PESOS_BM25[0]}, {PESOS_BM25[1]}) LIMIT :limite"
+    ), {"consulta": consulta, "limite": limite})
+    return [id_producto for (id_producto,) in filas]
@@ -1,4 +1,5 @@
 import streamlit as st
+from db import get_estadisticas_pool
 
 st.set_page_config(
     page_title="Tienda Escolar",
@@ -9,3 +10,15 @@ st.set_page_config(
 st.title("Sistema de Gestión para la Tienda Escolar 🏫")
 st.markdown("Bienvenido al sistema de control de tu tienda de snacks saludables. Usa el menú de la izquierda para navegar por las diferentes secciones.")
 # La navegación se maneja automáticamente por Streamlit al colocar los archivos en la carpeta 'pages'.
+
+# Estado de la conexión compartida a la base de datos
+with st.expander("Estado de la base de datos"):
+    estadisticas = get_estadisticas_pool()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Conexiones en uso", estadisticas["conexiones_en_uso"])
+    with col2:
+        st.metric("Conexiones libres", estadisticas["conexiones_libres"])
+    with col3:
+        st.metric("Errores por bloqueo", estadisticas["errores_por_bloqueo"])
+    st.json(estadisticas)
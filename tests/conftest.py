@@ -0,0 +1,37 @@
+# Las pruebas nunca abren data/tienda_escolar.db: db.py crea su motor al importarse, así
+# que la ruta de la base se fija antes de importar cualquier módulo de la app.
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+os.environ["TIENDA_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="tienda_pruebas_"), "tienda.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def planes():
+    """Función que hace `llamada()` y devuelve, por cada sentencia que la app mandó a la
+    base (salvo las de varias filas), (sentencia, pasos del EXPLAIN QUERY PLAN) con los
+    mismos parámetros."""
+    from db import engine
+
+    def planes_de(llamada):
+        enviadas = []
+
+        def capturar(conn, cursor, sentencia, parametros, contexto, varias):
+            if not varias and sentencia.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "DELETE", "UPDATE")):
+                enviadas.append((sentencia, parametros))
+
+        event.listen(engine, "before_cursor_execute", capturar)
+        try:
+            llamada()
+        finally:
+            event.remove(engine, "before_cursor_execute", capturar)
+        with engine.connect() as conn:
+            return [(sentencia, [fila[-1] for fila in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sentencia}", parametros)])
+                    for sentencia, parametros in enviadas]
+
+    return planes_de
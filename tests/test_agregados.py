@@ -0,0 +1,108 @@
+# Hilo de agregados: suma las ventas y gastos nuevos en una instantánea nueva sin tocar la
+# publicada, da los mismos montos que los resúmenes de flujo de caja y, al reiniciar, usa
+# lo guardado si sigue coincidiendo con la base o lo reconstruye si no.
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+import cash
+import sales
+from aggregates import AgregadorReportes
+from cash import get_categorias_gasto, registrar_gasto, get_flujo_caja, get_totales_flujo
+from db import engine, SessionLocal, Productos, Inventario
+
+LUNES = date(2025, 2, 3)
+
+
+class _Reloj(datetime):
+    ahora = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.ahora
+
+
+@pytest.fixture
+def producto(monkeypatch):
+    for modulo in (cash, sales):
+        monkeypatch.setattr(modulo, "datetime", _Reloj)
+    with SessionLocal() as db:
+        producto = Productos(nombre="Carpeta de agregados", precio_compra=4, precio_venta=10)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=50))
+        db.commit()
+        yield producto.id_producto
+
+
+@pytest.fixture
+def agregador(tmp_path):
+    hilos = []
+
+    def iniciar():
+        hilo = AgregadorReportes(intervalo=0.05, archivo=str(tmp_path / "agregados.pkl"))
+        hilo.start()
+        assert hilo.esperar_revision(5)
+        hilos.append(hilo)
+        return hilo
+
+    yield iniciar
+    for hilo in hilos:
+        hilo.detener()
+
+
+def _vender(db, momento, producto, cantidad):
+    _Reloj.ahora = momento
+    sales.registrar_carrito(db, {producto: {'nombre': "Carpeta", 'precio_venta': 10, 'cantidad': cantidad}})
+
+
+def test_agregados_siguen_a_la_base(producto, agregador):
+    hilo = agregador()
+    anterior = hilo.instantanea
+    assert anterior.ventas_del_dia(LUNES) == (None, 0)
+
+    with SessionLocal() as db:
+        _vender(db, datetime(2025, 2, 3, 9), producto, 2)
+        _vender(db, datetime(2025, 2, 3, 17), producto, 1)
+        _vender(db, datetime(2025, 2, 5, 12), producto, 4)
+        _Reloj.ahora = datetime(2025, 2, 4, 8)
+        registrar_gasto(db, dict((n, i) for i, n in get_categorias_gasto(db))["Renta Diaria"], "Renta", 12.5)
+    # La primera espera puede terminar con una revisión que empezó antes de los commits
+    assert hilo.esperar_revision(5) and hilo.esperar_revision(5)
+
+    instantanea = hilo.instantanea
+    assert instantanea.version > anterior.version
+    assert anterior.ventas_del_dia(LUNES) == (None, 0)  # la publicada no cambia
+    assert instantanea.ventas_del_dia(LUNES) == (30.0, 2)
+    assert instantanea.mas_vendidos(LUNES) == [(producto, 3)]
+    domingo = date(2025, 2, 9)
+    assert instantanea.totales_flujo(LUNES, domingo) == (70.0, 12.5)
+    with SessionLocal() as db:
+        assert instantanea.totales_flujo(LUNES, domingo) == get_totales_flujo(db, LUNES, domingo)
+        for granularidad in ('dia', 'semana', 'mes'):
+            assert (sorted(instantanea.flujo_caja(LUNES, domingo, granularidad))
+                    == sorted(get_flujo_caja(db, LUNES, domingo, granularidad)))
+
+
+def test_reinicio_usa_lo_guardado_si_coincide(producto, agregador):
+    with SessionLocal() as db:
+        _vender(db, datetime(2025, 3, 3, 10), producto, 1)
+    hilo = agregador()
+    guardada = hilo.instantanea
+    hilo.detener()
+
+    # Sin cambios en la base se publica lo guardado, sin volver a sumar
+    hilo = agregador()
+    assert hilo.instantanea.generada == guardada.generada
+    hilo.detener()
+    dia = date(2025, 3, 3)
+    assert guardada.ventas_del_dia(dia) == (10.0, 1)
+
+    # Una venta ya sumada cambió: lo guardado se descarta y se reconstruye
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE ventas SET total_venta = 11 WHERE id_venta = :id"),
+                     {"id": guardada.ultimo_id_venta})
+    ultimo = agregador()
+    assert ultimo.instantanea.ventas_del_dia(dia) == (11.0, 1)
+    assert ultimo.instantanea.generada > guardada.generada
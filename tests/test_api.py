@@ -0,0 +1,89 @@
+# Servicio HTTP/JSON sobre la base temporal de las pruebas, en un puerto libre y sin red.
+import http.client
+import json
+import threading
+
+import pytest
+
+from db import SessionLocal, Productos, Inventario
+from api import ServidorAPI
+
+
+@pytest.fixture(scope="module")
+def puerto():
+    servidor = ServidorAPI(("127.0.0.1", 0), hilos=2)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor.server_address[1]
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def producto():
+    with SessionLocal() as db:
+        producto = Productos(nombre="Calculadora de la API", precio_compra=80, precio_venta=120.5)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=4))
+        db.commit()
+        return producto.id_producto
+
+
+def solicitar(puerto, metodo, ruta, cuerpo=None):
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+    try:
+        conexion.request(metodo, ruta, json.dumps(cuerpo) if cuerpo is not None else None,
+                         {"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        return respuesta.status, json.loads(respuesta.read())
+    finally:
+        conexion.close()
+
+
+def test_productos(puerto, producto):
+    estado, pagina = solicitar(puerto, "GET", "/productos?busqueda=calculadora")
+    assert estado == 200
+    encontrado = {p["id_producto"]: p for p in pagina["productos"]}[producto]
+    assert (encontrado["stock"], encontrado["disponible"], encontrado["precio_venta"]) == (4, 4, 120.5)
+    assert solicitar(puerto, "GET", f"/productos/{producto}")[1]["stock"] == 4
+    assert solicitar(puerto, "GET", "/productos/999999")[0] == 404
+
+
+def test_reserva_y_stock(puerto, producto):
+    estado, reserva = solicitar(puerto, "POST", "/reservas", {"id_producto": producto, "cantidad": 3})
+    assert estado == 200
+    id_carrito = reserva["id_carrito"]
+    # Lo apartado no está disponible para otros carritos, sí para el propio
+    assert solicitar(puerto, "GET", f"/stock?ids={producto}")[1]["stock"][str(producto)] == {"stock": 4, "disponible": 1}
+    assert solicitar(puerto, "GET", f"/stock?ids={producto}&id_carrito={id_carrito}")[1]["stock"][str(producto)]["disponible"] == 4
+    estado, conflicto = solicitar(puerto, "POST", "/reservas", {"id_producto": producto, "cantidad": 2})
+    assert (estado, conflicto["disponible"]) == (409, 1)
+    assert solicitar(puerto, "DELETE", f"/reservas/{id_carrito}")[0] == 200
+    assert solicitar(puerto, "GET", f"/stock?ids={producto}")[1]["stock"][str(producto)]["disponible"] == 4
+
+
+def test_venta(puerto, producto):
+    estado, venta = solicitar(puerto, "POST", "/ventas", {"lineas": [
+        {"id_producto": producto, "cantidad": 1}, {"id_producto": producto, "cantidad": 2}
+    ]})
+    assert estado == 201
+    assert venta["total_venta"] == 361.5
+    assert solicitar(puerto, "GET", f"/stock?ids={producto}")[1]["stock"][str(producto)]["stock"] == 1
+
+
+def test_venta_sin_stock(puerto, producto):
+    estado, error = solicitar(puerto, "POST", "/ventas", {"lineas": [{"id_producto": producto, "cantidad": 5}]})
+    assert estado == 409
+    assert error["faltantes"] == [{"id_producto": producto, "nombre": "Calculadora de la API",
+                                   "solicitado": 5, "disponible": 4}]
+    assert solicitar(puerto, "GET", f"/stock?ids={producto}")[1]["stock"][str(producto)]["stock"] == 4
+
+
+@pytest.mark.parametrize("cuerpo", [
+    {"lineas": []},
+    {"lineas": [{"id_producto": 1, "cantidad": 0}]},
+    {"lineas": [{"id_producto": 1, "cantidad": 1.5}]},
+    {"lineas": [{"id_producto": 1}]},
+])
+def test_venta_no_valida(puerto, cuerpo):
+    assert solicitar(puerto, "POST", "/ventas", cuerpo)[0] == 400
@@ -0,0 +1,76 @@
+# Archivo histórico: las ventas de periodos cerrados pasan a la base aparte sin cambiar lo
+# que leen los reportes. Corre en otro proceso con su propia base: archivar mueve un prefijo
+# de ids y adjunta el archivo a todas las conexiones, lo que cambiaría la base de las demás
+# pruebas.
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import json, random, sys
+sys.path[:0] = [{raiz!r}, {benchmarks!r}]
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from synthetic import generar_filas, llenar_base
+llenar_base(generar_filas(random.Random(7), 30, 400, 3, 20, dias=800))
+
+import archive
+from db import engine, SessionLocal, tablas_ventas, get_limites_archivo, Ventas, ResumenVentasDiario
+from rollups import reconstruir_resumenes
+
+def totales():
+    with engine.connect() as conn:
+        ventas = tablas_ventas(conn)[0]
+        historicas = conn.execute(select(func.count(), func.round(func.sum(ventas.c.total_venta), 2))).one()
+        en_base = conn.execute(select(func.count()).select_from(Ventas)).scalar()
+        resumen = conn.execute(select(func.round(func.sum(ResumenVentasDiario.total_ventas), 2))).scalar()
+    return {{"historicas": list(historicas), "en_base": en_base, "resumen": resumen}}
+
+resultado = {{"antes": totales()}}
+hasta = archive.fecha_maxima_archivable() - timedelta(days=30)
+resultado["movidas"] = archive.archivar(hasta, tamano_lote=50)
+resultado["despues"] = totales()
+with engine.connect() as conn:
+    limites = get_limites_archivo(conn)
+    resultado["limites"] = [limites.ventas, round(limites.total_ventas, 2), str(limites.hasta)]
+    resultado["primera_en_base"] = str(conn.execute(select(func.min(Ventas.fecha_venta))).scalar().date())
+with SessionLocal() as db:
+    reconstruir_resumenes(db)
+resultado["reconstruido"] = totales()
+resultado["otra_vez"] = archive.archivar(hasta)
+try:
+    archive.archivar(archive.fecha_maxima_archivable() + timedelta(days=1))
+except ValueError:
+    resultado["reciente_rechazado"] = True
+resultado["hasta"] = str(hasta)
+print(json.dumps(resultado))
+"""
+
+
+def test_archivar_conserva_lo_que_leen_los_reportes(tmp_path):
+    entorno = dict(os.environ, TIENDA_DB_PATH=str(tmp_path / "tienda.db"))
+    entorno.pop("TIENDA_ARCHIVO_PATH", None)
+    proceso = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(raiz=RAIZ, benchmarks=os.path.join(RAIZ, "benchmarks"))],
+        env=entorno, capture_output=True, text=True, timeout=120,
+    )
+    assert proceso.returncode == 0, proceso.stderr
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+
+    antes, despues = resultado["antes"], resultado["despues"]
+    ventas_movidas, lineas_movidas = resultado["movidas"]
+    assert ventas_movidas > 0 and lineas_movidas >= ventas_movidas
+    assert despues["en_base"] == antes["en_base"] - ventas_movidas
+    # Las vistas históricas y los resúmenes ven lo mismo que antes de archivar
+    assert despues["historicas"] == antes["historicas"] == resultado["reconstruido"]["historicas"]
+    assert despues["resumen"] == antes["resumen"] == resultado["reconstruido"]["resumen"]
+    assert resultado["limites"][0] == ventas_movidas and resultado["limites"][2] == resultado["hasta"]
+    assert resultado["primera_en_base"] >= resultado["hasta"]
+    assert resultado["otra_vez"] == [0, 0]
+    assert resultado.get("reciente_rechazado")
+    assert (tmp_path / "tienda_archivo.db").exists()
@@ -0,0 +1,41 @@
+# Búsqueda FTS5 de productos: prefijos sin distinguir acentos, el nombre pesa más que la
+# descripción y los triggers mantienen el índice al editar o borrar.
+from db import SessionLocal, Productos
+from search import buscar_productos, consulta_fts
+
+
+def _producto(db, nombre, descripcion=None):
+    producto = Productos(nombre=nombre, descripcion=descripcion, precio_compra=1, precio_venta=2)
+    db.add(producto)
+    db.flush()
+    return producto.id_producto
+
+
+def test_busqueda_por_prefijo_y_relevancia():
+    with SessionLocal() as db:
+        en_nombre = _producto(db, "Cuaderno Xilófono rayado")
+        en_descripcion = _producto(db, "Libreta", "Portada de xilofonos de colores")
+        db.commit()
+
+        assert buscar_productos(db, "xilo") == [en_nombre, en_descripcion]
+        assert buscar_productos(db, "XILÓFONO cuad") == [en_nombre]
+        # Comillas y operadores del usuario no rompen la consulta
+        assert buscar_productos(db, 'xilo" -cuad*') == [en_nombre]
+        assert buscar_productos(db, "  ¿? ") == []
+        assert consulta_fts("  ¿? ") is None
+
+
+def test_indice_sigue_a_los_cambios():
+    with SessionLocal() as db:
+        id_producto = _producto(db, "Marcador Quetzalito")
+        db.commit()
+        assert buscar_productos(db, "quetzal") == [id_producto]
+
+        db.get(Productos, id_producto).nombre = "Marcador Tucancito"
+        db.commit()
+        assert buscar_productos(db, "quetzal") == []
+        assert buscar_productos(db, "tucan") == [id_producto]
+
+        db.delete(db.get(Productos, id_producto))
+        db.commit()
+        assert buscar_productos(db, "tucan") == []
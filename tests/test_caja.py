@@ -0,0 +1,106 @@
+# Los cierres diarios usan días UTC, como las ventas y los gastos guardados, y el primer
+# cierre tras migrar efectivo_acumulado.txt no vuelve a sumar los días que ya traía. Los
+# resúmenes de flujo de caja por día, semana y mes coinciden con su reconstrucción.
+from datetime import date, datetime
+
+import pytest
+
+import cash
+import db as modulo_db
+import sales
+from db import SessionLocal, engine, Productos, Inventario, MovimientosEfectivo, ARCHIVO_EFECTIVO_ANTERIOR
+from cash import (cerrar_dias_pendientes, get_saldo, get_categorias_gasto, registrar_gasto, get_flujo_caja,
+                  get_totales_flujo)
+from rollups import reconstruir_flujo_caja
+
+
+class _Reloj(datetime):
+    ahora = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    for modulo in (cash, sales, modulo_db):
+        monkeypatch.setattr(modulo, "datetime", _Reloj)
+    return _Reloj
+
+
+@pytest.fixture
+def producto():
+    with SessionLocal() as db:
+        db.query(MovimientosEfectivo).delete()
+        producto = Productos(nombre="Regla de prueba", precio_compra=10, precio_venta=15)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=50))
+        db.commit()
+        yield producto.id_producto
+
+
+def _vender(db, reloj, producto, momento, cantidad=1):
+    reloj.ahora = momento
+    sales.registrar_carrito(db, {producto: {'nombre': "Regla", 'precio_venta': 15, 'cantidad': cantidad}})
+
+
+def test_cierre_en_dias_utc(reloj, producto):
+    with SessionLocal() as db:
+        _vender(db, reloj, producto, datetime(2030, 3, 10, 23, 50))
+        reloj.ahora = datetime(2030, 3, 11, 0, 10)
+        assert cerrar_dias_pendientes(db) == [date(2030, 3, 10)]
+        assert get_saldo(db) == 15
+
+        # La venta de después de medianoche UTC es del día siguiente, aún abierto
+        _vender(db, reloj, producto, datetime(2030, 3, 11, 0, 20), cantidad=2)
+        assert cerrar_dias_pendientes(db) == []
+        reloj.ahora = datetime(2030, 3, 12, 0, 5)
+        assert cerrar_dias_pendientes(db) == [date(2030, 3, 11)]
+        assert get_saldo(db) == 45
+
+
+def test_primer_cierre_despues_del_saldo_migrado(reloj, producto, tmp_path, monkeypatch):
+    with SessionLocal() as db:
+        # Vendido el día anterior a la migración: ya está en el saldo del archivo
+        _vender(db, reloj, producto, datetime(2030, 5, 19, 16, 0))
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ARCHIVO_EFECTIVO_ANTERIOR).write_text("100.00")
+    reloj.ahora = datetime(2030, 5, 20, 9, 0)
+    with engine.begin() as conn:
+        modulo_db._migracion_movimientos_efectivo(conn)
+
+    with SessionLocal() as db:
+        assert cerrar_dias_pendientes(db) == []
+        assert get_saldo(db) == 100
+
+        _vender(db, reloj, producto, datetime(2030, 5, 20, 12, 0))
+        reloj.ahora = datetime(2030, 5, 21, 8, 0)
+        assert cerrar_dias_pendientes(db) == [date(2030, 5, 20)]
+        assert get_saldo(db) == 115
+
+
+def test_flujo_por_periodo_y_categoria(reloj, producto):
+    with SessionLocal() as db:
+        categorias = {nombre: id_categoria for id_categoria, nombre in get_categorias_gasto(db)}
+        for momento, categoria, monto in ((datetime(2030, 6, 2, 10), "Gasolina", 20),  # domingo: semana anterior
+                                          (datetime(2030, 6, 4, 10), "Salario", 50),
+                                          (datetime(2030, 6, 10, 10), "Gasolina", 5)):
+            reloj.ahora = momento
+            registrar_gasto(db, categorias[categoria], categoria, monto)
+        _vender(db, reloj, producto, datetime(2030, 6, 7, 13, 0))
+
+        semana = get_flujo_caja(db, date(2030, 6, 3), date(2030, 6, 9), 'semana')
+        assert sorted(semana) == [(date(2030, 6, 3), 'gasto', "Salario", 50.0),
+                                  (date(2030, 6, 3), 'ingreso', "Ventas", 15.0)]
+        mes = get_flujo_caja(db, date(2030, 6, 1), date(2030, 6, 30), 'mes')
+        assert sorted(mes) == [(date(2030, 6, 1), 'gasto', "Gasolina", 25.0),
+                               (date(2030, 6, 1), 'gasto', "Salario", 50.0),
+                               (date(2030, 6, 1), 'ingreso', "Ventas", 15.0)]
+        assert get_totales_flujo(db, date(2030, 6, 1), date(2030, 6, 9)) == (15.0, 70.0)
+
+        reconstruir_flujo_caja(db, date(2030, 6, 1))
+        assert sorted(get_flujo_caja(db, date(2030, 6, 3), date(2030, 6, 9), 'semana')) == sorted(semana)
+        assert sorted(get_flujo_caja(db, date(2030, 6, 1), date(2030, 6, 30), 'mes')) == sorted(mes)
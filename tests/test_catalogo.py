@@ -0,0 +1,60 @@
+# La caché del catálogo responde sin consultar la base mientras no haya commits, se
+# recarga sola cuando cambia la versión de datos y guarda a lo más `max_productos`.
+import pytest
+from sqlalchemy import event
+
+from db import engine, SessionLocal, Productos, Inventario
+from catalog import CatalogoProductos
+
+
+@pytest.fixture
+def consultas():
+    enviadas = []
+
+    def contar(*_):
+        enviadas.append(1)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    yield enviadas
+    event.remove(engine, "before_cursor_execute", contar)
+
+
+def _agregar_producto(nombre, cantidad):
+    with SessionLocal() as db:
+        producto = Productos(nombre=nombre, precio_compra=1, precio_venta=2)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=cantidad))
+        db.commit()
+        return producto.id_producto
+
+
+def test_catalogo_se_recarga_al_cambiar_la_version(consultas):
+    id_producto = _agregar_producto("Crayón de catálogo", 7)
+    catalogo = CatalogoProductos()
+    assert catalogo.obtener(id_producto).stock == 7
+
+    consultas.clear()
+    productos = catalogo.listar()
+    assert list(catalogo.listar()) == list(productos)
+    assert catalogo.obtener(id_producto).nombre == "Crayón de catálogo"
+    assert len(consultas) == 1  # solo la carga del listado completo
+
+    with SessionLocal() as db:
+        db.query(Inventario).filter(Inventario.id_producto == id_producto).update({Inventario.cantidad: 3})
+        db.commit()
+    assert catalogo.obtener(id_producto).stock == 3
+
+
+def test_catalogo_limitado_descarta_los_menos_usados(consultas):
+    ids = [_agregar_producto(f"Plumón de catálogo {n}", n) for n in range(3)]
+    catalogo = CatalogoProductos(max_productos=2)
+    catalogo.obtener_varios(ids[:2])
+    catalogo.obtener(ids[0])  # ids[1] pasa a ser el menos usado
+    catalogo.obtener(ids[2])
+
+    consultas.clear()
+    assert set(catalogo.obtener_varios([ids[0], ids[2]])) == {ids[0], ids[2]}
+    assert consultas == []
+    assert catalogo.obtener(ids[1]).stock == 1
+    assert len(consultas) == 1
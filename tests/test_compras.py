@@ -0,0 +1,88 @@
+# Lista de compras: el punto de reorden y la cantidad sugerida salen de la venta diaria
+# promedio y su variación en la ventana, leídas del resumen por día y producto. La
+# recepción de un pedido guarda stock, orden, gasto y movimientos en una transacción.
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from db import (SessionLocal, engine, Productos, Inventario, ResumenProductosDiario, OrdenesCompra, Gastos,
+                CategoriasGasto, MovimientosInventario, CATEGORIA_GASTO_INVENTARIO)
+from inventory import TIPO_REABASTO
+from purchasing import (get_demanda, calcular_reorden, registrar_recepcion, ParametrosReorden, ESTADO_BAJO,
+                        ESTADO_SUFICIENTE)
+
+
+def test_reorden_por_velocidad_y_variacion():
+    demanda = pd.DataFrame([
+        # constante: 2 por día durante 28 días
+        (1, "Constante", None, 4, 56, 28 * 2 ** 2),
+        # sin ventas
+        (2, "Sin ventas", None, 10, 0, 0),
+        # 28 unidades en un solo día: misma media que 1 por día, mucha más variación
+        (3, "Irregular", None, 15, 28, 28 ** 2),
+    ], columns=['id_producto', 'nombre', 'categoria', 'stock', 'unidades', 'cuadrados'])
+
+    lista = calcular_reorden(demanda, ParametrosReorden())
+    assert list(lista['ID']) == [1, 3, 2]  # bajo su reorden primero, por días de cobertura
+    filas = lista.set_index('ID')
+    assert filas.loc[1, ['Venta Diaria', 'Punto de Reorden', 'Cantidad Sugerida', 'Días de Cobertura']].tolist() == [2, 6, 16, 2]
+    assert filas.loc[3, ['Venta Diaria', 'Punto de Reorden', 'Cantidad Sugerida', 'Días de Cobertura']].tolist() == [1, 18, 10, 15]
+    assert filas.loc[2, 'Punto de Reorden'] == ParametrosReorden().stock_minimo
+    assert filas.loc[2, 'Cantidad Sugerida'] == 0 and pd.isna(filas.loc[2, 'Días de Cobertura'])
+    assert list(lista['Estado']) == [ESTADO_BAJO, ESTADO_BAJO, ESTADO_SUFICIENTE]
+
+
+def test_demanda_en_la_ventana():
+    hasta = date(2037, 2, 28)
+    with SessionLocal() as db:
+        producto = Productos(nombre="Compás de demanda", precio_compra=1, precio_venta=2)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=9))
+        # El día anterior a la ventana no cuenta
+        for dias_antes, unidades in ((0, 3), (5, 4), (27, 1), (28, 100)):
+            db.add(ResumenProductosDiario(fecha=hasta - timedelta(days=dias_antes), id_producto=producto.id_producto,
+                                          total_ventas=unidades * 2, num_transacciones=1, unidades_vendidas=unidades,
+                                          ganancia=unidades))
+        db.commit()
+        id_producto = producto.id_producto
+
+    with engine.connect() as conn:
+        demanda = get_demanda(conn, hasta - timedelta(days=27), hasta).set_index('id_producto')
+    assert demanda.loc[id_producto, ['stock', 'unidades', 'cuadrados']].tolist() == [9, 8, 26]
+
+
+def test_recepcion_en_una_transaccion():
+    with SessionLocal() as db:
+        con_stock = Productos(nombre="Folder de recepción", precio_compra=1, precio_venta=2)
+        sin_fila = Productos(nombre="Clip de recepción", precio_compra=1, precio_venta=2)
+        db.add_all([con_stock, sin_fila])
+        db.flush()
+        db.add(Inventario(id_producto=con_stock.id_producto, cantidad=4))
+        db.commit()
+        ids = (con_stock.id_producto, sin_fila.id_producto)
+
+        id_orden, total = registrar_recepcion(db, {ids[0]: (10, 1.5), ids[1]: (3, 2.25), 999999: (0, 1)}, "Papelera")
+        assert total == 21.75
+        stock = dict(db.query(Inventario.id_producto, Inventario.cantidad).filter(Inventario.id_producto.in_(ids)).all())
+        assert stock == {ids[0]: 14, ids[1]: 3}
+
+        orden = db.get(OrdenesCompra, id_orden)
+        assert (orden.proveedor, float(orden.total)) == ("Papelera", 21.75)
+        assert sorted((l.id_producto, l.cantidad, float(l.costo_unitario)) for l in orden.lineas) == [
+            (ids[0], 10, 1.5), (ids[1], 3, 2.25)]
+        gasto = db.get(Gastos, orden.id_gasto)
+        assert float(gasto.monto) == 21.75
+        assert db.get(CategoriasGasto, gasto.id_categoria).nombre == CATEGORIA_GASTO_INVENTARIO
+        assert sorted(db.query(MovimientosInventario.id_producto, MovimientosInventario.cantidad).filter(
+            MovimientosInventario.tipo == TIPO_REABASTO, MovimientosInventario.id_referencia == id_orden).all()) == [
+            (ids[0], 10), (ids[1], 3)]
+
+        # Un producto inexistente rechaza toda la recepción antes de escribir
+        ordenes = db.query(OrdenesCompra).count()
+        with pytest.raises(ValueError):
+            registrar_recepcion(db, {ids[0]: (5, 1), 999999: (1, 1)})
+        assert db.query(OrdenesCompra).count() == ordenes
+        assert db.query(Inventario.cantidad).filter(Inventario.id_producto == ids[0]).scalar() == 14
+        assert registrar_recepcion(db, {ids[0]: (0, 1)}) is None
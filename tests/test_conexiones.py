@@ -0,0 +1,35 @@
+# El motor compartido configura cada conexión (WAL, busy_timeout) y get_db devuelve su
+# conexión al pool aunque la página falle.
+import pytest
+from sqlalchemy import text
+
+from db import engine, get_db, get_estadisticas_pool, Productos, PRAGMAS_CONEXION
+
+
+def test_conexiones_configuradas():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == int(PRAGMAS_CONEXION["busy_timeout"])
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+
+def test_get_db_devuelve_la_conexion_al_pool():
+    en_uso = get_estadisticas_pool()["conexiones_en_uso"]
+    with pytest.raises(RuntimeError):
+        with get_db() as db:
+            db.query(Productos).count()
+            assert get_estadisticas_pool()["conexiones_en_uso"] == en_uso + 1
+            raise RuntimeError("la página falló")
+    assert get_estadisticas_pool()["conexiones_en_uso"] == en_uso
+
+
+def test_lectura_abierta_no_bloquea_la_escritura():
+    with engine.connect() as lectura, engine.connect() as escritura:
+        lectura.exec_driver_sql("BEGIN")
+        antes = lectura.execute(text("SELECT COUNT(*) FROM productos")).scalar()
+        escritura.execute(text("INSERT INTO productos (nombre, precio_compra, precio_venta) VALUES ('Pegamento WAL', 1, 2)"))
+        escritura.commit()
+        # La lectura sigue viendo su instantánea hasta terminar
+        assert lectura.execute(text("SELECT COUNT(*) FROM productos")).scalar() == antes
+        lectura.rollback()
+        assert lectura.execute(text("SELECT COUNT(*) FROM productos")).scalar() == antes + 1
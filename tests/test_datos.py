@@ -0,0 +1,91 @@
+# Exportación de las tablas a un ZIP en disco, reutilizado mientras la base no cambie, e
+# importación por lotes en una sola transacción.
+import csv
+import io
+import os
+import zipfile
+
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal, engine, Productos, Inventario, Ventas, DetalleVenta
+from data_io import (exportar_tablas_zip, abrir_exportacion, exportacion_vigente, importar_zip,
+                     PRAGMAS_CARGA_RAPIDA, _leer_pragmas)
+
+
+def _agregar_producto(nombre):
+    with SessionLocal() as db:
+        producto = Productos(nombre=nombre, precio_compra=1, precio_venta=2)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=3))
+        db.commit()
+
+
+def test_exportacion_en_disco_por_version():
+    _agregar_producto("Regla de exportación")
+    ruta = exportar_tablas_zip()
+    assert os.path.isfile(ruta)
+    assert exportacion_vigente()
+    assert exportar_tablas_zip() == ruta
+
+    with zipfile.ZipFile(ruta) as zip_file:
+        with zip_file.open("productos.csv") as miembro:
+            filas = list(csv.DictReader(io.TextIOWrapper(miembro, encoding="utf-8")))
+    assert "Regla de exportación" in {fila["nombre"] for fila in filas}
+
+    with abrir_exportacion() as archivo:
+        assert archivo.read(2) == b"PK"
+
+    # Un cambio en la base genera otro archivo y borra el anterior
+    _agregar_producto("Compás de exportación")
+    assert not exportacion_vigente()
+    nueva = exportar_tablas_zip()
+    assert nueva != ruta and os.path.isfile(nueva) and not os.path.exists(ruta)
+
+
+def _contenido(db):
+    return (db.execute(select(Productos.id_producto, Productos.nombre, Productos.precio_venta, Productos.fecha_creacion)
+                       .order_by(Productos.id_producto)).all(),
+            db.execute(select(Inventario.id_producto, Inventario.cantidad).order_by(Inventario.id_producto)).all(),
+            db.execute(select(func.count()).select_from(Ventas)).scalar(),
+            db.execute(select(func.count()).select_from(DetalleVenta)).scalar())
+
+
+def test_importacion_por_lotes_reproduce_la_exportacion():
+    _agregar_producto("Escuadra de importación")
+    with SessionLocal() as db:
+        antes = _contenido(db)
+    ruta = exportar_tablas_zip()
+
+    lotes = []
+    importadas = importar_zip(ruta, progreso=lambda tabla, filas, total, segundos: lotes.append(tabla), tamano_lote=2)
+    assert importadas["productos"] == len(antes[0])
+    # Con lotes de 2 filas, cada tabla de más de dos filas llega en varios lotes
+    assert lotes.count("productos") == -(-len(antes[0]) // 2)
+    with SessionLocal() as db:
+        assert _contenido(db) == antes
+
+
+def test_importacion_fallida_no_cambia_nada():
+    _agregar_producto("Transportador de importación")
+    with SessionLocal() as db:
+        antes = _contenido(db)
+    with engine.connect() as conn:
+        pragmas = _leer_pragmas(conn)
+
+    archivo = io.BytesIO()
+    with zipfile.ZipFile(archivo, "w") as zip_file:
+        # id repetido: el segundo lote choca con el primero cuando ya se borró la tabla
+        zip_file.writestr("productos.csv", "id_producto,nombre,precio_compra,precio_venta\n"
+                                           "1,Uno,1,2\n2,Dos,1,2\n1,Otra vez uno,1,2\n")
+    archivo.seek(0)
+    with pytest.raises(IntegrityError):
+        importar_zip(archivo, tamano_lote=2)
+
+    with SessionLocal() as db:
+        assert _contenido(db) == antes
+    with engine.connect() as conn:
+        assert _leer_pragmas(conn) == pragmas
+    assert set(pragmas) == set(PRAGMAS_CARGA_RAPIDA)
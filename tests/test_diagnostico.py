@@ -0,0 +1,50 @@
+# Instrumentación SQL: cada ejecución cuenta sus consultas, marca como posible N+1 la
+# sentencia que se repite y las consultas fuera de una ejecución suman a su origen.
+import json
+import threading
+
+import pytest
+from sqlalchemy import select
+
+import diagnostics
+from db import engine, get_db, Productos
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio():
+    diagnostics.reiniciar()
+    yield
+    diagnostics.reiniciar()
+
+
+def test_ejecucion_marca_n_mas_1():
+    with diagnostics.medir_ejecucion("Prueba N+1"):
+        with get_db() as db:  # dentro de otra ejecución no abre una nueva
+            ids = [i for (i,) in db.execute(select(Productos.id_producto).limit(1))]
+            for _ in range(diagnostics.UMBRAL_N_MAS_1 + 1):
+                db.execute(select(Productos.nombre).where(Productos.id_producto == ids[0])).all()
+
+    (ejecucion,) = diagnostics.get_ejecuciones()
+    assert ejecucion.pagina == "Prueba N+1"
+    assert ejecucion.consultas == diagnostics.UMBRAL_N_MAS_1 + 2
+    assert list(ejecucion.repetidas.values()) == [diagnostics.UMBRAL_N_MAS_1 + 1]
+    assert "productos.nombre" in next(iter(ejecucion.repetidas))
+
+    (fila,) = diagnostics.resumen_por_pagina()
+    assert (fila["pagina"], fila["ejecuciones"], fila["ejecuciones_con_n_mas_1"]) == ("Prueba N+1", 1, 1)
+    assert diagnostics.get_repetidas()[0]["veces_max"] == diagnostics.UMBRAL_N_MAS_1 + 1
+    assert json.loads(diagnostics.generar_json())["paginas"][0]["pagina"] == "Prueba N+1"
+    assert 'pagina="Prueba N+1"' in diagnostics.generar_prometheus()
+
+
+def test_consultas_fuera_de_ejecucion_por_hilo():
+    def consultar():
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1").all()
+            conn.exec_driver_sql("SELECT 2").all()
+
+    hilo = threading.Thread(target=consultar, name="hilo-de-prueba")
+    hilo.start()
+    hilo.join()
+    assert diagnostics.get_fuera_de_ejecucion()["hilo-de-prueba"][0] == 2
+    assert diagnostics.get_ejecuciones() == []
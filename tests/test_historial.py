@@ -0,0 +1,75 @@
+# Historial columnar: los rangos de fechas se leen como un tramo de los archivos, también
+# con fechas fuera del orden de los ids, y la copia se revisa sin contar toda la tabla.
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+from db import engine, SessionLocal, Ventas, DetalleVenta
+from sales_history import HistorialVentas
+
+
+def _venta(db, fecha, cantidad, id_producto=1):
+    venta = Ventas(total_venta=cantidad * 2, fecha_venta=fecha)
+    db.add(venta)
+    db.flush()
+    db.add(DetalleVenta(id_venta=venta.id_venta, id_producto=id_producto, cantidad=cantidad,
+                        precio_unitario=2, costo_unitario=1))
+    db.commit()
+    return venta.id_venta
+
+
+@pytest.fixture
+def historial(tmp_path):
+    return HistorialVentas(directorio=str(tmp_path))
+
+
+def test_rango_en_orden_es_una_vista(historial):
+    with SessionLocal() as db:
+        for dia in (1, 2, 3, 4):
+            _venta(db, datetime(2031, 3, dia, 12), dia)
+    lineas = historial.lineas_en_rango(date(2031, 3, 2), date(2031, 3, 3))
+    assert sorted(lineas["cantidad"]) == [2, 3]
+    # Sin fechas fuera de orden el tramo no se copia
+    assert historial._metadatos["desorden"] == 0
+    assert np.shares_memory(lineas["cantidad"].to_numpy(), historial.columnas()["cantidad"])
+
+
+def test_rango_con_fechas_fuera_de_orden(historial):
+    with SessionLocal() as db:
+        _venta(db, datetime(2032, 5, 10, 12), 7)
+        # Id mayor con fecha anterior: queda dentro de su rango aunque esté después en el archivo
+        _venta(db, datetime(2032, 5, 8, 12), 5)
+        _venta(db, datetime(2032, 5, 12, 12), 9)
+    assert historial.lineas_en_rango(date(2032, 5, 8), date(2032, 5, 8))["cantidad"].tolist() == [5]
+    assert sorted(historial.lineas_en_rango(date(2032, 5, 8), date(2032, 5, 10))["cantidad"]) == [5, 7]
+    assert historial.lineas_en_rango(date(2032, 5, 11), date(2032, 5, 12))["cantidad"].tolist() == [9]
+
+
+def test_sincronizar_no_cuenta_toda_la_tabla(historial):
+    with SessionLocal() as db:
+        _venta(db, datetime(2033, 1, 1, 12), 1)
+    historial.sincronizar()
+
+    enviadas = []
+    capturar = lambda conn, cursor, sentencia, *args: enviadas.append(sentencia)
+    event.listen(engine, "before_cursor_execute", capturar)
+    try:
+        with SessionLocal() as db:
+            _venta(db, datetime(2033, 1, 2, 12), 2)
+        assert historial.sincronizar() == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", capturar)
+    assert not any("COUNT(*)" in sentencia for sentencia in enviadas), enviadas
+
+
+def test_linea_copiada_reemplazada_reconstruye(historial):
+    with SessionLocal() as db:
+        id_venta = _venta(db, datetime(2034, 6, 1, 12), 4)
+    historial.sincronizar()
+    with SessionLocal() as db:
+        db.query(DetalleVenta).filter(DetalleVenta.id_venta == id_venta).update({DetalleVenta.cantidad: 6})
+        db.commit()
+    historial.sincronizar()
+    assert historial.lineas_en_rango(date(2034, 6, 1), date(2034, 6, 1))["cantidad"].tolist() == [6]
@@ -0,0 +1,59 @@
+# Las consultas por rango de fechas que manda la app (libro de efectivo, resúmenes y
+# agregados) deben resolverse con los índices de las migraciones, no recorriendo las
+# tablas de ventas, gastos o movimientos completas. Se revisa el EXPLAIN QUERY PLAN de cada
+# sentencia que envían las funciones reales.
+from datetime import date, timedelta
+
+import pytest
+
+from db import engine, SessionLocal, MIGRACIONES, get_version_esquema
+import aggregates
+import cash
+import purchasing
+import rollups
+import sales
+
+HOY = date.today()
+DESDE, HASTA = HOY - timedelta(days=30), HOY
+
+# Tablas que nunca deben leerse completas en estas consultas
+TABLAS_POR_RANGO = ("ventas", "detalle_venta", "gastos", "movimientos_efectivo",
+                    "resumen_ventas_diario", "resumen_productos_diario", "resumen_flujo_caja")
+
+LLAMADAS = {
+    "movimientos de efectivo": lambda db: cash.get_movimientos(db, DESDE, HASTA),
+    "flujo de caja": lambda db: cash.get_flujo_caja(db, DESDE, HASTA, 'semana'),
+    "totales de flujo": lambda db: cash.get_totales_flujo(db, DESDE, HASTA),
+    "reconstruir resúmenes": lambda db: rollups.reconstruir_resumenes(db, DESDE),
+    "reconstruir flujo de caja": lambda db: rollups.reconstruir_flujo_caja(db, DESDE),
+    "demanda de la lista de compras": lambda db: purchasing.get_demanda(db, DESDE, HASTA),
+    "catálogo por popularidad": lambda db: sales.get_productos_disponibles(db, orden=sales.ORDEN_POPULARIDAD),
+    "plegar agregados": lambda db: aggregates.plegar(aggregates.Instantanea(), db.connection(), 10, 10),
+}
+
+INDICES = {
+    "ix_ventas_fecha_venta",
+    "ix_gastos_fecha_gasto",
+    "ix_detalle_venta_cubre_venta",
+    "ix_detalle_venta_id_producto",
+    "ix_inventario_id_producto",
+    "ix_movimientos_efectivo_fecha",
+}
+
+
+def test_migraciones_aplicadas():
+    with engine.connect() as conn:
+        assert get_version_esquema(conn) == len(MIGRACIONES)
+        indices = {fila[0] for fila in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert INDICES <= indices
+
+
+@pytest.mark.parametrize("nombre", LLAMADAS)
+def test_consulta_por_rango_usa_indices(planes, nombre):
+    with SessionLocal() as db:
+        enviadas = planes(lambda: LLAMADAS[nombre](db))
+    assert enviadas
+    for sentencia, pasos in enviadas:
+        recorridas = [paso for paso in pasos for tabla in TABLAS_POR_RANGO
+                      if paso.startswith(f"SCAN {tabla}") and paso.split()[1] == tabla]
+        assert not recorridas, (sentencia, pasos)
@@ -0,0 +1,47 @@
+# El stock en un momento pasado se arma con rangos de id_movimiento, aunque las fechas del
+# diario no sigan el orden de los ids.
+from datetime import datetime, timedelta
+
+from db import SessionLocal, Productos, MovimientosInventario
+from inventory import get_stock_en, get_movimientos, TIPO_AJUSTE, DESFASE_MAXIMO_SEGUNDOS
+
+
+def _producto_con_movimientos(db, fechas_y_cantidades):
+    producto = Productos(nombre="Goma de prueba", precio_compra=2, precio_venta=3)
+    db.add(producto)
+    db.flush()
+    for fecha, cantidad in fechas_y_cantidades:
+        db.add(MovimientosInventario(fecha=fecha, id_producto=producto.id_producto, tipo=TIPO_AJUSTE, cantidad=cantidad))
+        db.flush()
+    db.commit()
+    return producto.id_producto
+
+
+def test_stock_en_con_fechas_fuera_de_orden():
+    base = datetime.utcnow() + timedelta(days=30)
+    with SessionLocal() as db:
+        # El segundo movimiento tiene id mayor pero fecha anterior al primero
+        producto = _producto_con_movimientos(db, [
+            (base + timedelta(seconds=DESFASE_MAXIMO_SEGUNDOS - 10), 5),
+            (base, 3),
+        ])
+        assert get_stock_en(db, base + timedelta(seconds=DESFASE_MAXIMO_SEGUNDOS), producto) == {producto: 8}
+
+
+def test_movimientos_por_dia():
+    dia = (datetime.utcnow() + timedelta(days=60)).replace(hour=12)
+    with SessionLocal() as db:
+        producto = _producto_con_movimientos(db, [(dia - timedelta(days=1), 10), (dia, -4), (dia + timedelta(days=1), 2)])
+        movimientos = get_movimientos(db, producto, dia.date(), dia.date())
+        assert movimientos['Cantidad'].tolist() == [-4]
+        assert movimientos['Stock'].tolist() == [6]
+
+
+def test_limite_de_un_momento_usa_el_indice(planes):
+    with SessionLocal() as db:
+        enviadas = planes(lambda: get_stock_en(db, datetime.utcnow() - timedelta(days=365)))
+    pasos = [paso for sentencia, pasos in enviadas if "FROM movimientos_inventario" in sentencia
+             and "MAX(id_movimiento)" in sentencia for paso in pasos]
+    assert pasos, enviadas
+    assert not any(paso.startswith("SCAN") for paso in pasos), pasos
+    assert sum("INDEX ix_movimientos_inventario_fecha_id (fecha" in paso for paso in pasos) == 2, pasos
@@ -0,0 +1,50 @@
+# Una base de la primera versión (user_version 0: sin resúmenes, categorías ni costo por
+# línea) se pone al día con todas las migraciones, y sus resúmenes se reconstruyen con el
+# costo completado desde el precio de compra.
+from sqlalchemy import create_engine, event
+
+from db import MIGRACIONES, aplicar_migraciones, get_version_esquema, _configurar_conexion
+
+ESQUEMA_ORIGINAL = [
+    """CREATE TABLE productos (
+        id_producto INTEGER NOT NULL, nombre VARCHAR(50) NOT NULL, descripcion VARCHAR(255),
+        precio_compra NUMERIC(10, 2) NOT NULL, precio_venta NUMERIC(10, 2) NOT NULL,
+        fecha_creacion DATETIME, PRIMARY KEY (id_producto))""",
+    """CREATE TABLE ventas (
+        id_venta INTEGER NOT NULL, fecha_venta DATETIME, total_venta NUMERIC(10, 2) NOT NULL,
+        PRIMARY KEY (id_venta))""",
+    """CREATE TABLE gastos (
+        id_gasto INTEGER NOT NULL, descripcion VARCHAR(100) NOT NULL, monto NUMERIC(10, 2) NOT NULL,
+        fecha_gasto DATETIME, PRIMARY KEY (id_gasto))""",
+    """CREATE TABLE inventario (
+        id_inventario INTEGER NOT NULL, id_producto INTEGER, cantidad INTEGER NOT NULL,
+        ultima_actualizacion DATETIME, PRIMARY KEY (id_inventario))""",
+    """CREATE TABLE detalle_venta (
+        id_detalle INTEGER NOT NULL, id_venta INTEGER, id_producto INTEGER, cantidad INTEGER NOT NULL,
+        precio_unitario NUMERIC(10, 2) NOT NULL, PRIMARY KEY (id_detalle))""",
+    "INSERT INTO productos VALUES (1, 'Cuaderno', NULL, 6, 10, '2024-08-01 08:00:00')",
+    "INSERT INTO inventario VALUES (1, 1, 20, '2024-08-01 08:00:00')",
+    "INSERT INTO ventas VALUES (1, '2024-09-02 10:00:00', 30)",
+    "INSERT INTO detalle_venta VALUES (1, 1, 1, 3, 10)",
+    "INSERT INTO gastos VALUES (1, 'Luz', 50, '2024-09-02 12:00:00')",
+]
+
+
+def test_base_original_se_pone_al_dia(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'original.db'}")
+    event.listen(engine, "connect", _configurar_conexion)
+    with engine.begin() as conn:
+        for sql in ESQUEMA_ORIGINAL:
+            conn.exec_driver_sql(sql)
+
+    assert aplicar_migraciones(engine) == list(range(1, len(MIGRACIONES) + 1))
+    with engine.connect() as conn:
+        assert get_version_esquema(conn) == len(MIGRACIONES)
+        assert conn.exec_driver_sql("SELECT costo_unitario FROM detalle_venta").scalar() == 6
+        assert conn.exec_driver_sql(
+            "SELECT fecha, total_ventas, num_transacciones, unidades_vendidas, ganancia FROM resumen_ventas_diario"
+        ).all() == [("2024-09-02", 30, 1, 3, 12)]
+        assert conn.exec_driver_sql("SELECT ganancia FROM resumen_productos_diario WHERE id_producto = 1").scalar() == 12
+    # Sin migraciones pendientes, no se vuelve a aplicar nada
+    assert aplicar_migraciones(engine) == []
+    engine.dispose()
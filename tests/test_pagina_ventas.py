@@ -0,0 +1,62 @@
+# Página de Ventas por fragmentos: agregar al carrito redibuja el carrito sin volver a
+# consultar el catálogo, y cobrar sí lo vuelve a consultar con el stock nuevo.
+import os
+
+import pytest
+from sqlalchemy import event
+from streamlit.testing.v1 import AppTest
+
+from db import engine, SessionLocal, Productos, Inventario
+from reservations import get_disponibles
+
+PAGINA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "3_Ventas.py")
+
+
+@pytest.fixture
+def producto():
+    with SessionLocal() as db:
+        producto = Productos(nombre="Pegamento Zzyzx", precio_compra=5, precio_venta=12)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=4))
+        db.commit()
+        yield producto.id_producto
+
+
+@pytest.fixture
+def consultas_catalogo():
+    # Consultas de una página del catálogo (get_productos_disponibles)
+    enviadas = []
+
+    def capturar(conn, cursor, sentencia, *_):
+        if "AS popularidad" in sentencia:
+            enviadas.append(sentencia)
+
+    event.listen(engine, "before_cursor_execute", capturar)
+    yield enviadas
+    event.remove(engine, "before_cursor_execute", capturar)
+
+
+def test_carrito_sin_consultar_el_catalogo(producto, consultas_catalogo):
+    at = AppTest.from_file(PAGINA).run(timeout=30)
+    at.text_input[0].set_value("zzyzx").run(timeout=30)
+    assert not at.exception
+    assert [b.key for b in at.button if b.key and b.key.startswith("add_")] == [f"add_{producto}"]
+
+    consultas_catalogo.clear()
+    at.number_input(key=f"cantidad_{producto}").set_value(3)
+    at.button(key=f"add_{producto}").click().run(timeout=30)
+    assert not at.exception
+    assert at.session_state.carrito[producto]['cantidad'] == 3
+    assert consultas_catalogo == []
+    with SessionLocal() as db:
+        assert get_disponibles(db, [producto], "otra caja") == {producto: 1}
+
+    next(b for b in at.button if b.label == "Finalizar Venta").click().run(timeout=30)
+    assert not at.exception
+    assert at.session_state.carrito == {}
+    assert "finalizada exitosamente" in at.success[0].value
+    assert len(consultas_catalogo) == 1
+    with SessionLocal() as db:
+        assert db.query(Inventario.cantidad).filter(Inventario.id_producto == producto).scalar() == 1
+        assert get_disponibles(db, [producto], "otra caja") == {producto: 1}
@@ -0,0 +1,55 @@
+# Perfilado de páginas: cada sección guarda su duración y su parte SQL; con cProfile solo
+# quedan en disco los perfiles de las ejecuciones más lentas.
+import os
+import time
+
+import pytest
+from sqlalchemy import text
+
+import profiling
+from db import engine
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio():
+    profiling.reiniciar()
+    yield
+    profiling.reiniciar()
+
+
+def _ejecutar_pagina(espera=0.0):
+    with profiling.perfilar_pagina("Prueba", mostrar_controles=False):
+        with profiling.seccion("consulta"):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT COUNT(*) FROM productos")).scalar()
+        with profiling.seccion("cálculo"):
+            time.sleep(espera)
+
+
+def test_secciones_con_tiempo_sql(monkeypatch):
+    monkeypatch.setenv(profiling.VARIABLE_ENTORNO, "1")
+    for _ in range(3):
+        _ejecutar_pagina()
+    # Fuera de una ejecución perfilada las secciones no miden nada
+    with profiling.seccion("suelta"):
+        pass
+
+    filas = {fila["seccion"]: fila for fila in profiling.get_estadisticas()}
+    assert set(filas) == {profiling.SECCION_TOTAL, "consulta", "cálculo"}
+    assert all(fila["ejecuciones"] == 3 and fila["pagina"] == "Prueba" for fila in filas.values())
+    assert filas["consulta"]["sql_pct"] > 0
+    assert filas["cálculo"]["sql_pct"] == 0
+    assert filas[profiling.SECCION_TOTAL]["p50_ms"] >= filas["consulta"]["p50_ms"]
+    assert profiling.get_perfiles_guardados() == []
+
+
+def test_cprofile_guarda_las_mas_lentas(monkeypatch, tmp_path):
+    monkeypatch.setenv(profiling.VARIABLE_ENTORNO, profiling.MODO_CPROFILE)
+    monkeypatch.setattr(profiling, "DIRECTORIO_PERFILES", str(tmp_path))
+    monkeypatch.setattr(profiling, "MAX_PERFILES_POR_PAGINA", 2)
+    for espera in (0.03, 0.0, 0.05):
+        _ejecutar_pagina(espera)
+
+    guardados = profiling.get_perfiles_guardados()
+    assert len(guardados) == 2 and guardados[0][1] > guardados[1][1] >= 30
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(os.path.basename(ruta) for _, _, ruta in guardados)
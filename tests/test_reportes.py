@@ -0,0 +1,45 @@
+# El motor de reportes da los mismos números por los agregados en memoria (rangos cortos) y
+# por el historial columnar (rangos largos).
+from datetime import date, datetime
+
+import pytest
+
+from db import SessionLocal, Productos, Ventas, DetalleVenta
+from aggregates import actualizar_agregados
+from reports import calcular_reporte, DIAS_RANGO_LARGO
+
+# (día, unidades) de un solo producto a precio 10 y costo 6
+VENTAS = [(date(2035, 3, 2), 2), (date(2035, 3, 2), 1), (date(2035, 3, 5), 4)]
+
+
+@pytest.fixture(scope="module")
+def producto():
+    with SessionLocal() as db:
+        producto = Productos(nombre="Mochila de reporte", precio_compra=6, precio_venta=10)
+        db.add(producto)
+        db.flush()
+        for dia, unidades in VENTAS:
+            venta = Ventas(total_venta=unidades * 10, fecha_venta=datetime(dia.year, dia.month, dia.day, 15))
+            db.add(venta)
+            db.flush()
+            db.add(DetalleVenta(id_venta=venta.id_venta, id_producto=producto.id_producto, cantidad=unidades,
+                                precio_unitario=10, costo_unitario=6))
+        db.commit()
+        return producto.nombre
+
+
+@pytest.mark.parametrize("inicio, fin", [
+    (date(2035, 3, 1), date(2035, 3, 10)),
+    (date(2035, 1, 1), date(2035, 6, 30)),
+], ids=["agregados", "historial"])
+def test_reporte_por_rango(producto, inicio, fin):
+    assert ((fin - inicio).days + 1 >= DIAS_RANGO_LARGO) == (inicio.month == 1)
+    actualizar_agregados(espera=5)
+    reporte = calcular_reporte(inicio, fin)
+    assert reporte.total_ventas == 70
+    assert reporte.num_transacciones == 3
+    assert reporte.total_ganancia == 28
+    assert reporte.ventas_diarias['Ventas Diarias'].tolist() == [30, 40]
+    fila = reporte.productos.set_index('Producto').loc[producto]
+    assert (fila['Cantidad Vendida'], fila['Ingresos'], fila['Ganancia']) == (7, 70, 28)
+    assert producto in set(reporte.inventario['Producto'])
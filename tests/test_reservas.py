@@ -0,0 +1,65 @@
+# Apartar y liberar stock no debe cambiar la versión de datos (PRAGMA data_version de la
+# base principal): de ella dependen las cachés del catálogo, los reportes y la exportación.
+from datetime import datetime
+
+import pytest
+
+from db import SessionLocal, get_version_datos, Productos, Inventario, ReservasStock
+from reservations import nuevo_id_carrito, reservar, renovar, liberar, limpiar_vencidas, get_disponibles, DURACION_RESERVA
+from sales import registrar_carrito
+
+
+@pytest.fixture
+def producto():
+    with SessionLocal() as db:
+        producto = Productos(nombre="Cuaderno de prueba", precio_compra=10, precio_venta=15)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=5))
+        db.commit()
+        yield producto.id_producto
+
+
+def test_apartados_no_cambian_la_version_de_datos(producto):
+    carrito, otro = nuevo_id_carrito(), nuevo_id_carrito()
+    version = get_version_datos()
+    with SessionLocal() as db:
+        assert reservar(db, carrito, producto, 3)
+        assert not reservar(db, otro, producto, 3)
+        assert get_disponibles(db, [producto], otro) == {producto: 2}
+        assert renovar(db, carrito, {producto: 2}) == []
+        liberar(db, carrito, producto)
+        limpiar_vencidas(db)
+        assert get_disponibles(db, [producto], otro) == {producto: 5}
+    assert get_version_datos() == version
+
+
+def test_cambio_de_stock_cambia_la_version_de_datos(producto):
+    version = get_version_datos()
+    with SessionLocal() as db:
+        db.query(Inventario).filter(Inventario.id_producto == producto).update({Inventario.cantidad: 4})
+        db.commit()
+    assert get_version_datos() != version
+
+
+def test_limpieza_descarta_apartados_de_carritos_cobrados(producto):
+    # La venta y el borrado de sus apartados van en archivos distintos: si el borrado se
+    # pierde, la limpieza debe descartar los apartados hechos antes del cobro
+    carrito, otro = nuevo_id_carrito(), nuevo_id_carrito()
+    with SessionLocal() as db:
+        assert reservar(db, carrito, producto, 2)
+        antes_del_cobro = datetime.utcnow() + DURACION_RESERVA
+        registrar_carrito(db, {producto: {'nombre': "Cuaderno", 'precio_venta': 15, 'cantidad': 2}}, carrito)
+        db.add(ReservasStock(id_carrito=carrito, id_producto=producto, cantidad=2, expira=antes_del_cobro))
+        db.commit()
+        assert get_disponibles(db, [producto], otro) == {producto: 1}
+
+        version = get_version_datos()
+        assert limpiar_vencidas(db) == 1
+        assert get_disponibles(db, [producto], otro) == {producto: 3}
+        assert get_version_datos() == version
+
+        # El mismo carrito sigue en uso en la caja: lo apartado después del cobro se conserva
+        assert reservar(db, carrito, producto, 1)
+        assert limpiar_vencidas(db) == 0
+        assert get_disponibles(db, [producto], otro) == {producto: 2}
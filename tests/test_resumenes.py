@@ -0,0 +1,79 @@
+# Los resúmenes diarios que cada venta actualiza en su transacción coinciden con los que
+# reconstruir_resumenes calcula desde `ventas` y `detalle_venta`.
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+import sales
+from db import SessionLocal, Productos, Inventario, ResumenVentasDiario, ResumenProductosDiario
+from rollups import reconstruir_resumenes
+
+DESDE = date(2036, 1, 5)
+
+
+class _Reloj(datetime):
+    ahora = None
+
+    @classmethod
+    def utcnow(cls):
+        return cls.ahora
+
+
+@pytest.fixture
+def productos(monkeypatch):
+    monkeypatch.setattr(sales, "datetime", _Reloj)
+    with SessionLocal() as db:
+        ids = []
+        for nombre, compra, venta in (("Goma de resumen", 2, 5), ("Sacapuntas de resumen", 3, 8)):
+            producto = Productos(nombre=nombre, precio_compra=compra, precio_venta=venta)
+            db.add(producto)
+            db.flush()
+            db.add(Inventario(id_producto=producto.id_producto, cantidad=100))
+            ids.append(producto.id_producto)
+        db.commit()
+        yield ids
+
+
+def _resumenes(db):
+    diario = db.execute(select(
+        ResumenVentasDiario.fecha, ResumenVentasDiario.total_ventas, ResumenVentasDiario.num_transacciones,
+        ResumenVentasDiario.unidades_vendidas, ResumenVentasDiario.ganancia
+    ).where(ResumenVentasDiario.fecha >= DESDE).order_by(ResumenVentasDiario.fecha)).all()
+    por_producto = db.execute(select(
+        ResumenProductosDiario.fecha, ResumenProductosDiario.id_producto, ResumenProductosDiario.total_ventas,
+        ResumenProductosDiario.num_transacciones, ResumenProductosDiario.unidades_vendidas, ResumenProductosDiario.ganancia
+    ).where(ResumenProductosDiario.fecha >= DESDE
+    ).order_by(ResumenProductosDiario.fecha, ResumenProductosDiario.id_producto)).all()
+    return diario, por_producto
+
+
+def test_ventas_actualizan_los_resumenes_como_la_reconstruccion(productos):
+    goma, sacapuntas = productos
+    tickets = [
+        (datetime(2036, 1, 5, 9), {goma: 2}),
+        (datetime(2036, 1, 5, 18), {goma: 1, sacapuntas: 3}),
+        (datetime(2036, 1, 6, 10), {sacapuntas: 1}),
+    ]
+    with SessionLocal() as db:
+        for momento, cantidades in tickets:
+            _Reloj.ahora = momento
+            sales.registrar_carrito(db, {
+                id_producto: {'nombre': "x", 'precio_venta': 5 if id_producto == goma else 8, 'cantidad': cantidad}
+                for id_producto, cantidad in cantidades.items()
+            })
+
+        diario, por_producto = _resumenes(db)
+        assert [(fila.fecha, float(fila.total_ventas), fila.num_transacciones, fila.unidades_vendidas, float(fila.ganancia))
+                for fila in diario] == [
+            (date(2036, 1, 5), 39.0, 2, 6, 24.0),
+            (date(2036, 1, 6), 8.0, 1, 1, 5.0),
+        ]
+        assert [(fila.fecha, fila.id_producto, fila.num_transacciones, fila.unidades_vendidas) for fila in por_producto] == [
+            (date(2036, 1, 5), goma, 2, 3),
+            (date(2036, 1, 5), sacapuntas, 1, 3),
+            (date(2036, 1, 6), sacapuntas, 1, 1),
+        ]
+
+        reconstruir_resumenes(db, DESDE)
+        assert _resumenes(db) == (diario, por_producto)
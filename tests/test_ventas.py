@@ -0,0 +1,94 @@
+# registrar_carrito rechaza cantidades que no son enteros positivos antes de tocar la base,
+# y el catálogo de la caja se pagina por clave sin repetir ni saltar productos.
+from datetime import date
+
+import pytest
+
+from db import SessionLocal, Productos, Inventario, Ventas, ResumenProductosDiario
+from sales import registrar_carrito, get_productos_disponibles, ORDEN_NOMBRE, ORDEN_POPULARIDAD
+
+CATEGORIA_PAGINAS = "Pruebas de paginación"
+
+
+@pytest.fixture
+def producto():
+    with SessionLocal() as db:
+        producto = Productos(nombre="Lápiz de prueba", precio_compra=4, precio_venta=6)
+        db.add(producto)
+        db.flush()
+        db.add(Inventario(id_producto=producto.id_producto, cantidad=5))
+        db.commit()
+        yield producto.id_producto
+
+
+def _stock_y_ventas(db, producto):
+    return (db.query(Inventario.cantidad).filter(Inventario.id_producto == producto).scalar(),
+            db.query(Ventas).count())
+
+
+@pytest.mark.parametrize("cantidad", [0, -1, 1.5, 2.0, True, "2", None])
+def test_cantidad_no_valida(producto, cantidad):
+    with SessionLocal() as db:
+        antes = _stock_y_ventas(db, producto)
+        carrito = {producto: {'nombre': "Lápiz de prueba", 'precio_venta': 6, 'cantidad': cantidad}}
+        with pytest.raises(ValueError):
+            registrar_carrito(db, carrito)
+        assert _stock_y_ventas(db, producto) == antes
+
+
+def test_venta_descuenta_stock(producto):
+    with SessionLocal() as db:
+        carrito = {producto: {'nombre': "Lápiz de prueba", 'precio_venta': 6, 'cantidad': 2}}
+        id_venta, total = registrar_carrito(db, carrito)
+        assert total == 12
+        assert db.query(Inventario.cantidad).filter(Inventario.id_producto == producto).scalar() == 3
+
+
+@pytest.fixture(scope="module")
+def categoria():
+    # Cinco productos con stock (dos con el mismo nombre) y uno agotado; algunos vendidos hoy
+    with SessionLocal() as db:
+        ids = {}
+        for nombre, cantidad, vendidas in (("Borrador", 4, 0), ("Acuarela", 2, 5), ("Crayón", 1, 9),
+                                           ("Borrador", 3, 5), ("Diurex", 6, 0), ("Engrapadora", 0, 20)):
+            producto = Productos(nombre=nombre, precio_compra=1, precio_venta=2, categoria=CATEGORIA_PAGINAS)
+            db.add(producto)
+            db.flush()
+            db.add(Inventario(id_producto=producto.id_producto, cantidad=cantidad))
+            if vendidas:
+                db.add(ResumenProductosDiario(fecha=date.today(), id_producto=producto.id_producto,
+                                              total_ventas=vendidas * 2, num_transacciones=1,
+                                              unidades_vendidas=vendidas, ganancia=vendidas))
+            ids.setdefault(nombre, []).append(producto.id_producto)
+        db.commit()
+        yield ids
+
+
+def _todas_las_paginas(db, orden):
+    paginas, cursor = [], None
+    while True:
+        productos, cursor = get_productos_disponibles(db, categoria=CATEGORIA_PAGINAS, orden=orden, cursor=cursor, limite=2)
+        paginas.append([p.id_producto for p in productos])
+        if cursor is None:
+            return paginas
+
+
+def test_paginacion_por_nombre(categoria):
+    with SessionLocal() as db:
+        paginas = _todas_las_paginas(db, ORDEN_NOMBRE)
+    assert paginas == [
+        [categoria["Acuarela"][0], categoria["Borrador"][0]],
+        [categoria["Borrador"][1], categoria["Crayón"][0]],
+        [categoria["Diurex"][0]],
+    ]
+
+
+def test_paginacion_por_popularidad(categoria):
+    with SessionLocal() as db:
+        paginas = _todas_las_paginas(db, ORDEN_POPULARIDAD)
+    # Empates por id; el agotado no aparece aunque sea el más vendido
+    assert paginas == [
+        [categoria["Crayón"][0], categoria["Acuarela"][0]],
+        [categoria["Borrador"][1], categoria["Borrador"][0]],
+        [categoria["Diurex"][0]],
+    ]